@@ -1,9 +1,10 @@
 import curses
 from curses import wrapper
-import queue
-import time
 import logging
 
+from maze_render import IncrementalCursesObserver, init_colors, print_maze
+from maze_solver import solve
+
 # 設定 Logging
 logging.basicConfig(
     filename='maze_debug_set.log', # 修改 log 檔名以區分
@@ -25,90 +26,39 @@ maze = [
     ["#", "#", "#", "#", "#", "#", "#", "X", "#"]
 ]
 
-def print_maze(maze, stdscr, path=[]):
-    BLUE = curses.color_pair(1)
-    RED = curses.color_pair(2)
-
-    for i, row in enumerate(maze):
-        for j, value in enumerate(row):
-            if (i, j) in path:
-                stdscr.addstr(i, j*2, "X", RED)
-            else:
-                stdscr.addstr(i, j*2, value, BLUE)
-
-def find_start(maze, start):
-    for i, row in enumerate(maze):
-        for j, value in enumerate(row):
-            if value == start:
-                return i, j
-    return None
-
-def find_path(maze, stdscr):
-    # 1. 開始計時
-    start_time = time.time()
-    
-    start = "O"
-    end = "X"
-    start_pos = find_start(maze, start)
-    
-    q = queue.Queue()
-    q.put((start_pos, [start_pos]))
-    
+def find_path(maze, stdscr, animate=True):
     # ==========================================
-    # 使用 Set (集合)
-    # 搜尋速度: O(1) - 超級快，不管資料多少，速度幾乎一樣
+    # 搜尋交給無畫面的 maze_solver.solve (內部用 Set 記錄 visited，O(1) 查詢)
+    # 畫面只是可選的 observer：animate=False 時會全速求解
+    # IncrementalCursesObserver 只重畫有變化的格子 (路徑 / frontier / 已展開)，不會每個 frame 都清空整個畫面
     # ==========================================
-    visited = set() 
-    
     logging.info(f"=== [SET 版本] 程式開始 ===")
-    
-    while not q.empty():
-        current_pos, path = q.get()
-        row, col = current_pos
-
-        stdscr.clear()
-        print_maze(maze, stdscr, path)
-        time.sleep(0.2) # 注意：這個 sleep 會佔據大部分的執行時間
-        stdscr.refresh()
-
-        if maze[row][col] == end:
-            # 2. 結束計時
-            end_time = time.time()
-            duration = end_time - start_time
-            logging.info(f"🎉 找到終點了！總耗時: {duration:.4f} 秒")
-            # 在畫面上顯示時間
-            stdscr.addstr(len(maze) + 1, 0, f"Time: {duration:.4f} sec (Set)")
-            stdscr.refresh()
-            return path
-
-        neighbors = find_neighbors(maze, row, col)
 
-        for neighbor in neighbors:
-            if neighbor in visited: # Set 的查詢是 O(1)
-                continue
+    observer = IncrementalCursesObserver(maze, stdscr) if animate else None
+    result = solve(maze, observer=observer)
+    duration = result.stats.elapsed
 
-            r, c = neighbor
-            if maze[r][c] == "#":
-                continue
+    if not result.found:
+        logging.info("=== 搜尋結束，無路可走 ===")
+        return None
 
-            new_path = path + [neighbor]
-            q.put((neighbor, new_path))
-            visited.add(neighbor) # Set 使用 add
+    logging.info(f"🎉 找到終點了！總耗時: {duration:.4f} 秒")
+    logging.info(f"   展開節點數: {result.stats.nodes_expanded}")
 
-    logging.info("=== 搜尋結束，無路可走 ===")
-
-def find_neighbors(maze, row, col):
-    neighbors = []
-    if row > 0: neighbors.append((row - 1, col))
-    if row + 1 < len(maze): neighbors.append((row + 1, col))
-    if col > 0: neighbors.append((row, col - 1))
-    if col + 1 < len(maze[0]): neighbors.append((row, col + 1))
-    return neighbors
+    # 在畫面上顯示最終路徑與時間
+    if observer is not None:
+        observer.finish(result.path)  # 只擦掉 frontier / 已展開的標記
+    else:
+        stdscr.clear()
+        print_maze(maze, stdscr, result.path)
+    stdscr.addstr(len(maze) + 1, 0, f"Time: {duration:.4f} sec (Set)")
+    stdscr.refresh()
+    return result.path
 
 def main(stdscr):
-    curses.init_pair(1, curses.COLOR_BLUE, curses.COLOR_BLACK)
-    curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
+    init_colors()
     find_path(maze, stdscr)
     stdscr.getch()
 
-wrapper(main)
\ No newline at end of file
+if __name__ == "__main__":
+    wrapper(main)
@@ -0,0 +1,257 @@
+"""
+效能測試歷史紀錄 + 退步 (regression) 偵測
+
+所有 benchmark_*.py 都把結果寫進同一個 JSONL 檔 (benchmark_history.jsonl)，
+每一筆記錄都帶著執行環境：git commit、Python 版本、CPU，以及原始樣本 (samples)。
+
+compare 指令會拿「最新一次執行」和「同一個環境之前的 N 次執行」比較，
+用 Mann-Whitney U 檢定 (不假設常態分佈，對離群值不敏感) 判斷變慢是不是統計上顯著的。
+
+用法:
+    python bench_history.py show
+    python bench_history.py compare --last 5 --threshold 0.05 --alpha 0.01
+"""
+import argparse
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+HISTORY_FILE = Path(__file__).parent / 'benchmark_history.jsonl'
+
+
+# ===== 執行環境 =====
+def git_commit(cwd: Path = Path(__file__).parent) -> str:
+    """目前的 git commit (短 hash)，工作目錄有未提交的修改時加上 -dirty"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=cwd,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def cpu_model() -> str:
+    """CPU 型號 (Linux 讀 /proc/cpuinfo，其他系統用 platform)"""
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu": cpu_model(),
+    }
+
+
+# ===== 儲存 =====
+class BenchmarkHistory:
+    """JSONL 格式的效能測試歷史紀錄"""
+
+    def __init__(self, path: Path = HISTORY_FILE):
+        self.path = Path(path)
+        self._env: Optional[Dict[str, str]] = None
+        self.run_id = uuid.uuid4().hex[:12]  # 同一次執行的所有結果共用一個 run_id
+
+    @property
+    def env(self) -> Dict[str, str]:
+        if self._env is None:
+            self._env = environment()
+        return self._env
+
+    def record(self, benchmark: str, case: str, samples: Sequence[float], unit: str = "ns", **extra: Any) -> Dict[str, Any]:
+        """寫入一筆結果 (一行)，回傳寫入的內容"""
+        entry = {
+            "run_id": self.run_id,
+            "run_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **self.env,
+            "benchmark": benchmark,
+            "case": case,
+            "unit": unit,
+            "median": round(statistics.median(samples), 3),
+            **extra,
+            "samples": [round(s, 3) for s in samples],
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return entry
+
+    def load(self) -> List[Dict[str, Any]]:
+        """讀取所有紀錄 (依寫入順序)，壞掉的行直接略過"""
+        if not self.path.exists():
+            return []
+        entries = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "samples" in entry and "case" in entry:
+                    entries.append(entry)
+        return entries
+
+
+# ===== 統計檢定 =====
+def mann_whitney_greater(a: Sequence[float], b: Sequence[float]) -> float:
+    """
+    單尾 Mann-Whitney U 檢定：a 是否「傾向比 b 大」(也就是變慢)
+
+    回傳 p-value (常態近似，含同分校正)。樣本太少時回傳 1.0
+    """
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return 1.0
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1  # 同分的取平均排名
+        for k in range(i, j + 1):
+            ranks[k] = average_rank
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+
+    rank_sum_a = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum_a - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / sigma  # 0.5 是連續性校正
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+@dataclass
+class Comparison:
+    """某個 case 最新一次執行 vs 基準 (前 N 次) 的比較結果"""
+    benchmark: str
+    case: str
+    baseline_median: float
+    latest_median: float
+    p_value: float
+    runs: int
+    regression: bool
+
+    @property
+    def change(self) -> float:
+        return self.latest_median / self.baseline_median - 1 if self.baseline_median else 0.0
+
+
+def compare(
+    entries: Iterable[Dict[str, Any]],
+    last: int = 5,
+    threshold: float = 0.05,
+    alpha: float = 0.01,
+    benchmark: Optional[str] = None,
+) -> List[Comparison]:
+    """
+    對每個 (benchmark, case, python, cpu)：最新一次 run vs 前 last 次 run 的樣本合併
+
+    變慢超過 threshold (相對) 且 p-value < alpha 才算退步，避免雜訊誤報
+    """
+    groups: Dict[Tuple[str, str, str, str], List[Dict[str, Any]]] = {}
+    for entry in entries:
+        if benchmark and entry["benchmark"] != benchmark:
+            continue
+        key = (entry["benchmark"], entry["case"], entry.get("python", ""), entry.get("cpu", ""))
+        groups.setdefault(key, []).append(entry)
+
+    comparisons = []
+    for (bench, case, _, _), runs in groups.items():
+        if len(runs) < 2:
+            continue
+        latest, baseline_runs = runs[-1], runs[-1 - last:-1]
+        baseline = [s for run in baseline_runs for s in run["samples"]]
+        baseline_median = statistics.median(baseline)
+        latest_median = statistics.median(latest["samples"])
+        p_value = mann_whitney_greater(latest["samples"], baseline)
+        slower = baseline_median > 0 and latest_median / baseline_median - 1 > threshold
+        comparisons.append(Comparison(
+            benchmark=bench,
+            case=case,
+            baseline_median=baseline_median,
+            latest_median=latest_median,
+            p_value=p_value,
+            runs=len(baseline_runs),
+            regression=slower and p_value < alpha,
+        ))
+    return comparisons
+
+
+# ===== CLI =====
+def print_comparisons(comparisons: List[Comparison]) -> None:
+    print(f"{'benchmark':<22}{'case':<34}{'baseline':>12}{'latest':>12}{'change':>9}{'p-value':>10}")
+    for c in comparisons:
+        mark = "🐢 退步" if c.regression else ""
+        print(
+            f"{c.benchmark:<22}{c.case:<34}{c.baseline_median:>12.1f}{c.latest_median:>12.1f}"
+            f"{c.change:>+9.1%}{c.p_value:>10.4f}  {mark}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="效能測試歷史紀錄與退步偵測")
+    parser.add_argument("--history", default=str(HISTORY_FILE), help="JSONL 歷史紀錄檔")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("show", help="列出每次執行的摘要")
+
+    cmp_parser = sub.add_parser("compare", help="最新一次執行 vs 前 N 次，找出顯著變慢的 case")
+    cmp_parser.add_argument("--last", type=int, default=5, help="基準要取前幾次執行 (預設 5)")
+    cmp_parser.add_argument("--threshold", type=float, default=0.05, help="至少變慢多少才算 (預設 0.05 = 5%%)")
+    cmp_parser.add_argument("--alpha", type=float, default=0.01, help="顯著水準 (預設 0.01)")
+    cmp_parser.add_argument("--benchmark", help="只比較某一個 benchmark")
+
+    args = parser.parse_args(argv)
+    entries = BenchmarkHistory(Path(args.history)).load()
+    if not entries:
+        print(f"找不到任何紀錄: {args.history}")
+        return 1
+
+    if args.command == "show":
+        runs: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            run = runs.setdefault(entry["run_id"], {**entry, "cases": 0})
+            run["cases"] += 1
+        for run in runs.values():
+            print(f"{run['run_at']}  {run['run_id']}  {run['commit']:<14} py{run['python']:<8} {run['benchmark']:<22}{run['cases']:>4} cases")
+        return 0
+
+    comparisons = compare(entries, args.last, args.threshold, args.alpha, args.benchmark)
+    print_comparisons(comparisons)
+    regressions = [c for c in comparisons if c.regression]
+    if regressions:
+        print(f"\n🐢 發現 {len(regressions)} 個顯著退步 (變慢 > {args.threshold:.0%}，p < {args.alpha})")
+        return 1
+    print("\n✅ 沒有發現顯著退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+效能測試：BFS frontier 用 queue.Queue vs collections.deque vs 預先配置的陣列
+
+queue.Queue 是給多執行緒用的：每次 put / get 都要拿 mutex、通知 condition variable。
+單執行緒的 BFS 完全不需要這些，這個測試量出每個節點 (一次 put + 一次 get) 多花了多少時間。
+原始樣本會寫進 benchmark_history.jsonl。
+
+用法:
+    python benchmark_frontier.py
+"""
+import queue
+import timeit
+from array import array
+from collections import deque
+
+from bench_history import BenchmarkHistory
+
+NODES = 100_000
+REPEAT = 5
+
+
+def run_queue():
+    q = queue.Queue()
+    q.put(0)
+    pushed = 1
+    while not q.empty():
+        q.get()
+        if pushed < NODES:  # 模擬 BFS：每取出一個節點就放入一個新節點
+            q.put(pushed)
+            pushed += 1
+
+
+def run_deque():
+    q = deque([0])
+    pushed = 1
+    while q:
+        q.popleft()
+        if pushed < NODES:
+            q.append(pushed)
+            pushed += 1
+
+
+def run_array():
+    frontier = array("i", bytes(4 * NODES))  # 每個節點最多進來一次，預先配置好
+    head, tail = 0, 1
+    while head < tail:
+        frontier[head]
+        head += 1
+        if tail < NODES:
+            frontier[tail] = tail
+            tail += 1
+
+
+FRONTIERS = {
+    "queue.Queue": run_queue,
+    "deque": run_deque,
+    "array (預先配置)": run_array,
+}
+
+
+def benchmark():
+    print(f"🚀 每個 frontier 放入並取出 {NODES:,} 個節點 (取 {REPEAT} 次中最快的一次)")
+    history = BenchmarkHistory()
+    results = {}
+    for name, func in FRONTIERS.items():
+        samples = [run / NODES * 1e9 for run in timeit.repeat(func, number=1, repeat=REPEAT)]  # ns / 節點
+        history.record("frontier", func.__name__.removeprefix("run_"), samples)
+        results[name] = min(samples)
+
+    baseline = results["queue.Queue"]
+    for name, ns in results.items():
+        print(f"{name:<16}{ns:>10.1f} ns/節點   (queue.Queue 的 {ns / baseline:.0%})")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,60 @@
+"""
+效能測試：每個節點複製路徑 vs Parent 指標重建路徑
+
+比較 maze_solver.solve 的三種 path_mode 在不同大小迷宮上的
+執行時間 (最佳值) 與記憶體峰值 (tracemalloc)；原始樣本會寫進 benchmark_history.jsonl。
+
+用法:
+    python benchmark_path_reconstruction.py
+"""
+import time
+import tracemalloc
+
+from bench_history import BenchmarkHistory
+from maze_generator import open_maze, serpentine_maze
+from maze_solver import PATH_MODES, solve
+
+SIZES = [21, 41, 81, 121]
+REPEAT = 5
+
+SHAPES = {
+    "serpentine": serpentine_maze,  # 長走廊：路徑很長
+    "open": open_maze,              # 空曠：節點很多、路徑很短
+}
+
+
+def measure(maze, path_mode):
+    """回傳 (每次耗時的秒數列表, 記憶體峰值 bytes, 路徑長度)"""
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = solve(maze, path_mode=path_mode)
+        samples.append(time.perf_counter() - started)
+
+    # 記憶體另外量一次，避免 tracemalloc 的開銷影響計時
+    tracemalloc.start()
+    solve(maze, path_mode=path_mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return samples, peak, result.length
+
+
+def benchmark():
+    history = BenchmarkHistory()
+    print(f"{'shape':<11}{'size':>6}{'mode':>9}{'time (ms)':>12}{'peak (KB)':>12}{'length':>8}")
+    for shape, generate in SHAPES.items():
+        for size in SIZES:
+            maze = generate(size, size)
+            for path_mode in PATH_MODES:
+                samples, peak, length = measure(maze, path_mode)
+                best = min(samples)
+                history.record(
+                    "path_reconstruction", f"{shape}/{size}/{path_mode}",
+                    [t * 1000 for t in samples], unit="ms", peak_kb=round(peak / 1024, 1),
+                )
+                print(f"{shape:<11}{size:>6}{path_mode:>9}{best * 1000:>12.2f}{peak / 1024:>12.1f}{length:>8}")
+        print()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,72 +1,135 @@
-import time
 import logging
+import math
+import statistics
+import time
+import timeit
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from bench_history import HISTORY_FILE, BenchmarkHistory
 
 # ==========================================
-# 設定 Logging
-# 檔名：benchmark_history.log
-# filemode='a' (Append)：追加模式，不會清空舊資料，適合長期記錄效能
+# 成員查詢 (x in container) 微型效能測試套件
+#
+# - 用 timeit (內部是 perf_counter) 計時，先 warmup 再正式取樣
+# - 多種資料規模，分成「找得到 (hit)」與「找不到 (miss，最壞情況)」
+# - 比較 list / set / dict / frozenset / bisect (排序好的 array)
+# - 報告中位數 (median) 與 p95，單位是「每次查詢幾奈秒 (ns)」
+# - 結果 (含原始樣本、git commit、Python 版本、CPU) 以 JSONL 追加到 benchmark_history.jsonl，
+#   之後可以用 `python bench_history.py compare` 找出顯著變慢的 case
 # ==========================================
-logging.basicConfig(
-    filename='benchmark_history.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    filemode='a' 
-)
+
+SIZES = [100, 10_000, 100_000]
+SAMPLES = 15        # 每個組合正式取樣幾次
+SAMPLE_TIME = 0.01  # 每次取樣至少跑 10ms，太短的話計時誤差會蓋過結果
+
+
+def build_containers(size):
+    """準備各種容器，內容都是 0 ~ size-1"""
+    data = list(range(size))
+    return {
+        "list": ("target in container", data),
+        "set": ("target in container", set(data)),
+        "frozenset": ("target in container", frozenset(data)),
+        "dict": ("target in container", dict.fromkeys(data)),
+        # 排序好的陣列 + 二分搜尋：O(log n)，記憶體比 set 小很多
+        "bisect": (
+            "i = bisect_left(container, target); i < n and container[i] == target",
+            array("q", data),
+        ),
+    }
+
+
+def percentile(values, pct):
+    """簡單的 p 百分位數 (最近排名法)"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def measure(stmt, container, target):
+    """
+    回傳每次查詢的耗時樣本 (ns)
+
+    1. warmup：number 從 1 開始加倍，直到一次取樣至少跑 SAMPLE_TIME 秒 (順便把快取暖好)
+    2. 正式取樣 SAMPLES 次，每次都跑 number 次再平均
+    """
+    timer = timeit.Timer(
+        stmt,
+        timer=time.perf_counter,
+        globals={"container": container, "target": target, "n": len(container), "bisect_left": bisect_left},
+    )
+    number = 1
+    while timer.timeit(number) < SAMPLE_TIME:
+        number *= 2
+    runs = timer.repeat(repeat=SAMPLES, number=number)
+    return [run / number * 1e9 for run in runs]
+
+
+def run_suite(sizes=SIZES):
+    """跑完所有組合，回傳結果列表 (每一筆都是一個 dict)"""
+    results = []
+    for size in sizes:
+        cases = {"hit": size // 2, "miss": -1}  # hit 取中間的元素；miss 是最壞情況
+        for name, (stmt, container) in build_containers(size).items():
+            for case, target in cases.items():
+                samples = measure(stmt, container, target)
+                results.append({
+                    "container": name,
+                    "size": size,
+                    "case": case,
+                    "median_ns": round(statistics.median(samples), 2),
+                    "p95_ns": round(percentile(samples, 95), 2),
+                    "samples": samples,
+                })
+    return results
+
+
+def append_history(results, path=HISTORY_FILE):
+    """把這一輪的結果追加寫入歷史紀錄 (一筆結果一行)"""
+    history = BenchmarkHistory(path)
+    for r in results:
+        history.record(
+            "membership",
+            f"{r['container']}/{r['size']}/{r['case']}",
+            r["samples"],
+            container=r["container"],
+            size=r["size"],
+            p95=r["p95_ns"],
+        )
+
+
+def print_report(results):
+    print(f"{'container':<11}{'size':>9}{'case':>6}{'median (ns)':>14}{'p95 (ns)':>12}")
+    for r in results:
+        print(f"{r['container']:<11}{r['size']:>9}{r['case']:>6}{r['median_ns']:>14.1f}{r['p95_ns']:>12.1f}")
+
 
 def benchmark():
-    # 1. 準備資料
-    data_size = 100_000
-    iterations = 1000
-    target = -1  # 找一個不存在的數字 (最壞情況)
+    # 只記錄精簡的摘要 (不要把整個 list / set 印進 log，會讓 log 爆大又拖慢計時)
+    logging.basicConfig(
+        filename=Path(__file__).parent / 'benchmark_history.log',
+        level=logging.INFO,
+        format='%(asctime)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        filemode='a'
+    )
 
     # 在螢幕上提示一下，不然你會以為程式沒在跑
-    print(f"🚀 正在執行效能測試 (規模: {data_size})... 請稍候")
-    
-    # 寫入 Log 標頭，區隔每一次執行
-    logging.info("========================================")
-    logging.info(f"🚀 開始新一輪測試")
-    logging.info(f"📊 資料規模: {data_size} 筆 | 測試次數: {iterations} 次")
-
-    # 準備 List 和 Set
-    test_list = list(range(data_size))
-    test_set = set(range(data_size))
-    logging.info(f"test_list: {test_list} ")
-    logging.info(f"test_set: {test_set} ")
-    # ==========================================
-    # 測試 List (O(n))
-    # ==========================================
-    start_time = time.time()
-    for _ in range(iterations):
-        if target in test_list:
-            pass
-    end_time = time.time()
-    list_duration = end_time - start_time
-    
-    logging.info(f"🐢 List (列表) 耗時: {list_duration:.5f} 秒")
-
-    # ==========================================
-    # 測試 Set (O(1))
-    # ==========================================
-    start_time = time.time()
-    for _ in range(iterations):
-        if target in test_set:
-            pass
-    end_time = time.time()
-    set_duration = end_time - start_time
-    
-    logging.info(f"⚡️ Set  (集合) 耗時: {set_duration:.5f} 秒")
-
-    # ==========================================
-    # 計算差異並記錄
-    # ==========================================
-    if set_duration > 0:
-        ratio = list_duration / set_duration
-        logging.info(f"🏆 結論: Set 比 List 快了 {ratio:.1f} 倍")
-    else:
-        logging.info("🏆 結論: Set 太快了，無法計算倍數")
-
-    print("✅ 測試完成！請查看 benchmark_history.log")
+    print(f"🚀 正在執行效能測試 (規模: {SIZES})... 請稍候")
+    logging.info(f"🚀 開始新一輪測試 | 規模: {SIZES} | 每組取樣 {SAMPLES} 次")
+
+    results = run_suite()
+    print_report(results)
+    append_history(results)
+
+    for r in results:
+        if r["case"] == "miss" and r["container"] in ("list", "set"):
+            logging.info(f"{r['container']:<4} size={r['size']} miss median={r['median_ns']:.1f}ns p95={r['p95_ns']:.1f}ns")
+
+    print(f"✅ 測試完成！結果已追加到 {HISTORY_FILE.name}")
+
 
 if __name__ == "__main__":
-    benchmark()
\ No newline at end of file
+    benchmark()
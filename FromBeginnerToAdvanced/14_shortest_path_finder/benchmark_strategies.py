@@ -0,0 +1,55 @@
+"""
+效能測試：比較各種搜尋策略在不同形狀迷宮上的展開節點數與耗時
+
+展開節點數 (nodes_expanded) 比耗時更穩定，適合拿來挑選每種迷宮形狀最便宜的演算法；
+有成本的迷宮要先看路徑成本，BFS 類的策略不看成本，找到的不一定是最便宜的路。
+原始樣本會寫進 benchmark_history.jsonl。
+
+用法:
+    python benchmark_strategies.py
+"""
+from bench_history import BenchmarkHistory
+from maze_generator import open_maze, random_maze, serpentine_maze, weighted_maze
+from maze_grid import MazeGrid
+from maze_solver import STRATEGIES, solve
+
+SIZE = 101
+REPEAT = 5
+
+SHAPES = {
+    "open": lambda: open_maze(SIZE, SIZE),
+    "serpentine": lambda: serpentine_maze(SIZE, SIZE),
+    "random": lambda: random_maze(SIZE, SIZE, wall_ratio=0.25, seed=3),
+    "weighted": lambda: weighted_maze(SIZE, SIZE, seed=1),
+}
+
+
+def benchmark():
+    history = BenchmarkHistory()
+    print(f"{'shape':<12}{'strategy':<15}{'expanded':>10}{'length':>8}{'cost':>8}{'time (ms)':>12}")
+    for shape, generate in SHAPES.items():
+        grid = MazeGrid.from_rows(generate())
+        results = []
+        for strategy in STRATEGIES:
+            samples = []
+            for _ in range(REPEAT):
+                result = solve(grid, strategy=strategy)
+                samples.append(result.stats.elapsed * 1000)
+            best = min(samples) / 1000
+            history.record(
+                "strategies", f"{shape}/{strategy}", samples, unit="ms",
+                nodes_expanded=result.stats.nodes_expanded,
+            )
+            results.append((result.cost, result.stats.nodes_expanded, strategy))
+            print(
+                f"{shape:<12}{strategy:<15}{result.stats.nodes_expanded:>10}"
+                f"{result.length:>8}{result.cost:>8}{best * 1000:>12.2f}"
+            )
+        # 先看路徑成本 (BFS 類不看格子成本，可能不是最便宜的路)，再看展開節點數
+        cheapest = min(results)[2]
+        print(f"{'':<12}👉 最便宜的策略: {cheapest}")
+        print()
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,168 @@
+"""
+多次查詢用的距離場 (Distance Field)
+
+同一個迷宮要查很多組 (起點, 終點) 時，每次都重新 BFS 很浪費。
+PathOracle 對每個「終點」只做一次反向搜尋，得到整張圖到終點的距離 (distance field)；
+之後任何起點的查詢都只要沿著距離遞減的方向走 (gradient descent)，成本是 O(路徑長度)。
+
+- 沒有成本資料：反向 BFS，O(V)
+- 有成本資料 (weights)：反向 Dijkstra，走進一格的成本和 maze_solver 一樣是那一格的 weight
+- 距離場依終點快取 (LRU)，迷宮的 MazeGrid.version 改變時整個快取自動失效
+
+用法:
+    oracle = PathOracle(grid)
+    path = oracle.query((1, 1), (9, 7))
+"""
+import heapq
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+from maze_grid import END, START, WALL_CODE, MazeGrid, Position
+from maze_solver import Maze, as_grid
+
+UNREACHABLE = -1
+
+
+# ===== 資料模型 =====
+@dataclass
+class DistanceField:
+    """整張圖到某個終點的距離 (扁平陣列，UNREACHABLE 代表走不到)"""
+    target: int
+    distances: array
+    version: int  # 建立時 MazeGrid 的版本
+
+    def distance(self, index: int) -> int:
+        return self.distances[index]
+
+
+# ===== 建立距離場 =====
+def build_distance_field(grid: MazeGrid, target_index: int) -> DistanceField:
+    """
+    從終點反向搜尋，算出每一格到終點的最短距離
+
+    鄰居遮罩是對稱的 (a 能走到 b，b 就能走到 a)，所以從終點往外擴散就等於所有格子往終點走
+    """
+    masks = memoryview(grid.neighbor_mask.reshape(-1))
+    deltas = grid.neighbor_deltas
+    dist = array("i", [UNREACHABLE]) * grid.size
+    dist[target_index] = 0
+    if grid.flat[target_index] == WALL_CODE:
+        return DistanceField(target=target_index, distances=dist, version=grid.version)
+
+    if grid.weights is None:
+        # 每格成本都是 1：BFS，frontier 用預先配置好的陣列 (同 maze_solver._bfs_array)
+        frontier = array("i", bytes(4 * grid.size))
+        frontier[0] = target_index
+        head, tail = 0, 1
+        while head < tail:
+            index = frontier[head]
+            head += 1
+            next_dist = dist[index] + 1
+            for delta in deltas[masks[index]]:
+                neighbor = index + delta
+                if dist[neighbor] == UNREACHABLE:
+                    dist[neighbor] = next_dist
+                    frontier[tail] = neighbor
+                    tail += 1
+    else:
+        # 從 neighbor 走進 index 的成本是 weights[index]
+        weights = memoryview(grid.weights.reshape(-1))
+        heap = [(0, target_index)]
+        while heap:
+            d, index = heapq.heappop(heap)
+            if d > dist[index]:
+                continue  # heap 裡的舊資料
+            next_dist = d + weights[index]
+            for delta in deltas[masks[index]]:
+                neighbor = index + delta
+                if dist[neighbor] == UNREACHABLE or next_dist < dist[neighbor]:
+                    dist[neighbor] = next_dist
+                    heapq.heappush(heap, (next_dist, neighbor))
+
+    return DistanceField(target=target_index, distances=dist, version=grid.version)
+
+
+def descend(grid: MazeGrid, field: DistanceField, start_index: int) -> Optional[List[Position]]:
+    """
+    沿著距離場往下走到終點 (gradient descent)
+
+    每一步找一個「走進去的成本 + 它的距離 == 目前距離」的鄰居，只看 4 個方向，所以是 O(路徑長度)
+    """
+    dist = field.distances
+    if dist[start_index] == UNREACHABLE:
+        return None
+    masks = memoryview(grid.neighbor_mask.reshape(-1))
+    weights = memoryview(grid.weights.reshape(-1)) if grid.weights is not None else None
+    deltas, cols = grid.neighbor_deltas, grid.cols
+
+    path = [divmod(start_index, cols)]
+    index = start_index
+    while index != field.target:
+        current = dist[index]
+        for delta in deltas[masks[index]]:
+            neighbor = index + delta
+            step = weights[neighbor] if weights is not None else 1
+            if dist[neighbor] != UNREACHABLE and dist[neighbor] + step == current:
+                index = neighbor
+                break
+        else:
+            raise RuntimeError("距離場和迷宮不一致 (迷宮被修改後沒有呼叫 touch()?)")
+        path.append(divmod(index, cols))
+    return path
+
+
+# ===== 查詢 =====
+class PathOracle:
+    """
+    同一個迷宮的多次最短路徑查詢
+
+    每個終點的距離場建一次就快取起來 (最多 max_fields 個，LRU 淘汰)，
+    MazeGrid.version 改變時 (set_cell / touch) 自動清空快取
+    """
+
+    def __init__(self, maze: Maze, max_fields: int = 16, start: str = START, end: str = END):
+        if max_fields < 1:
+            raise ValueError("max_fields 必須 >= 1")
+        self.grid = as_grid(maze, start, end)
+        self.max_fields = max_fields
+        self._fields: "OrderedDict[int, DistanceField]" = OrderedDict()
+        self._version = self.grid.version
+        self.hits = 0
+        self.misses = 0
+
+    def field(self, target: Position) -> DistanceField:
+        """取得 (必要時建立) 到 target 的距離場"""
+        if self.grid.version != self._version:
+            self._fields.clear()
+            self._version = self.grid.version
+
+        target_index = self._index(target)
+        cached = self._fields.get(target_index)
+        if cached is not None:
+            self._fields.move_to_end(target_index)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        field = build_distance_field(self.grid, target_index)
+        self._fields[target_index] = field
+        if len(self._fields) > self.max_fields:
+            self._fields.popitem(last=False)
+        return field
+
+    def distance(self, start: Position, end: Position) -> int:
+        """最短距離 (有成本時是總成本)，走不到回傳 UNREACHABLE"""
+        return self.field(end).distance(self._index(start))
+
+    def query(self, start: Position, end: Position) -> Optional[List[Position]]:
+        """最短路徑 (包含起點與終點)，走不到回傳 None"""
+        field = self.field(end)
+        return descend(self.grid, field, self._index(start))
+
+    def _index(self, pos: Position) -> int:
+        row, col = pos
+        if not (0 <= row < self.grid.rows and 0 <= col < self.grid.cols):
+            raise ValueError(f"位置超出迷宮範圍: {pos}")
+        return self.grid.index(row, col)
@@ -0,0 +1,69 @@
+"""
+測試 / 效能測試用的迷宮產生器
+
+- open_maze: 四周是牆、中間全空的迷宮 (BFS 會展開最多節點)
+- serpentine_maze: 蛇行長走廊 (路徑長度約為格子數的一半，最能看出 O(V·L) 的問題)
+- random_maze: 隨機牆壁 (固定 seed，每次產生一樣的迷宮)
+- weighted_maze: 隨機牆壁 + 每格成本 1 ~ 9 (給 Dijkstra / A* 用)
+"""
+import random
+from typing import List
+
+from maze_grid import END, START, WALL
+
+Grid = List[List[str]]
+
+
+def open_maze(rows: int, cols: int) -> Grid:
+    """外圍是牆，起點在左上角、終點在右下角"""
+    maze = [[WALL] * cols for _ in range(rows)]
+    for r in range(1, rows - 1):
+        for c in range(1, cols - 1):
+            maze[r][c] = " "
+    maze[1][1] = START
+    maze[rows - 2][cols - 2] = END
+    return maze
+
+
+def serpentine_maze(rows: int, cols: int) -> Grid:
+    """
+    蛇行走廊：奇數列是牆，每道牆只在左端或右端留一個缺口
+
+    O . . . . .
+    # # # # # .
+    . . . . . .
+    . # # # # #
+    . . . . . X
+    """
+    maze = [[" "] * cols for _ in range(rows)]
+    for r in range(1, rows, 2):
+        maze[r] = [WALL] * cols
+        gap = cols - 1 if (r // 2) % 2 == 0 else 0
+        maze[r][gap] = " "
+    maze[0][0] = START
+    last = rows - 1 if rows % 2 == 1 else rows - 2
+    maze[last][cols - 1 if (last // 2) % 2 == 0 else 0] = END
+    return maze
+
+
+def random_maze(rows: int, cols: int, wall_ratio: float = 0.25, seed: int = 0) -> Grid:
+    """隨機放牆壁 (可能沒有解)，起點在左上、終點在右下"""
+    rng = random.Random(seed)
+    maze = [
+        [WALL if rng.random() < wall_ratio else " " for _ in range(cols)]
+        for _ in range(rows)
+    ]
+    maze[0][0] = START
+    maze[rows - 1][cols - 1] = END
+    return maze
+
+
+def weighted_maze(rows: int, cols: int, wall_ratio: float = 0.2, seed: int = 0) -> Grid:
+    """隨機迷宮，空地換成成本數字 "1" ~ "9" """
+    rng = random.Random(seed)
+    maze = random_maze(rows, cols, wall_ratio, seed)
+    for row in maze:
+        for c, value in enumerate(row):
+            if value == " ":
+                row[c] = str(rng.randint(1, 9))
+    return maze
@@ -0,0 +1,285 @@
+"""
+NumPy 迷宮格子 (MazeGrid)
+
+原本的迷宮是 list of list，每一格是一個 Python 字串物件 (每格約 8 bytes 指標 + 字串本身)。
+MazeGrid 把整個迷宮存成一塊 numpy.uint8 陣列，每格只佔 1 byte：
+
+    OPEN = 0   空地 " "
+    WALL = 1   牆壁 "#"
+    START = 2  起點 "O"
+    END = 3    終點 "X"
+
+另外用向量化運算預先算好每一格的「鄰居遮罩」(4 個 bit：上下左右是否可以走)，
+搭配扁平索引 (index = row * cols + col)，BFS 查鄰居時只要查表，不需要每次建立新的 list。
+
+有成本的格子 (ASCII 裡的數字 "1" ~ "9") 另外存在 weights 陣列，給 Dijkstra / A* 使用。
+"""
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Position = Tuple[int, int]
+
+START = "O"
+END = "X"
+WALL = "#"
+
+# 格子代碼
+OPEN_CODE = 0
+WALL_CODE = 1
+START_CODE = 2
+END_CODE = 3
+CODE_TO_CHAR = np.frombuffer(b" #OX", dtype=np.uint8)
+
+# 鄰居遮罩的 bit
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+
+# PGM 灰階值
+PGM_START = 100
+PGM_END = 200
+
+
+def _char_lookup(start: str, end: str, wall: str) -> np.ndarray:
+    """字元 (byte) -> 格子代碼的查表陣列，不認得的字元都當作空地"""
+    lookup = np.full(256, OPEN_CODE, dtype=np.uint8)
+    lookup[ord(wall)] = WALL_CODE
+    lookup[ord(start)] = START_CODE
+    lookup[ord(end)] = END_CODE
+    return lookup
+
+
+def _parse_pgm_header(data) -> Tuple[Tuple[int, int, int], int]:
+    """解析 P5 標頭，回傳 ((寬, 高, maxval), 像素資料的起始位置)；支援 # 註解"""
+    fields: List[int] = []
+    with memoryview(data) as view:
+        if bytes(view[:2]) != b"P5":
+            raise ValueError("不是二進位 PGM (P5) 檔案")
+        pos = 2
+        while len(fields) < 3:
+            if pos >= len(view):
+                raise ValueError("PGM 標頭不完整")
+            char = view[pos]
+            if char == ord("#"):
+                while pos < len(view) and view[pos] != ord("\n"):
+                    pos += 1
+            elif chr(char).isspace():
+                pos += 1
+            else:
+                begin = pos
+                while pos < len(view) and chr(view[pos]).isdigit():
+                    pos += 1
+                if begin == pos:
+                    raise ValueError("PGM 標頭格式錯誤")
+                fields.append(int(bytes(view[begin:pos])))
+    # 標頭後面只會有一個空白字元，接著就是像素資料
+    return (fields[0], fields[1], fields[2]), pos + 1
+
+
+class MazeGrid:
+    """uint8 迷宮格子，可以直接當作 maze 傳給 solve / find_start / print_maze"""
+
+    def __init__(self, cells: np.ndarray, weights: Optional[np.ndarray] = None):
+        if cells.ndim != 2:
+            raise ValueError(f"迷宮必須是二維陣列，收到 {cells.ndim} 維")
+        self.cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        self.rows, self.cols = self.cells.shape
+        # 走進每一格的成本 (uint8)；None 代表每格成本都是 1
+        self.weights: Optional[np.ndarray] = None
+        if weights is not None:
+            if weights.shape != self.cells.shape:
+                raise ValueError("weights 的形狀必須和迷宮一樣")
+            self.weights = np.ascontiguousarray(weights, dtype=np.uint8)
+        self._neighbor_mask: Optional[np.ndarray] = None
+        # 每次修改格子就 +1，快取 (例如 distance_field.PathOracle) 用它判斷資料是否過期
+        self.version = 0
+        # 16 種遮罩各自對應的扁平索引位移，事先建好，查鄰居時不用配置新物件
+        deltas = ((UP, -self.cols), (DOWN, self.cols), (LEFT, -1), (RIGHT, 1))
+        self.neighbor_deltas: Tuple[Tuple[int, ...], ...] = tuple(
+            tuple(delta for bit, delta in deltas if mask & bit) for mask in range(16)
+        )
+
+    # ===== 建立 =====
+    @classmethod
+    def from_rows(
+        cls,
+        maze: Sequence[Sequence[str]],
+        start: str = START,
+        end: str = END,
+        wall: str = WALL,
+    ) -> "MazeGrid":
+        """
+        從 list of list (或字串列表) 轉換
+
+        數字 "1" ~ "9" 是有成本的空地 (給 Dijkstra / A* 用)，其他不認得的字元都當作空地
+        """
+        if not maze:
+            raise ValueError("迷宮不能是空的")
+        text = "".join("".join(row) for row in maze)
+        raw = np.frombuffer(text.encode("latin-1"), dtype=np.uint8)
+        cols = len(maze[0])
+        if raw.size != len(maze) * cols:
+            raise ValueError("迷宮每一列的長度必須相同")
+        return cls._from_chars(raw.reshape(len(maze), cols), start, end, wall)
+
+    @classmethod
+    def from_string(cls, text: str, **kwargs) -> "MazeGrid":
+        """從多行文字建立 (每行一列)"""
+        return cls.from_rows(text.strip("\n").splitlines(), **kwargs)
+
+    @classmethod
+    def from_ascii_bytes(
+        cls,
+        data,
+        start: str = START,
+        end: str = END,
+        wall: str = WALL,
+    ) -> "MazeGrid":
+        """
+        從 ASCII 文字的 bytes (或 mmap) 建立，不需要先解碼成 Python 字串
+
+        每行一列；比較短的行 (例如編輯器刪掉行尾空白) 會用牆補齊
+        """
+        raw = np.frombuffer(data, dtype=np.uint8)
+        raw = raw[raw != ord("\r")]  # 同時也複製一份，不再參照 data
+        if raw.size and raw[-1] != ord("\n"):
+            raw = np.append(raw, np.uint8(ord("\n")))
+        ends = np.flatnonzero(raw == ord("\n"))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        lengths = ends - starts
+        used = np.flatnonzero(lengths)  # 忽略結尾的空行
+        if used.size == 0:
+            raise ValueError("迷宮不能是空的")
+        starts, lengths = starts[: used[-1] + 1], lengths[: used[-1] + 1]
+
+        rows, cols = lengths.size, int(lengths.max())
+        if np.all(lengths == cols):
+            # 每行一樣長：去掉換行那一欄就是整張圖
+            chars = raw[: rows * (cols + 1)].reshape(rows, cols + 1)[:, :cols]
+            return cls._from_chars(chars, start, end, wall)
+
+        chars = np.full((rows, cols), ord(wall), dtype=np.uint8)
+        for row, (begin, length) in enumerate(zip(starts, lengths)):
+            chars[row, :length] = raw[begin:begin + length]
+        return cls._from_chars(chars, start, end, wall)
+
+    @classmethod
+    def _from_chars(cls, chars: np.ndarray, start: str, end: str, wall: str) -> "MazeGrid":
+        """二維字元陣列 -> 格子代碼 + (如果有數字的話) 成本"""
+        cells = _char_lookup(start, end, wall)[chars]
+        digits = chars - np.uint8(ord("0"))  # 非數字會 wrap 成很大的值
+        weighted = (digits >= 1) & (digits <= 9) & (cells == OPEN_CODE)
+        if not weighted.any():
+            return cls(cells)
+        return cls(cells, np.where(weighted, digits, 1).astype(np.uint8))
+
+    @classmethod
+    def from_pgm_bytes(cls, data) -> "MazeGrid":
+        """
+        從二進位 PGM (P5) 建立，灰階值對應：
+
+            0 (黑)     牆壁
+            PGM_START  起點
+            PGM_END    終點
+            其他       空地
+        """
+        header, offset = _parse_pgm_header(data)
+        cols, rows, maxval = header
+        if maxval > 255:
+            raise ValueError("只支援 8-bit PGM (maxval <= 255)")
+        pixels = np.frombuffer(data, dtype=np.uint8, count=rows * cols, offset=offset)
+        lookup = np.full(256, OPEN_CODE, dtype=np.uint8)
+        lookup[0] = WALL_CODE
+        lookup[PGM_START] = START_CODE
+        lookup[PGM_END] = END_CODE
+        return cls(lookup[pixels].reshape(rows, cols))
+
+    def to_pgm_bytes(self) -> bytes:
+        """輸出成二進位 PGM (P5)，和 from_pgm_bytes 互為反向"""
+        levels = np.array([255, 0, PGM_START, PGM_END], dtype=np.uint8)
+        header = f"P5\n{self.cols} {self.rows}\n255\n".encode("ascii")
+        return header + levels[self.cells].tobytes()
+
+    # ===== 索引轉換 =====
+    @property
+    def size(self) -> int:
+        return self.rows * self.cols
+
+    @property
+    def flat(self) -> np.ndarray:
+        """一維視圖 (不複製資料)"""
+        return self.cells.reshape(-1)
+
+    def index(self, row: int, col: int) -> int:
+        return row * self.cols + col
+
+    def coords(self, index: int) -> Position:
+        return divmod(index, self.cols)
+
+    def find(self, code: int) -> Optional[Position]:
+        """找出第一個等於 code 的格子 (向量化搜尋)"""
+        hits = np.flatnonzero(self.flat == code)
+        return self.coords(int(hits[0])) if hits.size else None
+
+    # ===== 鄰居 =====
+    @property
+    def neighbor_mask(self) -> np.ndarray:
+        """
+        每一格的鄰居遮罩 (uint8)，bit 為 1 代表那個方向在邊界內且不是牆
+
+        用陣列切片一次算完整張圖，不需要逐格檢查
+        """
+        if self._neighbor_mask is None:
+            passable = (self.cells != WALL_CODE).astype(np.uint8)
+            mask = np.zeros_like(self.cells)
+            mask[1:, :] |= passable[:-1, :] * UP
+            mask[:-1, :] |= passable[1:, :] * DOWN
+            mask[:, 1:] |= passable[:, :-1] * LEFT
+            mask[:, :-1] |= passable[:, 1:] * RIGHT
+            self._neighbor_mask = mask
+        return self._neighbor_mask
+
+    def neighbor_offsets(self, index: int) -> Tuple[int, ...]:
+        """回傳可走鄰居的扁平索引位移 (共用的 tuple，不會配置新物件)"""
+        return self.neighbor_deltas[self.neighbor_mask.flat[index]]
+
+    # ===== 修改 =====
+    def set_cell(self, row: int, col: int, code: int, weight: Optional[int] = None) -> None:
+        """
+        修改一格 (例如打通或封住一面牆)，同時讓鄰居遮罩與外部快取失效
+
+        weight 只在迷宮有成本資料時使用；None 代表保持原本的成本
+        """
+        self.cells[row, col] = code
+        if weight is not None:
+            if self.weights is None:
+                self.weights = np.ones_like(self.cells)
+            self.weights[row, col] = weight
+        self.touch()
+
+    def touch(self) -> None:
+        """直接改 cells / weights 陣列之後要呼叫，讓所有依賴格子內容的快取失效"""
+        self._neighbor_mask = None
+        self.version += 1
+
+    # ===== 相容 list of list 的介面 =====
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, row: int) -> str:
+        """maze[row][col] 仍然可以用，回傳那一列的字串 (有成本的格子顯示成數字)"""
+        chars = CODE_TO_CHAR[self.cells[row]]
+        if self.weights is not None:
+            weights = self.weights[row]
+            chars = np.where(weights > 1, weights + np.uint8(ord("0")), chars)
+        return chars.tobytes().decode("latin-1")
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(self.rows):
+            yield self[row]
+
+    def to_rows(self) -> List[List[str]]:
+        """轉回 list of list"""
+        return [list(row) for row in self]
@@ -0,0 +1,138 @@
+"""
+迷宮的 curses 繪圖工具
+
+print_maze 負責把迷宮畫到 stdscr 上；
+CursesObserver / IncrementalCursesObserver 是 maze_solver.solve 的觀察者，只有需要動畫時才傳進去。
+"""
+import curses
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from maze_solver import Maze, Position, SearchFrame
+
+# 格子狀態，數字越小優先權越高 (同一格同時是路徑和 frontier 時畫成路徑)
+PATH = 0
+FRONTIER = 1
+VISITED = 2
+BASE = 3
+
+
+def init_colors() -> None:
+    """設定繪圖用的顏色 (必須在 curses.wrapper 裡面呼叫)"""
+    curses.init_pair(1, curses.COLOR_BLUE, curses.COLOR_BLACK)    # 牆壁 / 空地
+    curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)     # 路徑
+    curses.init_pair(3, curses.COLOR_GREEN, curses.COLOR_BLACK)   # frontier
+    curses.init_pair(4, curses.COLOR_YELLOW, curses.COLOR_BLACK)  # 已展開
+
+
+def print_maze(maze: Maze, stdscr, path: Iterable[Position] = ()) -> None:
+    """畫出迷宮 (list of list 或 MazeGrid)，路徑上的格子用紅色 X 表示"""
+    BLUE = curses.color_pair(1)
+    RED = curses.color_pair(2)
+    path = set(path)  # 每格都要查詢一次，用 Set 比 List 快
+
+    for i, row in enumerate(maze):
+        for j, value in enumerate(row):
+            if (i, j) in path:
+                stdscr.addstr(i, j*2, "X", RED)
+            else:
+                stdscr.addstr(i, j*2, value, BLUE)
+
+
+class CursesObserver:
+    """把每一個搜尋 frame 畫到終端機上的觀察者 (每次都清空重畫整張圖)"""
+
+    def __init__(self, maze: Maze, stdscr, delay: float = 0.2):
+        self.maze = maze
+        self.stdscr = stdscr
+        self.delay = delay
+
+    def on_frame(self, frame: SearchFrame) -> None:
+        self.stdscr.clear()
+        print_maze(self.maze, self.stdscr, frame.path)
+        time.sleep(self.delay)  # 注意：這個 sleep 會佔據大部分的執行時間
+        self.stdscr.refresh()
+
+
+class IncrementalCursesObserver:
+    """
+    差異式 (diff-based) 繪圖的觀察者
+
+    第一個 frame 畫一次完整的迷宮，之後只重畫「狀態有改變」的格子：
+    路徑 (紅 X)、frontier (綠 +)、已展開 (黃 .)。
+    路徑和 frontier 都用 Set 保存，和上一個 frame 做對稱差集就知道哪些格子變了，
+    不需要 stdscr.clear()，也不用每一格都 addstr，大迷宮的動畫也很省 CPU。
+    """
+
+    def __init__(self, maze: Maze, stdscr, delay: float = 0.2):
+        self.rows = [row for row in maze]  # MazeGrid 的每一列先轉成字串，之後查詢不用再解碼
+        self.stdscr = stdscr
+        self.delay = delay
+        self._path: Set[Position] = set()
+        self._frontier: Set[Position] = set()
+        self._visited: Set[Position] = set()
+        self._drawn: Dict[Position, int] = {}  # 畫面上目前不是 BASE 的格子
+        self._started = False
+        self.cells_drawn = 0  # 統計實際呼叫 addstr 的次數
+
+    def _state(self, pos: Position) -> int:
+        if pos in self._path:
+            return PATH
+        if pos in self._frontier:
+            return FRONTIER
+        if pos in self._visited:
+            return VISITED
+        return BASE
+
+    def _draw(self, pos: Position, state: int) -> None:
+        row, col = pos
+        if state == PATH:
+            self.stdscr.addstr(row, col*2, "X", curses.color_pair(2))
+        elif state == FRONTIER:
+            self.stdscr.addstr(row, col*2, "+", curses.color_pair(3))
+        elif state == VISITED:
+            self.stdscr.addstr(row, col*2, ".", curses.color_pair(4))
+        else:
+            self.stdscr.addstr(row, col*2, self.rows[row][col], curses.color_pair(1))
+        self.cells_drawn += 1
+
+    def on_frame(self, frame: SearchFrame) -> None:
+        if not self._started:
+            self.stdscr.clear()
+            print_maze(self.rows, self.stdscr)
+            self.cells_drawn += sum(len(row) for row in self.rows)
+            self._started = True
+
+        path = set(frame.path)
+        frontier = set(frame.frontier)
+        changed = (path ^ self._path) | (frontier ^ self._frontier)
+        if frame.current not in self._visited:
+            self._visited.add(frame.current)
+            changed.add(frame.current)
+        self._path, self._frontier = path, frontier
+
+        for pos in changed:
+            state = self._state(pos)
+            if self._drawn.get(pos, BASE) == state:
+                continue
+            self._draw(pos, state)
+            if state == BASE:
+                self._drawn.pop(pos, None)
+            else:
+                self._drawn[pos] = state
+
+        self.stdscr.refresh()
+        time.sleep(self.delay)
+
+    def finish(self, path: Optional[Iterable[Position]] = None) -> None:
+        """搜尋結束：清掉 frontier / 已展開的標記，只留下最終路徑"""
+        final = set(path or ())
+        self._path, self._frontier, self._visited = final, set(), set()
+        for pos in list(self._drawn) + list(final):
+            state = self._state(pos)
+            if self._drawn.get(pos, BASE) != state:
+                self._draw(pos, state)
+                self._drawn[pos] = state
+            if state == BASE:
+                self._drawn.pop(pos, None)
+        self.stdscr.refresh()
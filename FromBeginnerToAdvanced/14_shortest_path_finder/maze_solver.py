@@ -0,0 +1,439 @@
+"""
+無畫面 (Headless) 的迷宮求解引擎 (BFS / 雙向 BFS / A* / Dijkstra)
+
+輸入迷宮 (grid)，輸出路徑與統計資料 (path + stats)。
+這個模組完全不碰 curses，也不會 sleep，所以可以全速解大型迷宮；
+需要動畫時，再傳入一個 observer，每處理一個節點就會收到一個 frame。
+"""
+import heapq
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Protocol, Sequence, Union
+
+from maze_grid import END, END_CODE, START, START_CODE, MazeGrid, Position
+
+Maze = Union[Sequence[Sequence[str]], MazeGrid]
+
+
+# ===== 資料模型 =====
+@dataclass
+class SearchFrame:
+    """搜尋過程中的一個畫面 (每次從 frontier 取出節點時產生)"""
+    current: Position
+    path: List[Position]
+    visited_count: int
+    frontier_size: int
+    frontier: List[Position] = field(default_factory=list)  # 還在等待展開的節點
+
+
+@dataclass
+class SolveStats:
+    """搜尋統計資料"""
+    nodes_expanded: int = 0    # 從 frontier 取出並展開的節點數
+    nodes_discovered: int = 0  # 曾經被加入 frontier 的節點數
+    elapsed: float = 0.0       # 耗時 (秒)
+
+
+@dataclass
+class SolveResult:
+    """求解結果資料模型"""
+    path: Optional[List[Position]]
+    start: Optional[Position]
+    stats: SolveStats = field(default_factory=SolveStats)
+    strategy: str = "bfs"
+    cost: int = -1  # 路徑總成本 (沒有成本格子時等於步數)，找不到路徑時為 -1
+
+    @property
+    def found(self) -> bool:
+        return self.path is not None
+
+    @property
+    def length(self) -> int:
+        """路徑長度 (步數)，找不到路徑時為 -1"""
+        return len(self.path) - 1 if self.path else -1
+
+
+# ===== 介面定義 =====
+class ISolverObserver(Protocol):
+    """搜尋過程觀察者介面 (例如 curses 動畫)"""
+
+    def on_frame(self, frame: SearchFrame) -> None: ...
+
+
+# ===== 工具函式 =====
+def as_grid(maze: Maze, start: str = START, end: str = END) -> MazeGrid:
+    """把 list of list 迷宮轉成 MazeGrid (已經是 MazeGrid 就直接用)"""
+    if isinstance(maze, MazeGrid):
+        return maze
+    return MazeGrid.from_rows(maze, start=start, end=end)
+
+
+def find_start(maze: Maze, start: str = START) -> Optional[Position]:
+    """找出指定符號的座標"""
+    if isinstance(maze, MazeGrid) and start == START:
+        return maze.find(START_CODE)  # 向量化搜尋
+    for i, row in enumerate(maze):
+        for j, value in enumerate(row):
+            if value == start:
+                return i, j
+    return None
+
+
+def find_neighbors(maze: Maze, row: int, col: int) -> List[Position]:
+    """上下左右四個方向的鄰居 (只檢查邊界，不檢查牆壁)"""
+    neighbors = []
+    if row > 0: neighbors.append((row - 1, col))
+    if row + 1 < len(maze): neighbors.append((row + 1, col))
+    if col > 0: neighbors.append((row, col - 1))
+    if col + 1 < len(maze[0]): neighbors.append((row, col + 1))
+    return neighbors
+
+
+# ===== 路徑重建 =====
+def reconstruct_path(parents, end_index: int, cols: int) -> List[Position]:
+    """
+    沿著 parent 表從終點走回起點，最後反轉一次
+
+    parents 可以是 dict 或扁平陣列 (index = row * cols + col)，起點的 parent 指向自己
+    """
+    path = []
+    index = end_index
+    while True:
+        path.append(divmod(index, cols))
+        prev = parents[index]
+        if prev == index:
+            break
+        index = prev
+    path.reverse()
+    return path
+
+
+# ===== 求解引擎 =====
+# 三種模式都走扁平索引：cells / masks 是 numpy 陣列的 memoryview (不複製)，
+# 鄰居直接查 grid.neighbor_deltas[mask]，遮罩已經排除牆壁與邊界。
+# 搜尋是單執行緒的，frontier 不用 queue.Queue (每次 put/get 都要拿鎖、通知 condition)，
+# 改用 collections.deque 或預先配置好的陣列 (見 benchmark_frontier.py)
+def _lookup_tables(grid: MazeGrid):
+    """BFS 迴圈要用的查表資料：(格子代碼, 鄰居遮罩, 遮罩 -> 位移表, 欄數)"""
+    cells = memoryview(grid.flat)
+    masks = memoryview(grid.neighbor_mask.reshape(-1))
+    return cells, masks, grid.neighbor_deltas, grid.cols
+
+
+def _bfs_copy(grid: MazeGrid, start_index: int, observer, stats) -> Optional[List[Position]]:
+    """
+    每次加入鄰居都複製一份路徑 (path + [neighbor])
+
+    簡單直覺，但記憶體與時間都是 O(V·L)：長走廊會讓它爆掉
+    """
+    cells, masks, deltas, cols = _lookup_tables(grid)
+    q = deque([(start_index, [start_index])])
+    visited = {start_index}  # Set 的查詢是 O(1)
+    stats.nodes_discovered = 1
+
+    while q:
+        index, path = q.popleft()
+        stats.nodes_expanded += 1
+
+        if observer is not None:
+            positions = [divmod(i, cols) for i in path]
+            frontier = [divmod(i, cols) for i, _ in q]
+            observer.on_frame(SearchFrame(positions[-1], positions, len(visited), len(q), frontier))
+
+        if cells[index] == END_CODE:
+            return [divmod(i, cols) for i in path]
+
+        for delta in deltas[masks[index]]:
+            neighbor = index + delta
+            if neighbor in visited:
+                continue
+
+            q.append((neighbor, path + [neighbor]))
+            visited.add(neighbor)
+            stats.nodes_discovered += 1
+
+    return None
+
+
+def _bfs_parents(grid: MazeGrid, start_index: int, observer, stats) -> Optional[List[Position]]:
+    """
+    用 predecessor map (dict) 記錄每個節點是從哪裡來的
+
+    frontier 裡只放索引，找到終點時才重建一次路徑：O(V + L)
+    dict 同時也是 visited，不需要另外的 Set
+    """
+    cells, masks, deltas, cols = _lookup_tables(grid)
+    q = deque([start_index])
+    parents: Dict[int, int] = {start_index: start_index}
+    stats.nodes_discovered = 1
+
+    while q:
+        index = q.popleft()
+        stats.nodes_expanded += 1
+
+        if observer is not None:
+            path = reconstruct_path(parents, index, cols)
+            frontier = [divmod(i, cols) for i in q]
+            observer.on_frame(SearchFrame(path[-1], path, len(parents), len(q), frontier))
+
+        if cells[index] == END_CODE:
+            return reconstruct_path(parents, index, cols)
+
+        for delta in deltas[masks[index]]:
+            neighbor = index + delta
+            if neighbor in parents:
+                continue
+
+            q.append(neighbor)
+            parents[neighbor] = index
+            stats.nodes_discovered += 1
+
+    return None
+
+
+def _bfs_array(grid: MazeGrid, start_index: int, observer, stats) -> Optional[List[Position]]:
+    """
+    用扁平的整數陣列當 parent 表
+
+    每個格子只佔 4 bytes，比 dict 省很多記憶體；-1 代表還沒走過
+    每個格子最多進 frontier 一次，所以 frontier 直接用一個預先配置好、長度 V 的陣列，
+    head / tail 兩個指標往前移動就好，完全不需要配置新物件
+    """
+    cells, masks, deltas, cols = _lookup_tables(grid)
+    parent = array("i", [-1]) * grid.size
+    parent[start_index] = start_index
+    frontier = array("i", bytes(4 * grid.size))
+    frontier[0] = start_index
+    head, tail = 0, 1
+
+    try:
+        while head < tail:
+            index = frontier[head]
+            head += 1
+
+            if observer is not None:
+                path = reconstruct_path(parent, index, cols)
+                waiting = [divmod(i, cols) for i in frontier[head:tail]]
+                observer.on_frame(SearchFrame(path[-1], path, tail, tail - head, waiting))
+
+            if cells[index] == END_CODE:
+                return reconstruct_path(parent, index, cols)
+
+            for delta in deltas[masks[index]]:
+                neighbor = index + delta
+                if parent[neighbor] != -1:
+                    continue
+
+                frontier[tail] = neighbor
+                tail += 1
+                parent[neighbor] = index
+    finally:
+        # 計數器用區域變數，最後才寫回 stats，迴圈裡少一次屬性存取
+        stats.nodes_expanded = head
+        stats.nodes_discovered = tail
+
+    return None
+
+
+PATH_MODES = {
+    "copy": _bfs_copy,
+    "parents": _bfs_parents,
+    "array": _bfs_array,
+}
+
+
+# ===== 其他搜尋策略 =====
+def _bidirectional_bfs(grid: MazeGrid, start_index: int, observer, stats) -> Optional[List[Position]]:
+    """
+    雙向 BFS：同時從起點和終點往中間搜尋，每次展開比較小的那一邊一整層
+
+    兩邊各走一半，展開的節點數大約是單向 BFS 的平方根等級 (空曠的迷宮特別明顯)
+    一整層展開完才停止，並從這一層所有的相遇點中挑最短的，保證是最短路徑
+    """
+    end_pos = grid.find(END_CODE)
+    if end_pos is None:
+        return None
+    _, masks, deltas, cols = _lookup_tables(grid)
+    end_index = grid.index(*end_pos)
+
+    # 兩邊各自的 parent 表與距離 (parent 表同時也是 visited)
+    sides = [
+        ({start_index: start_index}, {start_index: 0}, [start_index]),  # 從起點出發
+        ({end_index: end_index}, {end_index: 0}, [end_index]),          # 從終點出發
+    ]
+    stats.nodes_discovered = 2
+
+    while sides[0][2] and sides[1][2]:
+        side = 0 if len(sides[0][2]) <= len(sides[1][2]) else 1
+        parents, dist, frontier = sides[side]
+        _, other_dist, _ = sides[1 - side]
+        best = None  # (總長度, 這邊的節點, 另一邊的節點)
+        next_frontier = []
+
+        for position, index in enumerate(frontier):
+            stats.nodes_expanded += 1
+            if observer is not None:
+                path = reconstruct_path(parents, index, cols)
+                waiting = [divmod(i, cols) for i in (*frontier[position + 1:], *next_frontier, *sides[1 - side][2])]
+                observer.on_frame(SearchFrame(path[-1], path, len(parents) + len(other_dist), len(waiting), waiting))
+
+            for delta in deltas[masks[index]]:
+                neighbor = index + delta
+                if neighbor in other_dist:
+                    total = dist[index] + 1 + other_dist[neighbor]
+                    if best is None or total < best[0]:
+                        best = (total, index, neighbor)
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = index
+                dist[neighbor] = dist[index] + 1
+                next_frontier.append(neighbor)
+                stats.nodes_discovered += 1
+
+        if best is not None:
+            _, here, there = best
+            near = reconstruct_path(parents, here, cols)
+            far = reconstruct_path(sides[1 - side][0], there, cols)
+            far.reverse()  # 另一邊的根 -> there 反轉成 there -> 根
+            path = near + far
+            return path if side == 0 else path[::-1]
+        sides[side] = (parents, dist, next_frontier)
+
+    return None
+
+
+def _weighted_search(grid: MazeGrid, start_index: int, observer, stats, heuristic: bool) -> Optional[List[Position]]:
+    """
+    Dijkstra / A* 共用的 heapq 搜尋
+
+    走進一格的成本是 grid.weights (沒有的話每格都是 1)；
+    heuristic=True 時加上到終點的曼哈頓距離 (每格成本至少 1，所以不會高估，仍然保證最短)
+    """
+    cells, masks, deltas, cols = _lookup_tables(grid)
+    weights = memoryview(grid.weights.reshape(-1)) if grid.weights is not None else None
+    end_row, end_col = 0, 0
+    if heuristic:
+        end_pos = grid.find(END_CODE)
+        if end_pos is None:
+            return None
+        end_row, end_col = end_pos
+
+    def estimate(index: int) -> int:
+        if not heuristic:
+            return 0
+        row, col = divmod(index, cols)
+        return abs(row - end_row) + abs(col - end_col)
+
+    cost: Dict[int, int] = {start_index: 0}
+    parents: Dict[int, int] = {start_index: start_index}
+    # (f = g + h, h, index)：f 相同時先展開離終點比較近的
+    heap = [(estimate(start_index), estimate(start_index), start_index)]
+    closed = set()
+    stats.nodes_discovered = 1
+
+    while heap:
+        _, _, index = heapq.heappop(heap)
+        if index in closed:
+            continue  # 已經用更便宜的成本展開過了 (heap 裡的舊資料)
+        closed.add(index)
+        stats.nodes_expanded += 1
+
+        if observer is not None:
+            path = reconstruct_path(parents, index, cols)
+            frontier = [divmod(i, cols) for _, _, i in heap]
+            observer.on_frame(SearchFrame(path[-1], path, len(cost), len(heap), frontier))
+
+        if cells[index] == END_CODE:
+            return reconstruct_path(parents, index, cols)
+
+        for delta in deltas[masks[index]]:
+            neighbor = index + delta
+            if neighbor in closed:
+                continue
+            new_cost = cost[index] + (weights[neighbor] if weights is not None else 1)
+            if new_cost >= cost.get(neighbor, new_cost + 1):
+                continue
+            if neighbor not in cost:
+                stats.nodes_discovered += 1
+            cost[neighbor] = new_cost
+            parents[neighbor] = index
+            h = estimate(neighbor)
+            heapq.heappush(heap, (new_cost + h, h, neighbor))
+
+    return None
+
+
+def _dijkstra(grid: MazeGrid, start_index: int, observer, stats) -> Optional[List[Position]]:
+    """Dijkstra：依照累積成本由小到大展開，適合有成本的格子"""
+    return _weighted_search(grid, start_index, observer, stats, heuristic=False)
+
+
+def _astar(grid: MazeGrid, start_index: int, observer, stats) -> Optional[List[Position]]:
+    """A*：Dijkstra + 曼哈頓距離，朝終點方向優先展開"""
+    return _weighted_search(grid, start_index, observer, stats, heuristic=True)
+
+
+# 策略名稱 -> 搜尋函式；"bfs" 實際使用哪一個由 path_mode 決定
+STRATEGIES = {
+    "bfs": _bfs_parents,
+    "bidirectional": _bidirectional_bfs,
+    "astar": _astar,
+    "dijkstra": _dijkstra,
+}
+
+
+def path_cost(grid: MazeGrid, path: List[Position]) -> int:
+    """路徑總成本 (不含起點)；沒有成本資料時就是步數"""
+    if grid.weights is None:
+        return len(path) - 1
+    weights, cols = memoryview(grid.weights.reshape(-1)), grid.cols
+    return sum(weights[r * cols + c] for r, c in path[1:])
+
+
+def solve(
+    maze: Maze,
+    start: str = START,
+    end: str = END,
+    observer: Optional[ISolverObserver] = None,
+    path_mode: str = "parents",
+    strategy: str = "bfs",
+) -> SolveResult:
+    """
+    找出從 start 到 end 的最短路徑
+
+    Args:
+        maze: 二維迷宮 (list of list 或 MazeGrid)
+        start: 起點符號 (只在 maze 是 list of list 時使用)
+        end: 終點符號 (只在 maze 是 list of list 時使用)
+        observer: 可選的觀察者，每展開一個節點就呼叫 observer.on_frame(frame)
+        path_mode: 路徑記錄方式
+            "copy"    - 每個節點複製一份路徑 (舊做法，O(V·L))
+            "parents" - predecessor map，最後重建一次路徑 (預設)
+            "array"   - 扁平整數陣列 parent 表，最省記憶體
+        strategy: 搜尋策略
+            "bfs"           - 廣度優先 (預設，不看格子成本)
+            "bidirectional" - 雙向 BFS (不看格子成本)
+            "astar"         - A* + 曼哈頓距離 (會看格子成本)
+            "dijkstra"      - Dijkstra (會看格子成本)
+
+    Returns:
+        SolveResult: 路徑 (找不到時為 None) 與統計資料
+    """
+    if path_mode not in PATH_MODES:
+        raise ValueError(f"未知的 path_mode: {path_mode}，可用: {list(PATH_MODES)}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未知的 strategy: {strategy}，可用: {list(STRATEGIES)}")
+    search = PATH_MODES[path_mode] if strategy == "bfs" else STRATEGIES[strategy]
+
+    started = time.perf_counter()
+    stats = SolveStats()
+    grid = as_grid(maze, start, end)
+    start_pos = grid.find(START_CODE)
+    path = None
+    if start_pos is not None:
+        path = search(grid, grid.index(*start_pos), observer, stats)
+    stats.elapsed = time.perf_counter() - started
+    cost = path_cost(grid, path) if path else -1
+    return SolveResult(path=path, start=start_pos, stats=stats, strategy=strategy, cost=cost)
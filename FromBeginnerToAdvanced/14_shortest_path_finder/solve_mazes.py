@@ -0,0 +1,143 @@
+"""
+批次迷宮求解 CLI
+
+讀取大量迷宮檔案 (ASCII 文字 或 二進位 PGM)，用無畫面的 maze_solver 在 Process Pool 裡平行求解，
+每個迷宮輸出一行 JSON (JSONL)，方便一次回歸測試上千個迷宮。
+
+檔案格式:
+    *.txt / *.maze  ASCII：'#' 牆、' ' 空地、'O' 起點、'X' 終點，每行一列
+    *.pgm           二進位 PGM (P5)：0 牆、100 起點、200 終點、其他空地
+
+用法:
+    python solve_mazes.py mazes/ --workers 4 --output results.jsonl
+    python solve_mazes.py a.txt b.pgm --path-mode array
+    python solve_mazes.py mazes/ --strategy astar
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from maze_grid import MazeGrid
+from maze_solver import PATH_MODES, STRATEGIES, solve
+
+MAZE_SUFFIXES = {".txt", ".maze", ".pgm"}
+
+
+def load_maze(path: Path) -> MazeGrid:
+    """
+    用 mmap 讀取迷宮檔案
+
+    檔案內容直接映射到記憶體，由作業系統按需載入，不需要先 read() 成一個大字串；
+    解析完成後 MazeGrid 只保留 uint8 格子，mmap 就可以關掉
+    """
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("迷宮檔案是空的")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if path.suffix.lower() == ".pgm" or mm[:2] == b"P5":
+                return MazeGrid.from_pgm_bytes(mm)
+            return MazeGrid.from_ascii_bytes(mm)
+
+
+def solve_file(path: str, path_mode: str = "array", strategy: str = "bfs") -> Dict[str, Any]:
+    """在 worker process 裡載入並求解一個迷宮，回傳一筆可以寫成 JSON 的結果"""
+    record: Dict[str, Any] = {"file": path}
+    try:
+        started = time.perf_counter()
+        grid = load_maze(Path(path))
+        load_time = time.perf_counter() - started
+
+        result = solve(grid, path_mode=path_mode, strategy=strategy)
+        record.update(
+            rows=grid.rows,
+            cols=grid.cols,
+            strategy=strategy,
+            found=result.found,
+            length=result.length,
+            cost=result.cost,
+            nodes_expanded=result.stats.nodes_expanded,
+            load_ms=round(load_time * 1000, 3),
+            solve_ms=round(result.stats.elapsed * 1000, 3),
+        )
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def collect_maze_files(inputs: Iterable[str]) -> List[str]:
+    """展開輸入：檔案直接使用，資料夾則遞迴找出所有迷宮檔案 (排序後回傳)"""
+    files: List[str] = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(
+                str(p) for p in sorted(path.rglob("*"))
+                if p.is_file() and p.suffix.lower() in MAZE_SUFFIXES
+            )
+        else:
+            files.append(str(path))
+    return files
+
+
+def solve_many(
+    files: List[str],
+    workers: Optional[int] = None,
+    path_mode: str = "array",
+    strategy: str = "bfs",
+) -> Iterator[Dict[str, Any]]:
+    """平行求解，依照輸入順序逐筆產生結果 (方便和上一次的輸出做 diff)"""
+    if workers == 1:
+        for path in files:
+            yield solve_file(path, path_mode, strategy)
+        return
+
+    # 迷宮很小時每個 task 的 IPC 成本比求解還高，所以一次送一批
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(
+            solve_file, files, [path_mode] * len(files), [strategy] * len(files), chunksize=chunksize
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="批次求解迷宮檔案，輸出 JSONL")
+    parser.add_argument("inputs", nargs="+", help="迷宮檔案或資料夾")
+    parser.add_argument("-o", "--output", help="JSONL 輸出檔 (預設輸出到 stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="process 數量 (預設 CPU 核心數，1 = 不開 process)")
+    parser.add_argument("--path-mode", choices=list(PATH_MODES), default="array", help="BFS 的路徑記錄方式")
+    parser.add_argument("-s", "--strategy", choices=list(STRATEGIES), default="bfs", help="搜尋策略")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    files = collect_maze_files(args.inputs)
+    if not files:
+        print("錯誤：找不到任何迷宮檔案。", file=sys.stderr)
+        return 1
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    started = time.perf_counter()
+    try:
+        for record in solve_many(files, args.workers, args.path_mode, args.strategy):
+            failures += "error" in record
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    duration = time.perf_counter() - started
+    print(f"✅ 完成 {len(files)} 個迷宮 (失敗 {failures} 個)，總耗時 {duration:.2f} 秒", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
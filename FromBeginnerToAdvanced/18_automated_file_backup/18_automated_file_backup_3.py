@@ -181,7 +181,9 @@ class AutomatedFileBackup:
         try:
             while True:
                 schedule.run_pending()
-                time.sleep(60)
+                # 直接睡到下一個工作到期，不用每 60 秒醒來檢查一次
+                idle = schedule.idle_seconds()
+                time.sleep(3600 if idle is None else max(0, idle))
         except KeyboardInterrupt:
             self.logger.info("收到中斷信號，正在停止排程器...")
         except Exception as e:
@@ -1,15 +1,34 @@
 import os
+import math
 import shutil
 import datetime
 import schedule
 import time
+import threading
 import logging
 import logging.handlers
+import queue
+import atexit
 from pathlib import Path
-from typing import Optional, Protocol, Dict, Any, Callable, Union
+from typing import Optional, Protocol, Dict, Any, Callable, List, Union
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
 
+from archive_writer import FORMATS as ARCHIVE_FORMATS, create_archive, list_archive
+from backup_journal import REPLACED_PREFIX, BackupJournal, find_partials, journal_path, journal_source, partial_path
+from backup_metrics import RunMetrics, SlowestFiles, SlowFile, timed, write_metrics
+from backup_manifest import IncrementalCopier, IncrementalStats, Manifest, manifest_path
+from chunk_store import ChunkStore
+from event_scheduler import CronExpression, EventScheduler
+from file_hashing import DEFAULT_ALGORITHM, hash_many, sample_paths
+from file_watcher import DebouncedQueue, InotifyWatcher, sync_paths, sync_tree
+from parallel_copy import ParallelCopier
+from rate_limiter import Throttle
+from retention import RetentionPolicy, SnapshotPruner
+from tree_scan import TreeSummary, scan_tree
+from zero_copy import ZeroCopier
+
 
 # ===== 資料模型 =====
 @dataclass
@@ -22,6 +41,14 @@ class BackupResult:
     duration: Optional[float] = None
     file_count: Optional[int] = None
     total_size: Optional[int] = None
+    files_copied: Optional[int] = None  # 增量模式：實際複製的檔案數
+    files_linked: Optional[int] = None  # 增量模式：從上一個快照硬連結的檔案數
+    bytes_per_second: Optional[float] = None  # 複製吞吐量 (實際寫入的 bytes / 複製耗時)
+    files_per_second: Optional[float] = None
+    bytes_stored: Optional[int] = None  # 去重複模式：實際新寫入倉庫的 bytes
+    compressed_size: Optional[int] = None  # 封存模式：壓縮檔大小
+    phases: Dict[str, float] = field(default_factory=dict)  # 各階段耗時 (scan / copy / validate / publish)
+    slowest_files: List[SlowFile] = field(default_factory=list)  # 複製最久的文件 (由慢到快)
 
 
 @dataclass
@@ -30,14 +57,50 @@ class BackupConfiguration:
     source_dir: Union[str, Path]
     destination_dir: Union[str, Path]
     schedule_time: str = "18:57"
+    schedule_cron: Optional[str] = None  # cron 運算式 (分 時 日 月 星期)，設定時取代 schedule_time
     max_log_size: int = field(default=5 * 1024 * 1024)  # 5MB
     log_backup_count: int = 5
     enable_validation: bool = True
+    incremental: bool = False  # 只複製新增 / 修改的檔案，其餘從上一個快照硬連結
+    copy_workers: int = 1  # > 1 時使用多執行緒複製 (ParallelFileOperations；只用在完整複製，就地更新是逐一複製)
+    copy_method: str = "copy2"  # "copy2" (shutil.copy2) 或 "zero_copy" (reflink / copy_file_range / sendfile)；同上
+    deduplicate: bool = False  # 存進 destination_dir/store 的去重複倉庫，不建立日期資料夾
+    validation_mode: str = "count"  # "count" 比對文件清單、"hash" 比對所有文件雜湊、"sample" 抽樣比對雜湊
+    validation_sample_ratio: float = 0.05  # "sample" 模式抽查的比例
+    validation_workers: Optional[int] = None  # 計算雜湊的 process 數 (None = 依文件數自動決定)
+    output_format: str = "directory"  # "directory" 資料夾複本、"tar.gz" / "tar.zst" 壓縮封存
+    compression_workers: Optional[int] = None  # 壓縮執行緒數 (None = CPU 核心數)
+    watch_debounce: float = 2.0  # watch 模式：安靜多少秒後同步這一批變動
+    watch_max_delay: float = 30.0  # watch 模式：一直有變動時最多延遲幾秒
+    update_in_place: bool = True  # 同一天重跑時以今天的快照為基礎只同步變動 (在硬連結複本上更新，驗證後替換；False = 重新複製)
+    keep_daily: int = 0  # 保留策略：最近幾天各留一個快照 (三個都是 0 表示不清理)
+    keep_weekly: int = 0  # 保留策略：最近幾週各留一個
+    keep_monthly: int = 0  # 保留策略：最近幾個月各留一個
+    prune_max_files_per_second: float = 500.0  # 背景清理每秒最多刪除幾個文件 (0 = 不限制)
+    metrics_file: Optional[Union[str, Path]] = None  # 每次備份後寫出指標：*.prom (Prometheus)、*.json、*.jsonl (追加)
+    metrics_slowest_files: int = 10  # 指標裡列出幾個複製最久的文件
+    copy_max_bytes_per_second: float = 0  # 複製限速：每秒最多幾 bytes (0 = 不限制)
+    copy_max_files_per_second: float = 0  # 複製限速：每秒最多幾個文件 (0 = 不限制)
+    adaptive_throttle: bool = False  # 來源磁碟延遲上升時自動降低複製速度 (需要設定上面的限速)
+    throttle_target_latency: Optional[float] = None  # 自適應限速的延遲門檻秒數 (None = 依照量測到的基準自動決定)
+    async_logging: bool = False  # 由背景執行緒寫 log (QueueHandler / QueueListener)，呼叫端不會等待磁碟 I/O
+    log_queue_size: int = 10000  # 非同步 log 佇列的上限 (滿了呼叫端會等待)
     
     def __post_init__(self):
         """後處理：確保路徑是 Path 物件"""
         self.source_dir = Path(self.source_dir)
         self.destination_dir = Path(self.destination_dir)
+        if self.copy_method not in ("copy2", "zero_copy"):
+            raise ValueError(f"未知的 copy_method: {self.copy_method}")
+        if self.validation_mode not in ("count", "hash", "sample"):
+            raise ValueError(f"未知的 validation_mode: {self.validation_mode}")
+        if self.output_format != "directory" and self.output_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"未知的 output_format: {self.output_format}")
+        if self.incremental and (self.copy_workers > 1 or self.copy_method != "copy2"):
+            # 增量模式一邊複製一邊計算雜湊 (backup_manifest.copy_and_hash)，不會用到多執行緒或 zero-copy
+            raise ValueError("incremental 模式不支援 copy_workers / copy_method，請保留預設值")
+        if self.adaptive_throttle and not (self.copy_max_bytes_per_second or self.copy_max_files_per_second):
+            raise ValueError("adaptive_throttle 需要設定 copy_max_bytes_per_second 或 copy_max_files_per_second")
 
 
 class LogLevel(Enum):
@@ -53,54 +116,144 @@ class LogLevel(Enum):
 class ILogger(Protocol):
     """日誌介面"""
     
-    def debug(self, message: str) -> None: ...
-    def info(self, message: str) -> None: ...
-    def warning(self, message: str) -> None: ...
-    def error(self, message: str) -> None: ...
-    def critical(self, message: str) -> None: ...
+    def debug(self, message: str, *args: Any) -> None: ...
+    def info(self, message: str, *args: Any) -> None: ...
+    def warning(self, message: str, *args: Any) -> None: ...
+    def error(self, message: str, *args: Any) -> None: ...
+    def critical(self, message: str, *args: Any) -> None: ...
 
 
 class IFileOperations(Protocol):
     """文件操作介面"""
     
-    def copy_directory(self, source: Path, destination: Path) -> bool: ...
+    def copy_directory(
+        self,
+        source: Path,
+        destination: Path,
+        summary: Optional[TreeSummary] = None,
+        journal: Optional[BackupJournal] = None
+    ) -> bool: ...
     def delete_directory(self, path: Path) -> bool: ...
     def get_directory_size(self, path: Path) -> int: ...
     def count_files(self, path: Path) -> int: ...
     def directory_exists(self, path: Path) -> bool: ...
+    def scan(self, path: Path) -> TreeSummary: ...
 
 
 class IScheduler(Protocol):
     """排程器介面"""
     
     def schedule_daily(self, time_str: str, job_func: Callable[[], Any]) -> None: ...
+    def schedule_cron(self, expression: str, job_func: Callable[[], Any]) -> Any: ...
     def run_pending(self) -> None: ...
+    def run_forever(self) -> None: ...
+    def stop(self) -> None: ...
     def clear_all(self) -> None: ...
 
 
 class IBackupValidator(Protocol):
     """備份驗證器介面"""
     
-    def validate(self, source: Path, backup: Path) -> bool: ...
+    def validate(self, source: Path, backup: Path, source_summary: Optional[TreeSummary] = None) -> bool: ...
 
 
 class IBackupService(Protocol):
     """備份服務介面"""
     
     def backup(self) -> BackupResult: ...
+    def wait_for_pruning(self, timeout: Optional[float] = None) -> None: ...
     def setup_schedule(self, time_str: str) -> None: ...
     def run_scheduler(self) -> None: ...
 
 
 # ===== 實作類別 =====
+class _BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler，累積 flush_every 筆才 flush 一次 (背景寫入執行緒在佇列清空時也會 flush)"""
+    
+    def __init__(self, *args: Any, flush_every: int = 100, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.flush_every = flush_every
+        self._pending = 0
+    
+    def flush(self) -> None:
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush_batch()
+    
+    def flush_batch(self) -> None:
+        self._pending = 0
+        super().flush()
+
+
+class _BackpressureQueueHandler(logging.handlers.QueueHandler):
+    """
+    把紀錄放進有上限的佇列；佇列滿了就等待 (背壓)，等了 timeout 秒還是滿的才丟掉並計數
+    
+    同一個行程裡的佇列不需要 pickle，所以不像預設的 prepare() 先格式化訊息，
+    %-style 的參數留給背景執行緒格式化
+    """
+    
+    def __init__(self, log_queue: queue.Queue, timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.timeout = timeout
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put(record, timeout=self.timeout)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BatchingQueueListener(logging.handlers.QueueListener):
+    """一次處理佇列裡所有的紀錄，佇列暫時空了才 flush 檔案"""
+    
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            if not block:
+                raise
+        for handler in self.handlers:
+            if isinstance(handler, _BatchedRotatingFileHandler):
+                handler.flush_batch()
+        return self.queue.get()
+    
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # 佇列滿的時候也要等到放得進去
+
+
 class FileLogger:
-    """文件日誌記錄器實作"""
+    """
+    文件日誌記錄器實作
     
-    def __init__(self, log_dir: Union[str, Path], max_bytes: int = 5*1024*1024, backup_count: int = 5):
+    訊息使用 %-style 參數 (logger.info("複製 %s 個文件", count))，只有真的要輸出時才格式化。
+    async_mode=True 時呼叫端只把紀錄放進佇列 (QueueHandler)，由背景執行緒 (QueueListener)
+    格式化並寫入終端機與檔案，複製文件的執行緒不會被寫 log 的磁碟 I/O 卡住
+    """
+    
+    def __init__(
+        self,
+        log_dir: Union[str, Path],
+        max_bytes: int = 5*1024*1024,
+        backup_count: int = 5,
+        async_mode: bool = False,
+        queue_size: int = 10000,
+        flush_every: int = 100
+    ):
         self.log_dir = Path(log_dir)
         self.max_bytes = max_bytes
         self.backup_count = backup_count
+        self.async_mode = async_mode
+        self.queue_size = queue_size
+        self.flush_every = flush_every
         self._logger: Optional[logging.Logger] = None
+        self._handlers: List[logging.Handler] = []
+        self._queue_handler: Optional[_BackpressureQueueHandler] = None
+        self._listener: Optional[_BatchingQueueListener] = None
     
     @property
     def logger(self) -> logging.Logger:
@@ -109,6 +262,11 @@ class FileLogger:
             self._logger = self._setup_logger()
         return self._logger
     
+    @property
+    def dropped(self) -> int:
+        """非同步模式下，佇列一直是滿的而被丟掉的紀錄數"""
+        return self._queue_handler.dropped if self._queue_handler else 0
+    
     def _setup_logger(self) -> logging.Logger:
         """設定 logger 配置"""
         logger = logging.getLogger('file_backup_di')
@@ -125,12 +283,13 @@ class FileLogger:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         
-        # 文件處理器 - 使用 RotatingFileHandler
-        file_handler = logging.handlers.RotatingFileHandler(
+        # 文件處理器 - 使用 RotatingFileHandler (非同步模式由背景執行緒分批 flush，同步模式每筆都 flush)
+        file_handler = _BatchedRotatingFileHandler(
             self.log_dir / 'backup_di.log',
             maxBytes=self.max_bytes,
             backupCount=self.backup_count,
-            encoding='utf-8'
+            encoding='utf-8',
+            flush_every=self.flush_every if self.async_mode else 1
         )
         file_handler.setLevel(logging.DEBUG)
         
@@ -143,81 +302,134 @@ class FileLogger:
         console_handler.setFormatter(formatter)
         file_handler.setFormatter(formatter)
         
-        logger.addHandler(console_handler)
-        logger.addHandler(file_handler)
+        if self.async_mode:
+            log_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+            self._queue_handler = _BackpressureQueueHandler(log_queue)
+            self._listener = _BatchingQueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+            self._listener.start()
+            self._handlers = [self._queue_handler]
+            atexit.register(self.close)  # 程式結束前把佇列裡剩下的紀錄寫完
+        else:
+            self._handlers = [console_handler, file_handler]
+        
+        for handler in self._handlers:
+            logger.addHandler(handler)
         
         return logger
     
-    def debug(self, message: str) -> None:
-        self.logger.debug(message)
+    def close(self) -> None:
+        """寫完佇列裡剩下的紀錄，移除並關閉 handler (之後再寫 log 會重新初始化)"""
+        if self._logger is None:
+            return
+        handlers = list(self._handlers)
+        if self._listener is not None:
+            self._listener.stop()
+            handlers.extend(self._listener.handlers)
+            self._listener = None
+            atexit.unregister(self.close)
+        for handler in handlers:
+            self._logger.removeHandler(handler)
+            handler.close()
+        if self.dropped:
+            logging.getLogger('file_backup_di').warning("日誌佇列已滿，丟掉了 %s 筆紀錄", self.dropped)
+        self._handlers = []
+        self._queue_handler = None
+        self._logger = None
+    
+    def debug(self, message: str, *args: Any) -> None:
+        self.logger.debug(message, *args)
     
-    def info(self, message: str) -> None:
-        self.logger.info(message)
+    def info(self, message: str, *args: Any) -> None:
+        self.logger.info(message, *args)
     
-    def warning(self, message: str) -> None:
-        self.logger.warning(message)
+    def warning(self, message: str, *args: Any) -> None:
+        self.logger.warning(message, *args)
     
-    def error(self, message: str) -> None:
-        self.logger.error(message)
+    def error(self, message: str, *args: Any) -> None:
+        self.logger.error(message, *args)
     
-    def critical(self, message: str) -> None:
-        self.logger.critical(message)
+    def critical(self, message: str, *args: Any) -> None:
+        self.logger.critical(message, *args)
 
 
 class FileOperations:
-    """文件操作實作"""
+    """文件操作實作 (throttle 不是 None 時限制複製的 bytes/s 與 files/s)"""
     
-    def __init__(self, logger: ILogger):
+    def __init__(self, logger: ILogger, throttle: Optional[Throttle] = None):
         self.logger = logger
+        self.throttle = throttle
     
-    def copy_directory(self, source: Path, destination: Path) -> bool:
-        """複製目錄"""
+    def copy_directory(
+        self,
+        source: Path,
+        destination: Path,
+        summary: Optional[TreeSummary] = None,
+        journal: Optional[BackupJournal] = None
+    ) -> bool:
+        """
+        複製目錄 (shutil.copytree 自己會走訪來源，用不到 summary)
+        
+        journal 不是 None 時每個文件完成後寫進日誌，續傳時略過已完成的文件
+        """
         try:
-            self.logger.info(f"開始複製目錄: {source} -> {destination}")
-            shutil.copytree(source, destination)
-            self.logger.info(f"目錄複製完成: {destination}")
+            self.logger.info("開始複製目錄: %s -> %s", source, destination)
+            copy_function = self._copy_function(shutil.copy2, journal)
+            shutil.copytree(source, destination, copy_function=copy_function, dirs_exist_ok=journal is not None)
+            self.logger.info("目錄複製完成: %s", destination)
+            self._log_throttle()
             return True
         except Exception as e:
-            self.logger.error(f"複製目錄失敗: {e}")
+            self.logger.error("複製目錄失敗: %s", e)
             return False
     
+    def _copy_function(self, copy_function: Callable, journal: Optional[BackupJournal]) -> Callable:
+        """加上限速與日誌 (日誌在外層：續傳時已完成的文件不佔限速額度)"""
+        if self.throttle is not None:
+            copy_function = self.throttle.wrap(copy_function)
+        return journal.wrap(copy_function) if journal else copy_function
+    
+    def _log_throttle(self) -> None:
+        if self.throttle is None or not self.throttle.waited:
+            return
+        if self.throttle.controller is None:
+            self.logger.info("限速: 累計等待 %.1f 秒", self.throttle.waited)
+        else:
+            self.logger.info(
+                "限速: 累計等待 %.1f 秒，因來源磁碟延遲降速 %s 次，目前速度倍率 %.2f",
+                self.throttle.waited,
+                self.throttle.controller.backoffs,
+                self.throttle.factor
+            )
+    
     def delete_directory(self, path: Path) -> bool:
         """刪除目錄"""
         try:
             if path.exists():
-                self.logger.info(f"刪除目錄: {path}")
+                self.logger.info("刪除目錄: %s", path)
                 shutil.rmtree(path)
                 return True
             return True
         except Exception as e:
-            self.logger.error(f"刪除目錄失敗: {e}")
+            self.logger.error("刪除目錄失敗: %s", e)
             return False
     
+    def scan(self, path: Path) -> TreeSummary:
+        """單次走訪目錄，取得檔案數、總大小與每個檔案的 metadata"""
+        summary = scan_tree(path)
+        for error in summary.errors:
+            self.logger.warning("掃描目錄時發生錯誤: %s", error)
+        self.logger.debug(
+            "目錄 %s 文件數量: %s, 大小: %s", path, summary.file_count, self._format_size(summary.total_size)
+        )
+        return summary
+    
     def get_directory_size(self, path: Path) -> int:
-        """計算目錄大小"""
-        total_size = 0
-        try:
-            for file_path in path.rglob('*'):
-                if file_path.is_file():
-                    try:
-                        total_size += file_path.stat().st_size
-                    except (OSError, FileNotFoundError):
-                        continue
-            self.logger.debug(f"目錄 {path} 大小: {self._format_size(total_size)}")
-        except Exception as e:
-            self.logger.warning(f"計算目錄大小時發生錯誤: {e}")
-        
-        return total_size
+        """計算目錄大小 (需要檔案數時請直接用 scan，避免再走訪一次)"""
+        return self.scan(path).total_size
     
     def count_files(self, path: Path) -> int:
-        """計算文件數量"""
-        try:
-            count = sum(1 for _ in path.rglob('*') if _.is_file())
-            self.logger.debug(f"目錄 {path} 文件數量: {count}")
-            return count
-        except Exception as e:
-            self.logger.warning(f"計算文件數量時發生錯誤: {e}")
-            return 0
+        """計算文件數量 (需要大小時請直接用 scan，避免再走訪一次)"""
+        return self.scan(path).file_count
     
     def directory_exists(self, path: Path) -> bool:
         """檢查目錄是否存在"""
@@ -232,21 +444,121 @@ class FileOperations:
         return f"{size_bytes:.2f} TB"
 
 
+class ZeroCopyFileOperations(FileOperations):
+    """零複製的文件操作實作：內容由核心直接搬移 (reflink / copy_file_range / sendfile)"""
+    
+    def __init__(self, logger: ILogger, copier: Optional[ZeroCopier] = None, throttle: Optional[Throttle] = None):
+        super().__init__(logger, throttle)
+        self.copier = copier or ZeroCopier()
+    
+    def copy_directory(
+        self,
+        source: Path,
+        destination: Path,
+        summary: Optional[TreeSummary] = None,
+        journal: Optional[BackupJournal] = None
+    ) -> bool:
+        """用 shutil.copytree 建立目錄結構，每個文件交給 ZeroCopier"""
+        try:
+            self.logger.info("開始複製目錄 (zero-copy): %s -> %s", source, destination)
+            self.copier.methods.clear()
+            copy_function = self._copy_function(self.copier, journal)
+            shutil.copytree(source, destination, copy_function=copy_function, dirs_exist_ok=journal is not None)
+            self.logger.info("目錄複製完成: %s - 使用的方法: %s", destination, dict(self.copier.methods))
+            self._log_throttle()
+            return True
+        except Exception as e:
+            self.logger.error("複製目錄失敗: %s", e)
+            return False
+
+
+class ParallelFileOperations(FileOperations):
+    """多執行緒複製的文件操作實作 (其他操作和 FileOperations 相同；限速由 copier.throttle 負責)"""
+    
+    def __init__(self, logger: ILogger, copier: ParallelCopier):
+        super().__init__(logger, copier.throttle)
+        self.copier = copier
+    
+    def copy_directory(
+        self,
+        source: Path,
+        destination: Path,
+        summary: Optional[TreeSummary] = None,
+        journal: Optional[BackupJournal] = None
+    ) -> bool:
+        """用 ParallelCopier 複製目錄，summary 是已經掃描好的來源目錄 (可省下一次走訪)"""
+        try:
+            self.logger.info("開始複製目錄 (%s 個執行緒): %s -> %s", self.copier.workers, source, destination)
+            stats = self.copier.copy_tree(source, destination, summary, journal)
+            self.logger.info(
+                "目錄複製完成: %s - %s 個文件 (%s 批小文件, %s 個大文件區塊), %s/s",
+                destination,
+                stats.files,
+                stats.batches,
+                stats.chunks,
+                self._format_size(stats.bytes_per_second)
+            )
+            self._log_throttle()
+            return True
+        except Exception as e:
+            self.logger.error("複製目錄失敗: %s", e)
+            return False
+
+
 class ScheduleWrapper:
-    """排程器包裝器"""
+    """排程器包裝器 (schedule 套件；預設改用 event_scheduler.EventScheduler)"""
     
     def __init__(self, logger: ILogger):
         self.logger = logger
+        self._stop_event = threading.Event()
     
     def schedule_daily(self, time_str: str, job_func: Callable[[], Any]) -> None:
         """設定每日排程"""
-        self.logger.info(f"設定每日排程，執行時間: {time_str}")
+        self.logger.info("設定每日排程，執行時間: %s", time_str)
         schedule.every().day.at(time_str).do(job_func)
     
+    def schedule_cron(self, expression: str, job_func: Callable[[], Any]) -> schedule.Job:
+        """
+        設定 cron 排程 (schedule 套件沒有 cron 語法)
+        
+        用 event_scheduler 的 cron 解析器算出下一次執行時間，排成只執行一次的 schedule 工作；
+        執行完 (包含拋出例外) 再排下一次。回傳第一次的 schedule.Job
+        """
+        cron = CronExpression.parse(expression)
+        
+        def arm() -> schedule.Job:
+            now = datetime.datetime.now()
+            next_run = cron.next_after(now)
+            self.logger.debug("cron 排程 %s 下一次執行: %s", expression, next_run.strftime("%Y-%m-%d %H:%M"))
+            job = schedule.every(max(1, math.ceil((next_run - now).total_seconds()))).seconds
+            return job.do(run, job)
+        
+        def run(job: schedule.Job) -> None:
+            schedule.cancel_job(job)
+            try:
+                job_func()
+            finally:
+                arm()
+        
+        self.logger.info("設定 cron 排程: %s", expression)
+        return arm()
+    
     def run_pending(self) -> None:
         """執行待處理的排程"""
         schedule.run_pending()
     
+    def run_forever(self) -> None:
+        """直接睡到下一個工作到期 (schedule.idle_seconds)，不再每 60 秒輪詢"""
+        self._stop_event.clear()
+        while not self._stop_event.is_set():
+            schedule.run_pending()
+            idle = schedule.idle_seconds()
+            self._stop_event.wait(3600 if idle is None else max(0.0, idle))
+    
+    def stop(self) -> None:
+        """讓 run_forever 結束"""
+        self._stop_event.set()
+    
     def clear_all(self) -> None:
         """清除所有排程"""
         self.logger.info("清除所有排程")
@@ -260,8 +572,12 @@ class BackupValidator:
         self.logger = logger
         self.file_ops = file_ops
     
-    def validate(self, source: Path, backup: Path) -> bool:
-        """驗證備份的完整性"""
+    def validate(self, source: Path, backup: Path, source_summary: Optional[TreeSummary] = None) -> bool:
+        """
+        驗證備份的完整性
+        
+        source_summary 是備份前已經掃描好的來源目錄；有傳入的話就不用再走訪一次來源
+        """
         try:
             self.logger.info("開始驗證備份完整性")
             
@@ -269,21 +585,113 @@ class BackupValidator:
                 self.logger.error("備份目錄不存在")
                 return False
             
-            source_files = self.file_ops.count_files(source)
-            backup_files = self.file_ops.count_files(backup)
+            if source_summary is None:
+                source_summary = self.file_ops.scan(source)
+            backup_summary = self.file_ops.scan(backup)
+            source_files = source_summary.file_count
+            backup_files = backup_summary.file_count
             
-            self.logger.info(f"來源文件數: {source_files}, 備份文件數: {backup_files}")
+            self.logger.info("來源文件數: %s, 備份文件數: %s", source_files, backup_files)
             
-            if source_files == backup_files:
+            missing = source_summary.files.keys() - backup_summary.files.keys()
+            if source_files == backup_files and not missing:
                 self.logger.info("備份完整性驗證通過")
                 return True
+            elif missing:
+                self.logger.error("備份完整性驗證失敗：缺少 %s 個文件，例如 %s", len(missing), sorted(missing)[:5])
+                return False
             else:
                 self.logger.error("備份完整性驗證失敗：文件數量不匹配")
                 return False
                 
         except Exception as e:
-            self.logger.error(f"驗證備份時發生錯誤: {e}")
+            self.logger.error("驗證備份時發生錯誤: %s", e)
+            return False
+
+
+class HashBackupValidator(BackupValidator):
+    """
+    雜湊驗證器：文件清單檢查通過後，再逐一比對內容的雜湊
+    
+    - 串流讀取、用 process pool 平行計算 (file_hashing.hash_many)
+    - 增量備份時複製過程已經算好 SHA-256 (寫在快照旁的清單)，來源沒變的話就沿用，只需要讀備份那一份
+    - sample_ratio 有設定時只抽查一部分文件，適合非常大的目錄
+    """
+    
+    def __init__(
+        self,
+        logger: ILogger,
+        file_ops: IFileOperations,
+        algorithm: str = DEFAULT_ALGORITHM,
+        workers: Optional[int] = None,
+        sample_ratio: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        super().__init__(logger, file_ops)
+        self.algorithm = algorithm
+        self.workers = workers
+        self.sample_ratio = sample_ratio
+        self.seed = seed
+    
+    def validate(self, source: Path, backup: Path, source_summary: Optional[TreeSummary] = None) -> bool:
+        """驗證文件清單與內容雜湊"""
+        try:
+            if source_summary is None:
+                source_summary = self.file_ops.scan(source)
+            if not super().validate(source, backup, source_summary):
+                return False
+            
+            paths = sorted(source_summary.files)
+            if self.sample_ratio is not None and paths:
+                paths = sample_paths(paths, self.sample_ratio, self.seed)
+            known = self._copy_digests(backup, source_summary)
+            
+            tasks = []
+            for rel_path in paths:
+                if rel_path in known:
+                    tasks.append((backup / rel_path, "sha256"))
+                else:
+                    tasks.append((source / rel_path, self.algorithm))
+                    tasks.append((backup / rel_path, self.algorithm))
+            reused = sum(1 for rel_path in paths if rel_path in known)
+            self.logger.info("開始雜湊驗證: %s 個文件 (沿用複製時的雜湊: %s 個)", len(paths), reused)
+            
+            digests, errors = hash_many(tasks, self.workers)
+            for path, error in errors.items():
+                self.logger.error("無法讀取文件: %s - %s", path, error)
+            
+            mismatched = []
+            for rel_path in paths:
+                actual = digests.get(str(backup / rel_path))
+                expected = known.get(rel_path) or digests.get(str(source / rel_path))
+                if actual is None or expected is None or actual != expected:
+                    mismatched.append(rel_path)
+            
+            if mismatched:
+                self.logger.error("雜湊驗證失敗：%s 個文件內容不一致，例如 %s", len(mismatched), mismatched[:5])
+                return False
+            self.logger.info("雜湊驗證通過")
+            return True
+        
+        except Exception as e:
+            self.logger.error("驗證備份時發生錯誤: %s", e)
             return False
+    
+    def _copy_digests(self, backup: Path, source_summary: TreeSummary) -> Dict[str, str]:
+        """增量備份的清單中，來源在複製之後沒有變過的文件的 SHA-256"""
+        path = manifest_path(backup)
+        if not path.exists():
+            return {}
+        try:
+            manifest = Manifest.load(path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning("讀取清單失敗，改為重新計算雜湊: %s", e)
+            return {}
+        return {
+            rel_path: entry.digest
+            for rel_path, entry in manifest.entries.items()
+            if rel_path in source_summary.files and entry.same_metadata(source_summary.files[rel_path])
+        }
 
 
 class AutomatedBackupService:
@@ -295,13 +703,22 @@ class AutomatedBackupService:
         logger: ILogger,
         file_ops: IFileOperations,
         scheduler: IScheduler,
-        validator: IBackupValidator
+        validator: IBackupValidator,
+        copier: Optional[IncrementalCopier] = None,
+        chunk_store: Optional[ChunkStore] = None,
+        pruner: Optional[SnapshotPruner] = None,
+        throttle: Optional[Throttle] = None
     ):
         self.config = config
         self.logger = logger
         self.file_ops = file_ops
         self.scheduler = scheduler
         self.validator = validator
+        self.copier = copier
+        self.chunk_store = chunk_store
+        self.pruner = pruner
+        self.throttle = throttle  # 就地更新 / watch 同步的限速 (完整複製由 file_ops、增量由 copier 各自限速)
+        self._watcher: Optional[InotifyWatcher] = None
         
         # 配置已經在 __post_init__ 中轉換為 Path 物件
         self.source_dir = config.source_dir
@@ -310,66 +727,176 @@ class AutomatedBackupService:
         # 確保目標目錄存在
         self.destination_dir.mkdir(parents=True, exist_ok=True)
         
-        self.logger.info(f"初始化備份服務 - 來源: {self.source_dir}, 目標: {self.destination_dir}")
+        self.logger.info("初始化備份服務 - 來源: %s, 目標: %s", self.source_dir, self.destination_dir)
     
     def backup(self) -> BackupResult:
+        """執行備份，成功後在背景依照保留策略清理舊快照"""
+        result = self._backup()
+        if self.config.metrics_file is not None:
+            self._write_metrics(result)
+        if result.success and self.pruner is not None:
+            self.pruner.start(self.destination_dir)
+        return result
+    
+    def wait_for_pruning(self, timeout: Optional[float] = None) -> None:
+        """等待 backup() 在背景開始的清理結束 (沒有設定保留策略時直接回傳)"""
+        if self.pruner is not None:
+            self.pruner.join(timeout)
+    
+    def _write_metrics(self, result: BackupResult) -> None:
+        """寫出這次備份的效能指標 (失敗只記錄警告，不影響備份結果)"""
+        metrics = RunMetrics(
+            source=str(self.source_dir),
+            destination=str(result.destination_path or self.destination_dir),
+            success=result.success,
+            timestamp=time.time(),
+            duration=sum(result.phases.values()) if result.phases else result.duration or 0.0,
+            phases=result.phases,
+            file_count=result.file_count or 0,
+            total_size=result.total_size or 0,
+            files_copied=result.files_copied,
+            bytes_per_second=result.bytes_per_second,
+            files_per_second=result.files_per_second,
+            slowest_files=result.slowest_files
+        )
+        try:
+            write_metrics(metrics, Path(self.config.metrics_file))
+        except OSError as e:
+            self.logger.warning("寫入效能指標失敗: %s", e)
+    
+    def _backup(self) -> BackupResult:
         """執行備份"""
         today = datetime.date.today()
         dest_dir = self.destination_dir / str(today)
         
-        self.logger.info(f"開始備份程序 - 目標路徑: {dest_dir}")
+        self.logger.info("開始備份程序 - 目標路徑: %s", dest_dir)
         
         # 檢查來源目錄是否存在
         if not self.file_ops.directory_exists(self.source_dir):
-            error_msg = f"來源目錄不存在: {self.source_dir}"
-            self.logger.error(error_msg)
+            self.logger.error("來源目錄不存在: %s", self.source_dir)
             return BackupResult(
                 success=False,
-                message=error_msg,
+                message=f"來源目錄不存在: {self.source_dir}",
                 source_path=self.source_dir
             )
         
-        # 如果目標目錄已存在，先刪除
-        if self.file_ops.directory_exists(dest_dir):
-            self.logger.warning(f"目標目錄已存在，將覆蓋: {dest_dir}")
-            if not self.file_ops.delete_directory(dest_dir):
-                error_msg = "刪除現有目錄失敗"
+        if self.chunk_store is not None:
+            return self._backup_to_store(str(today))
+        if self.config.output_format != "directory":
+            return self._backup_to_archive(self.destination_dir / f"{today}.{self.config.output_format}")
+        
+        # 同一天重跑：以今天的快照為基礎只同步有變動的文件；不能這樣更新時重新複製。兩種都是複製完才換掉舊的
+        update_in_place = self.file_ops.directory_exists(dest_dir) and self._can_update_in_place(dest_dir)
+        if self.file_ops.directory_exists(dest_dir) and not update_in_place:
+            self.logger.warning("目標目錄已存在，複製完成後將覆蓋: %s", dest_dir)
+        
+        # 一律寫到暫存資料夾，驗證通過後才改名公開：就地更新先用硬連結複製一份今天的快照再同步，
+        # 其他情況有日誌，可以續傳
+        work_dir = partial_path(dest_dir)
+        self._recover_partials(work_dir, resume=not update_in_place)
+        journal = None
+        if update_in_place:
+            if not self._clone_snapshot(dest_dir, work_dir):
+                return BackupResult(
+                    success=False,
+                    message="建立今天快照的硬連結複本失敗",
+                    source_path=self.source_dir,
+                    destination_path=work_dir
+                )
+        else:
+            journal = self._open_journal(work_dir)
+            if journal is None:
                 return BackupResult(
                     success=False,
-                    message=error_msg,
+                    message="刪除無法續傳的暫存資料夾失敗",
                     source_path=self.source_dir,
-                    destination_path=dest_dir
+                    destination_path=work_dir
                 )
         
-        # 獲取來源目錄資訊
-        total_size = self.file_ops.get_directory_size(self.source_dir)
-        file_count = self.file_ops.count_files(self.source_dir)
+        # 獲取來源目錄資訊 (只走訪一次，結果也給增量複製與驗證使用)
+        phases: Dict[str, float] = {}
+        with timed(phases, "scan"):
+            source_summary = self.file_ops.scan(self.source_dir)
+        total_size = source_summary.total_size
+        file_count = source_summary.file_count
+        if journal is not None and journal.resumed:
+            self._drop_deleted_files(work_dir, journal, source_summary)
         
         # 執行備份
-        start_time = time.time()
-        success = self.file_ops.copy_directory(self.source_dir, dest_dir)
-        end_time = time.time()
+        copy_stats = None
+        slowest = SlowestFiles(self.config.metrics_slowest_files)  # 就地更新沒有日誌，耗時記在這裡
+        try:
+            with timed(phases, "copy"):
+                if update_in_place:
+                    copy_stats = self._update_in_place(dest_dir, work_dir, source_summary, slowest)
+                    success = copy_stats is not None
+                elif self.config.incremental and self.copier is not None:
+                    copy_stats = self._copy_incremental(work_dir, source_summary, journal)
+                    success = copy_stats is not None
+                else:
+                    success = self.file_ops.copy_directory(self.source_dir, work_dir, source_summary, journal)
+        finally:
+            if journal is not None:
+                journal.close()  # 中斷時日誌留著，下一次從最後完成的文件之後繼續
         
-        duration = end_time - start_time
+        duration = phases["copy"]
+        slowest_files = slowest.result()
+        if journal is not None:
+            slowest_files = [
+                SlowFile(entry.path, entry.seconds, entry.size)
+                for entry in journal.slowest(self.config.metrics_slowest_files)
+            ]
+        # 增量模式只有新增 / 修改的文件真的被寫入
+        bytes_written, files_written = total_size, file_count
+        if copy_stats is not None:
+            bytes_written, files_written = copy_stats.bytes_copied, copy_stats.files_copied
+        elif journal is not None:
+            # 續傳時 copy 階段只包含這次才複製的文件，上次已經完成的不能算進吞吐量
+            bytes_written, files_written = journal.bytes_recorded, journal.files_recorded
         
         if not success:
             error_msg = "備份複製失敗"
+            if journal is not None:
+                error_msg += "，下一次會從中斷的地方繼續"
             return BackupResult(
                 success=False,
                 message=error_msg,
                 source_path=self.source_dir,
-                destination_path=dest_dir,
-                duration=duration
+                destination_path=work_dir,
+                duration=duration,
+                phases=phases,
+                slowest_files=slowest_files
             )
         
-        self.logger.info(f"備份完成! 耗時: {duration:.2f} 秒")
+        bytes_per_second = bytes_written / duration if duration > 0 else None
+        files_per_second = files_written / duration if duration > 0 else None
+        self.logger.info("備份完成! 耗時: %.2f 秒", duration)
+        if bytes_per_second is not None:
+            self.logger.info("吞吐量: %.2f MB/s, %.1f 個文件/s", bytes_per_second / (1024 * 1024), files_per_second)
         
         # 驗證備份完整性（如果啟用）
         validation_success = True
         if self.config.enable_validation:
-            validation_success = self.validator.validate(self.source_dir, dest_dir)
+            with timed(phases, "validate"):
+                validation_success = self.validator.validate(self.source_dir, work_dir, source_summary)
         
         result_message = "備份成功完成"
+        if not validation_success:
+            # 驗證失敗的快照不公開 (今天原本的快照不受影響)；日誌也刪掉，下一次從頭開始而不是續傳錯誤的內容
+            if journal is not None:
+                journal.discard()
+            self.logger.error("驗證失敗，保留暫存資料夾但不公開: %s", work_dir)
+        else:
+            with timed(phases, "publish"):
+                published = self._publish(work_dir, dest_dir)
+            if published:
+                # 改名完成後才刪日誌：改名途中中斷，下一次還能續傳 (不用重新複製) 再公開一次
+                if journal is not None:
+                    journal.discard()
+                work_dir = dest_dir
+            else:
+                success = False
+                result_message = "備份完成但無法改名成正式快照"
         if not validation_success:
             result_message += "，但驗證失敗"
         
@@ -377,14 +904,318 @@ class AutomatedBackupService:
             success=success and validation_success,
             message=result_message,
             source_path=self.source_dir,
-            destination_path=dest_dir,
+            destination_path=work_dir,
             duration=duration,
             file_count=file_count,
-            total_size=total_size
+            total_size=total_size,
+            files_copied=copy_stats.files_copied if copy_stats else None,
+            files_linked=copy_stats.files_linked if copy_stats else None,
+            bytes_per_second=bytes_per_second,
+            files_per_second=files_per_second,
+            phases=phases,
+            slowest_files=slowest_files
+        )
+    
+    def _open_journal(self, work_dir: Path) -> Optional[BackupJournal]:
+        """開啟暫存資料夾的日誌：有同一個來源的中斷紀錄就續傳，否則清掉暫存資料夾從頭開始"""
+        journal = BackupJournal.open(journal_path(work_dir), self.source_dir, work_dir)
+        if journal.resumed:
+            self.logger.info("發現中斷的備份，沿用上次完成的 %s 個文件繼續: %s", journal.resumed, work_dir)
+            return journal
+        if self.file_ops.directory_exists(work_dir):
+            self.logger.warning("暫存資料夾沒有可以續傳的日誌，從頭開始: %s", work_dir)
+            if not self.file_ops.delete_directory(work_dir):
+                journal.discard()
+                return None
+        manifest_path(work_dir).unlink(missing_ok=True)
+        return journal
+    
+    def _recover_partials(self, work_dir: Path, resume: bool) -> None:
+        """
+        處理之前中斷留下的暫存資料夾 (日期不是今天的，例如昨晚的備份被中斷、今天才重跑)
+
+        resume 為 True 且今天還沒有暫存資料夾時，最新一個同來源的暫存資料夾連同日誌改名成今天的 work_dir 繼續複製；
+        其他的 (沒有日誌、來源不同、更舊的) 和改名途中留下的舊快照都刪掉，不會一直佔用空間
+        """
+        for leftover in self.destination_dir.glob(REPLACED_PREFIX + "*"):
+            self.logger.warning("刪除上次改名途中留下的舊快照: %s", leftover)
+            self.file_ops.delete_directory(leftover)
+        
+        for partial in find_partials(self.destination_dir):
+            if partial == work_dir:
+                continue
+            stale_journal = journal_path(partial)
+            if resume and not work_dir.exists() and journal_source(stale_journal) == str(self.source_dir):
+                try:
+                    os.replace(partial, work_dir)
+                    os.replace(stale_journal, journal_path(work_dir))
+                    self.logger.info("沿用之前中斷的備份 %s 繼續: %s", partial.name, work_dir)
+                    continue
+                except OSError as e:
+                    self.logger.warning("無法沿用之前中斷的備份 %s: %s", partial, e)
+                    if work_dir.exists():
+                        continue
+            self.logger.warning("刪除之前中斷的暫存資料夾: %s", partial)
+            if self.file_ops.delete_directory(partial):
+                stale_journal.unlink(missing_ok=True)
+                manifest_path(partial).unlink(missing_ok=True)
+    
+    def _drop_deleted_files(self, work_dir: Path, journal: BackupJournal, source_summary: TreeSummary) -> None:
+        """續傳時，上次已經複製、但之後在來源被刪除的文件也要從暫存資料夾刪掉"""
+        for rel_path in journal.entries.keys() - source_summary.files.keys():
+            (work_dir / rel_path).unlink(missing_ok=True)
+    
+    def _publish(self, work_dir: Path, dest_dir: Path) -> bool:
+        """
+        暫存資料夾改名成正式快照 (同一個檔案系統上 os.replace 是原子操作)，清單最後才改名
+
+        今天已經有快照時先把舊的改名到旁邊，新的改名成功後才刪除舊的；複製失敗時舊快照完全不受影響
+        """
+        replaced = dest_dir.with_name(REPLACED_PREFIX + dest_dir.name)
+        try:
+            if dest_dir.exists():
+                os.replace(dest_dir, replaced)
+            os.replace(work_dir, dest_dir)
+            if manifest_path(work_dir).exists():
+                os.replace(manifest_path(work_dir), manifest_path(dest_dir))
+            else:
+                manifest_path(dest_dir).unlink(missing_ok=True)
+        except OSError as e:
+            self.logger.error("暫存資料夾改名失敗: %s", e)
+            if replaced.exists() and not dest_dir.exists():
+                os.replace(replaced, dest_dir)
+            return False
+        if replaced.exists() and not self.file_ops.delete_directory(replaced):
+            self.logger.warning("刪除被取代的舊快照失敗，下一次備份會再試一次: %s", replaced)
+        return True
+    
+    def _backup_to_store(self, name: str) -> BackupResult:
+        """去重複模式：來源存成倉庫裡的一個快照 (同一天重跑會覆蓋同名快照)"""
+        snapshot_path = self.chunk_store.snapshot_path(name)
+        phases: Dict[str, float] = {}
+        with timed(phases, "scan"):
+            source_summary = self.file_ops.scan(self.source_dir)
+        
+        slowest = SlowestFiles(self.config.metrics_slowest_files)
+        try:
+            with timed(phases, "copy"):
+                snapshot, stats = self.chunk_store.backup(self.source_dir, name, source_summary, slowest.record)
+        except Exception as e:
+            self.logger.error("寫入去重複倉庫失敗: %s", e)
+            return BackupResult(
+                success=False,
+                message="備份寫入倉庫失敗",
+                source_path=self.source_dir,
+                destination_path=snapshot_path,
+                duration=phases["copy"],
+                phases=phases
+            )
+        duration = phases["copy"]
+        
+        self.logger.info(
+            "快照 %s 完成! 耗時: %.2f 秒 - %s 個區塊，新增 %s 個 (%s bytes)",
+            name,
+            duration,
+            stats.chunks,
+            stats.new_chunks,
+            format(stats.new_bytes, ",")
+        )
+        
+        # 驗證：快照引用的每個區塊都必須存在於倉庫中
+        validation_success = True
+        if self.config.enable_validation:
+            with timed(phases, "validate"):
+                digests = {digest for item in snapshot.files for digest in item.chunks}
+                missing = [d for d in digests if not self.chunk_store.chunk_path(d).exists()]
+            validation_success = not missing and len(snapshot.files) == source_summary.file_count
+            if validation_success:
+                self.logger.info("快照完整性驗證通過")
+            else:
+                self.logger.error("快照完整性驗證失敗：缺少 %s 個區塊", len(missing))
+        
+        result_message = "備份成功完成"
+        if not validation_success:
+            result_message += "，但驗證失敗"
+        
+        return BackupResult(
+            success=validation_success,
+            message=result_message,
+            source_path=self.source_dir,
+            destination_path=snapshot_path,
+            duration=duration,
+            file_count=stats.files,
+            total_size=stats.bytes,
+            bytes_per_second=stats.bytes / duration if duration > 0 else None,
+            files_per_second=stats.files / duration if duration > 0 else None,
+            bytes_stored=stats.new_bytes,
+            phases=phases,
+            slowest_files=slowest.result()
+        )
+    
+    def _backup_to_archive(self, archive_path: Path) -> BackupResult:
+        """封存模式：來源串流寫入 tar，同時用多個執行緒壓縮 (同一天重跑會覆蓋)"""
+        phases: Dict[str, float] = {}
+        with timed(phases, "scan"):
+            source_summary = self.file_ops.scan(self.source_dir)
+        
+        slowest = SlowestFiles(self.config.metrics_slowest_files)
+        try:
+            with timed(phases, "copy"):
+                stats = create_archive(
+                    self.source_dir,
+                    archive_path,
+                    self.config.output_format,
+                    workers=self.config.compression_workers,
+                    summary=source_summary,
+                    timing=slowest.record
+                )
+        except Exception as e:
+            self.logger.error("建立壓縮封存失敗: %s", e)
+            return BackupResult(
+                success=False,
+                message="備份封存失敗",
+                source_path=self.source_dir,
+                destination_path=archive_path,
+                duration=phases["copy"],
+                phases=phases
+            )
+        duration = phases["copy"]
+        
+        self.logger.info(
+            "封存完成! 耗時: %.2f 秒 - %s (%s bytes，壓縮比 %.1f%%)",
+            duration,
+            archive_path.name,
+            format(stats.bytes_out, ","),
+            stats.ratio * 100
+        )
+        
+        # 驗證：完整解壓一次 (檢查 CRC)，並確認每個來源文件都在封存裡
+        validation_success = True
+        if self.config.enable_validation:
+            try:
+                with timed(phases, "validate"):
+                    missing = source_summary.files.keys() - set(list_archive(archive_path))
+                validation_success = not missing
+                if missing:
+                    self.logger.error("封存驗證失敗：缺少 %s 個文件，例如 %s", len(missing), sorted(missing)[:5])
+                else:
+                    self.logger.info("封存驗證通過")
+            except Exception as e:
+                self.logger.error("封存驗證失敗：無法讀取壓縮檔: %s", e)
+                validation_success = False
+        
+        result_message = "備份成功完成"
+        if not validation_success:
+            result_message += "，但驗證失敗"
+        
+        return BackupResult(
+            success=validation_success,
+            message=result_message,
+            source_path=self.source_dir,
+            destination_path=archive_path,
+            duration=duration,
+            file_count=stats.files,
+            total_size=stats.bytes_in,
+            bytes_per_second=stats.bytes_in / duration if duration > 0 else None,
+            files_per_second=stats.files / duration if duration > 0 else None,
+            compressed_size=stats.bytes_out,
+            phases=phases,
+            slowest_files=slowest.result()
+        )
+    
+    def _can_update_in_place(self, dest_dir: Path) -> bool:
+        """增量模式需要今天的清單才能就地更新 (清單不見了就重新建立整個快照)"""
+        if not self.config.update_in_place:
+            return False
+        return self.copier is None or manifest_path(dest_dir).exists()
+    
+    def _clone_snapshot(self, dest_dir: Path, work_dir: Path) -> bool:
+        """
+        用硬連結把今天的快照複製一份到暫存資料夾 (只建立連結，不複製內容)
+
+        之後 sync_tree 先寫暫存檔再 os.replace，不會改到和今天的快照共用的檔案；
+        檔案系統不支援硬連結時改成複製
+        """
+        if self.file_ops.directory_exists(work_dir) and not self.file_ops.delete_directory(work_dir):
+            return False
+        journal_path(work_dir).unlink(missing_ok=True)
+        manifest_path(work_dir).unlink(missing_ok=True)
+        try:
+            snapshot = scan_tree(dest_dir)
+            work_dir.mkdir()
+            for rel_dir in snapshot.dirs:
+                (work_dir / rel_dir).mkdir()
+            for rel_path in snapshot.files:
+                try:
+                    os.link(dest_dir / rel_path, work_dir / rel_path)
+                except OSError:
+                    shutil.copy2(dest_dir / rel_path, work_dir / rel_path)
+            return True
+        except OSError as e:
+            self.logger.error("建立今天快照的硬連結複本失敗: %s", e)
+            return False
+    
+    def _update_in_place(
+        self,
+        dest_dir: Path,
+        work_dir: Path,
+        source_summary: TreeSummary,
+        slowest: Optional[SlowestFiles] = None
+    ) -> Optional[IncrementalStats]:
+        """
+        比對來源與今天快照的硬連結複本 work_dir，只複製新增 / 修改的文件、刪除來源已經沒有的文件
+
+        清單從今天的快照讀取，更新後寫到 work_dir 旁邊 (和 work_dir 一起公開)；slowest 記錄每個文件的耗時
+        """
+        self.logger.info("今天的快照已存在，在複本上同步變動: %s", dest_dir)
+        manifest = None
+        if self.copier is not None:
+            try:
+                manifest = Manifest.load(manifest_path(dest_dir))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.logger.error("讀取今天的清單失敗: %s", e)
+                return None
+        
+        sync_stats = sync_tree(
+            self.source_dir,
+            work_dir,
+            manifest,
+            source_summary,
+            slowest.record if slowest is not None else None,
+            self.throttle
+        )
+        for error in sync_stats.errors:
+            self.logger.error("就地更新失敗: %s", error)
+        if sync_stats.errors:
+            return None
+        if manifest is not None:
+            manifest.save(manifest_path(work_dir))
+        
+        self.logger.info("就地更新完成: 複製 %s 個文件，刪除 %s 個", sync_stats.copied, sync_stats.deleted)
+        return IncrementalStats(
+            files_copied=sync_stats.copied,
+            files_linked=source_summary.file_count - sync_stats.copied,
+            bytes_copied=sync_stats.bytes_copied,
+            bytes_linked=source_summary.total_size - sync_stats.bytes_copied
         )
     
+    def _copy_incremental(self, dest_dir: Path, source_summary: TreeSummary, journal: Optional[BackupJournal] = None):
+        """增量複製，失敗時回傳 None"""
+        try:
+            previous = self.copier.find_previous_snapshot(self.destination_dir, dest_dir)
+            if previous is None:
+                self.logger.info("找不到上一個快照，執行完整備份")
+            _, stats = self.copier.copy(self.source_dir, dest_dir, previous, source_summary, journal)
+            return stats
+        except Exception as e:
+            self.logger.error("增量備份失敗: %s", e)
+            return None
+    
     def setup_schedule(self, time_str: Optional[str] = None) -> None:
         """設定定時備份"""
+        if time_str is None and self.config.schedule_cron:
+            self.scheduler.schedule_cron(self.config.schedule_cron, self.backup)
+            return
         schedule_time = time_str or self.config.schedule_time
         self.scheduler.schedule_daily(schedule_time, self.backup)
     
@@ -393,16 +1224,91 @@ class AutomatedBackupService:
         self.logger.info("排程器開始運行... (按 Ctrl+C 結束)")
         
         try:
-            while True:
-                self.scheduler.run_pending()
-                time.sleep(60)
+            # 睡到下一個工作到期才醒來；SIGTERM / SIGINT 會讓 run_forever 正常返回
+            self.scheduler.run_forever()
         except KeyboardInterrupt:
             self.logger.info("收到中斷信號，正在停止排程器...")
         except Exception as e:
-            self.logger.error(f"排程器運行時發生錯誤: {e}")
+            self.logger.error("排程器運行時發生錯誤: %s", e)
         finally:
             self.logger.info("排程器已停止")
     
+    def watch(self) -> None:
+        """
+        持續備份：監看來源目錄的 inotify 事件，只把有變動的路徑同步到今天的快照
+        
+        先開始監看再做初始備份，兩者之間的變更也不會漏掉；日期換了就先建立新的快照
+        """
+        if self.chunk_store is not None or self.config.output_format != "directory":
+            raise ValueError("watch 模式只支援資料夾快照 (不能搭配 deduplicate / 壓縮封存)")
+        
+        pending = DebouncedQueue(self.config.watch_debounce, self.config.watch_max_delay)
+        with InotifyWatcher(self.source_dir, self.logger) as watcher:
+            self._watcher = watcher
+            self.logger.info("watch 模式開始 - 監看 %s 個資料夾 (按 Ctrl+C 結束)", watcher.watch_count)
+            try:
+                if not self._ensure_snapshot():
+                    return
+                while self._watcher is not None:
+                    pending.add(watcher.read(timeout=pending.time_until_ready()))
+                    batch = pending.pop_ready()
+                    if batch:
+                        self._sync_changes(batch)
+            except KeyboardInterrupt:
+                self.logger.info("收到中斷信號，停止 watch 模式")
+            finally:
+                if len(pending):
+                    self._sync_changes(pending.pop_ready(force=True))  # 停止前把還在等待的變動同步完
+                self._watcher = None
+                self.logger.info("watch 模式已停止")
+    
+    def stop_watching(self) -> None:
+        """讓 watch() 結束 (可以從其他執行緒呼叫)"""
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.wake()
+    
+    def _ensure_snapshot(self) -> bool:
+        """今天的快照不存在 (第一次或日期換了) 就先完整備份一次"""
+        if self.file_ops.directory_exists(self.destination_dir / str(datetime.date.today())):
+            return True
+        result = self.backup()
+        if not result.success:
+            self.logger.error("建立今天的快照失敗，無法同步變動: %s", result.message)
+        return result.success
+    
+    def _sync_changes(self, paths) -> None:
+        """把一批變動同步到今天的快照，增量模式時一併更新清單"""
+        dest_dir = self.destination_dir / str(datetime.date.today())
+        if not self.file_ops.directory_exists(dest_dir):
+            self._ensure_snapshot()  # 新的快照已經包含這一批變動
+            return
+        
+        manifest = None
+        if self.copier is not None and manifest_path(dest_dir).exists():
+            try:
+                manifest = Manifest.load(manifest_path(dest_dir))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # 同步後清單就和快照不一致了，直接刪掉 (下一次備份會重新計算雜湊)
+                self.logger.warning("讀取今天的清單失敗，不更新清單繼續同步: %s", e)
+                manifest_path(dest_dir).unlink(missing_ok=True)
+        
+        start_time = time.time()
+        stats = sync_paths(self.source_dir, dest_dir, paths, manifest, throttle=self.throttle)
+        if manifest is not None:
+            manifest.save(manifest_path(dest_dir))
+        
+        self.logger.info(
+            "同步 %s 個變動路徑: 複製 %s 個文件 (%s bytes)，刪除 %s 個，耗時 %.2f 秒",
+            len(paths),
+            stats.copied,
+            format(stats.bytes_copied, ","),
+            stats.deleted,
+            time.time() - start_time
+        )
+        for error in stats.errors:
+            self.logger.warning("同步失敗: %s", error)
+    
     def __enter__(self):
         """Context manager 進入"""
         self.logger.info("進入備份服務 context")
@@ -411,8 +1317,10 @@ class AutomatedBackupService:
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager 退出"""
         if exc_type:
-            self.logger.error(f"Context 中發生異常: {exc_val}")
+            self.logger.error("Context 中發生異常: %s", exc_val)
         self.scheduler.clear_all()
+        if self.pruner is not None:
+            self.pruner.stop()  # 沒刪完的快照已經改名，下一次清理會接著刪
         self.logger.info("退出備份服務 context")
 
 
@@ -443,8 +1351,13 @@ class DIContainer:
         raise ValueError(f"Service {interface} not registered")
 
 
-def configure_services(config: BackupConfiguration) -> DIContainer:
-    """配置服務容器"""
+def configure_services(config: BackupConfiguration, throttle: Optional[Throttle] = None) -> DIContainer:
+    """
+    配置服務容器
+    
+    throttle 不是 None 時使用這個共用的限速器 (例如 BackupJobRegistry 讓所有工作一起限速)，
+    不依照 config 的 copy_max_* 另外建立
+    """
     container = DIContainer()
     
     # 註冊日誌服務 (單例)
@@ -452,22 +1365,55 @@ def configure_services(config: BackupConfiguration) -> DIContainer:
     logger = FileLogger(
         str(log_dir),
         config.max_log_size,
-        config.log_backup_count
+        config.log_backup_count,
+        async_mode=config.async_logging,
+        queue_size=config.log_queue_size
     )
     container.register_singleton(ILogger, logger)
     
+    # 註冊限速器 (單例；執行中可以用 container.get_service(Throttle).set_limits(...) 調整速度)
+    if throttle is None and (config.copy_max_bytes_per_second or config.copy_max_files_per_second):
+        throttle = Throttle(
+            config.copy_max_bytes_per_second,
+            config.copy_max_files_per_second,
+            adaptive=config.adaptive_throttle,
+            target_latency=config.throttle_target_latency
+        )
+    if throttle is not None:
+        container.register_singleton(Throttle, throttle)
+    
     # 註冊文件操作服務 (單例)
-    file_ops = FileOperations(logger)
+    zero_copier = ZeroCopier() if config.copy_method == "zero_copy" else None
+    if config.copy_workers > 1:
+        copier = ParallelCopier(workers=config.copy_workers, copy_function=zero_copier or shutil.copy2, throttle=throttle)
+        file_ops = ParallelFileOperations(logger, copier)
+    elif zero_copier is not None:
+        file_ops = ZeroCopyFileOperations(logger, zero_copier, throttle)
+    else:
+        file_ops = FileOperations(logger, throttle)
     container.register_singleton(IFileOperations, file_ops)
     
     # 註冊排程器服務 (單例)
-    scheduler = ScheduleWrapper(logger)
+    scheduler = EventScheduler(logger)
     container.register_singleton(IScheduler, scheduler)
     
     # 註冊驗證器服務 (單例)
-    validator = BackupValidator(logger, file_ops)
+    if config.validation_mode == "count":
+        validator = BackupValidator(logger, file_ops)
+    else:
+        validator = HashBackupValidator(
+            logger,
+            file_ops,
+            workers=config.validation_workers,
+            sample_ratio=config.validation_sample_ratio if config.validation_mode == "sample" else None
+        )
     container.register_singleton(IBackupValidator, validator)
     
+    # 保留策略 (所有備份服務共用同一個背景清理執行緒)
+    chunk_store = ChunkStore(config.destination_dir / 'store') if config.deduplicate else None
+    policy = RetentionPolicy(config.keep_daily, config.keep_weekly, config.keep_monthly)
+    pruner = SnapshotPruner(logger, policy, config.prune_max_files_per_second, chunk_store) if policy.enabled else None
+    
     # 註冊備份服務 (瞬態)
     container.register_transient(
         IBackupService,
@@ -476,13 +1422,121 @@ def configure_services(config: BackupConfiguration) -> DIContainer:
             container.get_service(ILogger),
             container.get_service(IFileOperations),
             container.get_service(IScheduler),
-            container.get_service(IBackupValidator)
+            container.get_service(IBackupValidator),
+            IncrementalCopier(logger, throttle) if config.incremental else None,
+            chunk_store,
+            pruner,
+            throttle
         )
     )
     
     return container
 
 
+# ===== 多來源備份 =====
+@dataclass
+class BackupJob:
+    """多來源備份中的一個工作"""
+    name: str
+    config: BackupConfiguration
+    priority: int = 0  # 數字越大越先開始
+
+
+class BackupJobRegistry:
+    """
+    管理多個備份工作 (每個工作有自己的來源 / 目標)，一起執行
+    
+    max_concurrent_jobs 是全域的 I/O 並行上限：同時最多這麼多個工作在讀寫磁碟，
+    其他工作依照優先順序排隊 (同優先順序的依照登記順序)；保留策略的清理也算在工作裡，
+    清理結束才讓出位置。throttle 是所有工作共用的限速器 (None 表示每個工作依照自己的設定限速)：
+    總頻寬不會因為同時執行多個工作而變成好幾倍。自訂 service_factory 時要自己把 registry.throttle 傳給服務
+    """
+    
+    def __init__(
+        self,
+        logger: ILogger,
+        max_concurrent_jobs: int = 2,
+        service_factory: Optional[Callable[[BackupConfiguration], IBackupService]] = None,
+        throttle: Optional[Throttle] = None
+    ):
+        if max_concurrent_jobs < 1:
+            raise ValueError("max_concurrent_jobs 必須至少為 1")
+        self.logger = logger
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.throttle = throttle
+        self.service_factory = service_factory or (
+            lambda config: configure_services(config, self.throttle).get_service(IBackupService)
+        )
+        self._jobs: Dict[str, BackupJob] = {}
+    
+    @property
+    def jobs(self) -> List[BackupJob]:
+        """依照執行順序排列的工作 (sorted 是穩定排序，同優先順序保持登記順序)"""
+        return sorted(self._jobs.values(), key=lambda job: -job.priority)
+    
+    def register(self, name: str, config: BackupConfiguration, priority: int = 0) -> BackupJob:
+        """登記一個備份工作"""
+        if name in self._jobs:
+            raise ValueError(f"備份工作名稱重複: {name}")
+        for other in self._jobs.values():
+            if Path(other.config.destination_dir) == Path(config.destination_dir):
+                # 同一天的快照都叫 destination_dir/<日期>，共用目標會互相覆蓋
+                raise ValueError(f"備份工作 {name} 和 {other.name} 使用同一個目標目錄: {config.destination_dir}")
+        job = BackupJob(name, config, priority)
+        self._jobs[name] = job
+        self.logger.info("登記備份工作 %s (優先順序 %s): %s -> %s", name, priority, config.source_dir, config.destination_dir)
+        return job
+    
+    def unregister(self, name: str) -> None:
+        """移除一個備份工作"""
+        del self._jobs[name]
+    
+    def run_all(self, window: Optional[float] = None) -> Dict[str, BackupResult]:
+        """
+        執行所有工作，回傳 {工作名稱: 結果}
+        
+        window 是備份時段的長度 (秒)：超過時段還沒開始的工作不再執行，留到下一次
+        """
+        jobs = self.jobs
+        if not jobs:
+            return {}
+        start_time = time.time()
+        self.logger.info("開始執行 %s 個備份工作 (同時最多 %s 個)", len(jobs), self.max_concurrent_jobs)
+        
+        def run(job: BackupJob) -> BackupResult:
+            if window is not None and time.time() - start_time > window:
+                self.logger.warning("備份工作 %s 超過備份時段，這次不執行", job.name)
+                return BackupResult(success=False, message="超過備份時段，未執行", source_path=job.config.source_dir)
+            return self._run_job(job)
+        
+        # 依照優先順序送出；執行緒池的佇列是先進先出，所以開始的順序就是優先順序
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_jobs, thread_name_prefix="backup-job") as executor:
+            futures = {job.name: executor.submit(run, job) for job in jobs}
+            results = {name: future.result() for name, future in futures.items()}
+        
+        succeeded = sum(1 for result in results.values() if result.success)
+        self.logger.info("備份工作全部結束: %s/%s 成功，耗時 %.2f 秒", succeeded, len(results), time.time() - start_time)
+        return results
+    
+    def _run_job(self, job: BackupJob) -> BackupResult:
+        """執行單一工作；例外只影響這個工作"""
+        self.logger.info("備份工作 %s 開始", job.name)
+        try:
+            service = self.service_factory(job.config)
+            result = service.backup()
+            service.wait_for_pruning()  # 清理也會讀寫磁碟，結束後才讓出並行的位置
+        except Exception as e:
+            self.logger.error("備份工作 %s 發生錯誤: %s", job.name, e)
+            return BackupResult(success=False, message=f"備份工作發生錯誤: {e}", source_path=job.config.source_dir)
+        level = self.logger.info if result.success else self.logger.error
+        level("備份工作 %s 結束: %s", job.name, result.message)
+        return result
+    
+    def setup_schedule(self, scheduler: IScheduler, time_str: str, window: Optional[float] = None) -> None:
+        """每天在 time_str 執行所有工作"""
+        scheduler.schedule_daily(time_str, lambda: self.run_all(window))
+
+
 def main():
     """主函數"""
     # 建立配置
@@ -490,7 +1544,13 @@ def main():
         source_dir="/home/carlos_nnb_ubuntu/projects/PythonProjectsFromBeginnerToAdvancedNotes/FromBeginnerToAdvanced",
         destination_dir="/home/carlos_nnb_ubuntu/projects/PythonProjectsFromBeginnerToAdvancedNotes/Backups",
         schedule_time="18:57",
-        enable_validation=True
+        enable_validation=True,
+        incremental=True,
+        keep_daily=7,
+        keep_weekly=4,
+        keep_monthly=6,
+        metrics_file=Path(__file__).parent / "logs" / "backup_metrics.jsonl",
+        async_logging=True
     )
     
     # 設定依賴注入容器
@@ -506,14 +1566,16 @@ def main():
         
         if result.success:
             print("✓ 備份測試成功完成")
-            logger.info(f"備份結果: {result.message}")
+            logger.info("備份結果: %s", result.message)
             if result.duration:
-                logger.info(f"耗時: {result.duration:.2f} 秒")
+                logger.info("耗時: %.2f 秒", result.duration)
             if result.file_count:
-                logger.info(f"文件數量: {result.file_count}")
+                logger.info("文件數量: %s", result.file_count)
+            if result.files_linked is not None:
+                logger.info("複製: %s 個，沿用上一個快照: %s 個", result.files_copied, result.files_linked)
         else:
             print("✗ 備份測試失敗")
-            logger.error(f"備份失敗: {result.message}")
+            logger.error("備份失敗: %s", result.message)
             return
         
         # 設定定時備份
@@ -0,0 +1,193 @@
+"""
+壓縮封存 (tar.gz / tar.zst) 與多執行緒壓縮
+
+文字為主的原始碼目錄壓縮後通常只剩 20% ~ 30%，省空間也省 I/O。
+tarfile 以串流模式 ("w|") 一邊讀檔一邊寫出，不需要先產生未壓縮的 .tar 暫存檔；
+壓縮交給多個執行緒 (zlib / zstd 壓縮時都會釋放 GIL)：
+
+    tar.gz   ParallelGzipWriter：資料切成固定大小的區塊，每個區塊各自壓成一個 gzip member，
+             依照順序接在一起 (RFC 1952 允許多個 member 串接，gzip / tar / Python 都能直接解開)
+    tar.zst  zstandard 套件內建的多執行緒壓縮 (沒安裝時會拋出清楚的錯誤)
+"""
+import gzip
+import os
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Deque, List, Optional
+
+from backup_metrics import Timing
+from tree_scan import TreeSummary, scan_tree
+
+try:
+    import zstandard
+except ImportError:  # 只有 tar.zst 需要
+    zstandard = None
+
+FORMATS = ("tar.gz", "tar.zst")
+BLOCK_SIZE = 1024 * 1024  # 每個 gzip member 壓縮前的大小
+
+
+@dataclass
+class ArchiveStats:
+    """一次封存的統計"""
+    files: int = 0
+    bytes_in: int = 0  # 原始文件大小總和
+    bytes_out: int = 0  # 壓縮檔大小
+    duration: float = 0.0
+
+    @property
+    def ratio(self) -> float:
+        """壓縮比 (壓縮後 / 壓縮前)，越小越好"""
+        return self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+
+
+class _CountingWriter:
+    """計算寫出 bytes 數的包裝 (壓縮後的大小)"""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.bytes_written = 0
+
+    def write(self, data) -> int:
+        self.bytes_written += len(data)
+        return self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+class ParallelGzipWriter:
+    """
+    多執行緒 gzip 寫入器 (類似 pigz)
+
+    write() 只把資料累積成區塊交給執行緒池；同時在壓縮中的區塊最多 workers * 2 個，
+    記憶體用量固定，不會因為來源很大就把所有資料都放在記憶體裡
+    """
+
+    def __init__(self, raw: BinaryIO, level: int = 6, workers: Optional[int] = None, block_size: int = BLOCK_SIZE):
+        self.raw = raw
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gzip")
+        self._pending: Deque[Future] = deque()
+        self._buffer = bytearray()
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[:self.block_size])
+            del self._buffer[:self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        # mtime=0：同樣的內容壓出同樣的 bytes
+        self._pending.append(self._executor.submit(gzip.compress, block, self.level, mtime=0))
+        while len(self._pending) > self.workers * 2:
+            self.raw.write(self._pending.popleft().result())
+
+    def flush(self) -> None:
+        pass  # 區塊邊界由 block_size 決定，close() 才會寫出最後一塊
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._pending:
+                self._submit(bytes(self._buffer))  # 空的檔案也要有一個合法的 gzip member
+                self._buffer.clear()
+            while self._pending:
+                self.raw.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _open_compressor(fmt: str, raw: BinaryIO, level: Optional[int], workers: Optional[int]):
+    if fmt == "tar.gz":
+        return ParallelGzipWriter(raw, level=6 if level is None else level, workers=workers)
+    if fmt == "tar.zst":
+        if zstandard is None:
+            raise RuntimeError("tar.zst 需要 zstandard 套件：pip install zstandard")
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=workers or -1)
+        return compressor.stream_writer(raw, closefd=False)
+    raise ValueError(f"未知的封存格式: {fmt}，可用: {list(FORMATS)}")
+
+
+def create_archive(
+    source: Path,
+    archive_path: Path,
+    fmt: str = "tar.gz",
+    workers: Optional[int] = None,
+    level: Optional[int] = None,
+    summary: Optional[TreeSummary] = None,
+    timing: Optional[Timing] = None,
+) -> ArchiveStats:
+    """
+    把 source 封存成 archive_path
+
+    先寫到 .tmp 再改名，失敗時不會留下不完整的壓縮檔；summary 是已經掃描好的來源目錄
+    timing 不是 None 時，每寫完一個檔案呼叫 timing(相對路徑, 秒數, 大小) (包含壓縮時等待的時間)
+    """
+    started = time.perf_counter()
+    source, archive_path = Path(source), Path(archive_path)
+    if summary is None:
+        summary = scan_tree(source)
+    if fmt not in FORMATS:
+        raise ValueError(f"未知的封存格式: {fmt}，可用: {list(FORMATS)}")
+
+    tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+    stats = ArchiveStats(files=summary.file_count, bytes_in=summary.total_size)
+    try:
+        with open(tmp_path, "wb") as raw:
+            counter = _CountingWriter(raw)
+            compressor = _open_compressor(fmt, counter, level, workers)
+            try:
+                # dereference：符號連結存成目標的內容，和 tree_scan / shutil.copytree 一樣
+                with tarfile.open(fileobj=compressor, mode="w|", format=tarfile.PAX_FORMAT, dereference=True) as tar:
+                    for rel_dir in summary.dirs:
+                        tar.add(source / rel_dir, arcname=rel_dir, recursive=False)
+                    for rel_path in sorted(summary.files):
+                        file_started = time.perf_counter()
+                        tar.add(source / rel_path, arcname=rel_path, recursive=False)
+                        if timing is not None:
+                            timing(rel_path, time.perf_counter() - file_started, summary.files[rel_path].size)
+            finally:
+                compressor.close()
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    stats.bytes_out = counter.bytes_written
+    stats.duration = time.perf_counter() - started
+    return stats
+
+
+def list_archive(archive_path: Path) -> List[str]:
+    """
+    列出封存中的所有文件 (會完整解壓一次，所以也順便檢查了壓縮資料的 CRC / 完整性)
+    """
+    archive_path = Path(archive_path)
+    if archive_path.name.endswith(".tar.zst"):
+        if zstandard is None:
+            raise RuntimeError("tar.zst 需要 zstandard 套件：pip install zstandard")
+        with open(archive_path, "rb") as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw)
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                return [member.name for member in tar if member.isfile()]
+    # 注意：tarfile 的串流模式 "r|gz" 只會讀第一個 gzip member，要用 "r:gz" (gzip.GzipFile 支援多個 member)
+    with tarfile.open(archive_path, mode="r:gz") as tar:
+        return [member.name for member in tar if member.isfile()]
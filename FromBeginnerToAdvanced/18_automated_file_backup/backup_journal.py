@@ -0,0 +1,204 @@
+"""
+可續傳、不會留下半成品的備份 (預寫日誌 Write-ahead journal + 暫存資料夾)
+
+原本直接複製到 Backups/2026-01-29/，複製到一半失敗 (斷電、磁碟滿、Ctrl+C) 就會留下
+看起來像快照、其實只有一半的資料夾；下一次備份再整個刪掉從頭來。現在改成：
+
+    1. 先寫到暫存資料夾 Backups/.partial-2026-01-29/
+    2. 每複製完一個檔案，先 fsync 檔案內容，再在 Backups/.partial-2026-01-29.journal 追加一行 JSON
+       (相對路徑、來源的大小與 mtime_ns、雜湊)；日誌裡有的檔案一定已經完整寫進磁碟
+    3. 全部複製完並驗證通過後，用 os.replace 改名成 2026-01-29/ (原本的快照這時才換掉)，再刪除日誌
+
+中斷後重跑時讀取日誌：來源沒變 (大小、mtime_ns 相同) 而且暫存檔大小正確的檔案直接略過，
+從最後完成的檔案之後繼續。日誌每 sync_every 筆 fsync 一次，最後一行寫到一半 (當機) 會被忽略。
+隔天才重跑時，前一天的暫存資料夾會被改名成今天的 (find_partials / journal_source)，一樣可以續傳。
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+PARTIAL_PREFIX = ".partial-"
+REPLACED_PREFIX = ".replaced-"  # 發布時被新快照取代、等待刪除的舊快照
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_VERSION = 1
+
+
+def partial_path(snapshot_dir: Path) -> Path:
+    """快照對應的暫存資料夾 (點開頭：保留策略、增量備份都不會把它當成快照)"""
+    return snapshot_dir.with_name(PARTIAL_PREFIX + snapshot_dir.name)
+
+
+def journal_path(partial_dir: Path) -> Path:
+    """暫存資料夾對應的日誌檔 (放在資料夾外面，不會被算進備份的檔案數)"""
+    return partial_dir.with_name(partial_dir.name + JOURNAL_SUFFIX)
+
+
+def find_partials(root: Path) -> List[Path]:
+    """root 底下所有的暫存資料夾 (日期新的在前)"""
+    if not root.is_dir():
+        return []
+    return sorted((path for path in root.glob(PARTIAL_PREFIX + "*") if path.is_dir()), reverse=True)
+
+
+def journal_source(path: Path) -> Optional[str]:
+    """日誌記錄的來源資料夾；日誌不存在、讀不到或版本不同時回傳 None"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(header, dict) or header.get("version") != JOURNAL_VERSION:
+        return None
+    return header.get("source")
+
+
+def _fsync_file(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class JournalEntry:
+    """日誌中的一筆：一個已經完整複製的檔案"""
+    path: str  # 相對路徑，使用 "/" 分隔
+    size: int  # 複製時來源的大小
+    mtime_ns: int  # 複製時來源的修改時間
+    digest: Optional[str] = None  # 增量備份時的 SHA-256 (續傳時寫進清單，不用重新計算)
+    seconds: Optional[float] = None  # 複製這個檔案花的時間 (給效能指標找出最慢的檔案)
+
+
+class BackupJournal:
+    """
+    一次備份的日誌
+
+    open() 讀取同一個來源的舊日誌 (可以續傳) 或建立新的；record() 可以同時給多個執行緒呼叫
+    """
+
+    def __init__(self, path: Path, source: Path, destination: Path, sync_every: int = 256):
+        self.path = Path(path)
+        self.source = Path(source)
+        self.destination = Path(destination)
+        self.sync_every = sync_every
+        self.entries: Dict[str, JournalEntry] = {}
+        self.resumed = 0  # 從舊日誌讀到的檔案數
+        self.files_recorded = 0  # 這一次執行才完成的檔案數 (不含續傳沿用的，算吞吐量用)
+        self.bytes_recorded = 0
+        self._file = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: Path, source: Path, destination: Path, sync_every: int = 256) -> "BackupJournal":
+        journal = cls(path, source, destination, sync_every)
+        if journal._load():
+            journal._file = open(journal.path, "a", encoding="utf-8")
+        else:
+            journal.entries.clear()
+            journal._file = open(journal.path, "w", encoding="utf-8")
+            journal._write({"version": JOURNAL_VERSION, "source": str(journal.source)})
+            journal._sync()
+        journal.resumed = len(journal.entries)
+        return journal
+
+    def _load(self) -> bool:
+        """讀取舊日誌；不存在、版本不同或來源不同時回傳 False (從頭開始)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return False
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return False
+        if header.get("version") != JOURNAL_VERSION or header.get("source") != str(self.source):
+            return False
+        for line in lines[1:]:
+            try:
+                entry = JournalEntry(**json.loads(line))
+            except (ValueError, TypeError):
+                break  # 當機時寫到一半的最後一行
+            self.entries[entry.path] = entry
+        return True
+
+    def is_done(self, rel_path: str, size: int, mtime_ns: int) -> bool:
+        """這個檔案上一次已經完整複製，而且來源之後沒有再改過"""
+        entry = self.entries.get(rel_path)
+        if entry is None or entry.size != size or entry.mtime_ns != mtime_ns:
+            return False
+        try:
+            return (self.destination / rel_path).stat().st_size == size
+        except OSError:
+            return False
+
+    def record(
+        self,
+        rel_path: str,
+        size: int,
+        mtime_ns: int,
+        digest: Optional[str] = None,
+        seconds: Optional[float] = None,
+    ) -> None:
+        """檔案已經完整寫入暫存資料夾：先 fsync 檔案內容再寫日誌 (當機後日誌不會指向沒寫進磁碟的資料)"""
+        _fsync_file(self.destination / rel_path)
+        entry = JournalEntry(rel_path, size, mtime_ns, digest, None if seconds is None else round(seconds, 6))
+        with self._lock:
+            self.entries[rel_path] = entry
+            self.files_recorded += 1
+            self.bytes_recorded += size
+            self._write(asdict(entry))
+            self._pending += 1
+            if self._pending >= self.sync_every:
+                self._sync()
+
+    def wrap(self, copy_function: Callable) -> Callable:
+        """
+        包裝成 shutil.copytree(copy_function=...) 用的複製函式：
+        已經完成的檔案略過，其他的先刪掉上次寫到一半的暫存檔再複製，完成後寫進日誌
+        """
+        def copy(src, dst):
+            rel_path = Path(os.path.relpath(dst, self.destination)).as_posix()
+            stat = os.stat(src)
+            if self.is_done(rel_path, stat.st_size, stat.st_mtime_ns):
+                return dst
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            started = time.perf_counter()
+            result = copy_function(src, dst)
+            self.record(rel_path, stat.st_size, stat.st_mtime_ns, seconds=time.perf_counter() - started)
+            return result
+        return copy
+
+    def slowest(self, count: int = 10) -> List[JournalEntry]:
+        """複製最久的 count 個檔案 (由慢到快)"""
+        timed = [entry for entry in self.entries.values() if entry.seconds is not None]
+        return heapq.nlargest(count, timed, key=lambda entry: entry.seconds)
+
+    def _write(self, data: dict) -> None:
+        self._file.write(json.dumps(data, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self) -> None:
+        """關閉日誌 (保留檔案，下一次可以續傳)"""
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def discard(self) -> None:
+        """備份完成 (或放棄續傳) 後刪除日誌"""
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,228 @@
+"""
+增量備份 (Incremental Backup) 與變更偵測清單 (Manifest)
+
+每一次備份除了快照資料夾 (例如 Backups/2026-01-29/) 之外，
+還會在旁邊寫一份清單 Backups/2026-01-29.manifest.json，記錄每個檔案的
+相對路徑、大小、mtime_ns、inode 與內容雜湊 (SHA-256)。
+
+下一次備份時：
+    - 大小、mtime_ns、inode 都和上一份清單相同 -> 視為沒變，直接從上一個快照建立硬連結 (hard link)，
+      不用讀取也不用複製內容，雜湊值沿用清單裡的
+    - 其他 (新增 / 修改) -> 一邊複製一邊計算雜湊 (同一次讀取)
+
+每個快照仍然是完整的資料夾，可以直接瀏覽或還原；沒變的檔案在磁碟上只佔一份空間。
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Protocol, Tuple
+
+from backup_journal import PARTIAL_PREFIX, BackupJournal
+from rate_limiter import Throttle
+from tree_scan import FileInfo, TreeSummary, scan_tree
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class ILogger(Protocol):
+    """日誌介面 (和 18_automated_file_backup_4.ILogger 相同)"""
+
+    def debug(self, message: str, *args: Any) -> None: ...
+    def info(self, message: str, *args: Any) -> None: ...
+    def warning(self, message: str, *args: Any) -> None: ...
+    def error(self, message: str, *args: Any) -> None: ...
+
+
+# ===== 資料模型 =====
+@dataclass
+class ManifestEntry:
+    """清單中的一個檔案"""
+    path: str  # 相對於快照根目錄，使用 "/" 分隔
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: str  # SHA-256 (hex)
+
+    def same_metadata(self, info: FileInfo) -> bool:
+        """大小、修改時間、inode 都一樣就視為內容沒變 (不需要重新讀檔)"""
+        return (
+            self.size == info.size
+            and self.mtime_ns == info.mtime_ns
+            and self.inode == info.inode
+        )
+
+
+@dataclass
+class Manifest:
+    """一個快照的檔案清單"""
+    entries: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self.entries.values())
+
+    def save(self, path: Path) -> None:
+        """寫成 JSON (先寫暫存檔再改名，避免寫到一半中斷留下壞掉的清單)"""
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": [asdict(entry) for entry in self.entries.values()],
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "Manifest":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"不支援的清單版本: {data.get('version')}")
+        entries = {item["path"]: ManifestEntry(**item) for item in data["files"]}
+        return cls(entries)
+
+
+@dataclass
+class IncrementalStats:
+    """增量備份的統計"""
+    files_copied: int = 0
+    files_linked: int = 0
+    files_resumed: int = 0  # 續傳時上一次已經完成的檔案
+    bytes_copied: int = 0
+    bytes_linked: int = 0
+
+
+def manifest_path(snapshot_dir: Path) -> Path:
+    """快照資料夾對應的清單檔 (放在快照旁邊，不會被算進備份的檔案數)"""
+    return snapshot_dir.with_name(snapshot_dir.name + MANIFEST_SUFFIX)
+
+
+# ===== 複製 =====
+def copy_and_hash(source: Path, destination: Path, throttle: Optional[Throttle] = None) -> str:
+    """
+    複製檔案並同時計算 SHA-256 (內容只讀一次)，保留修改時間等屬性
+
+    throttle 不是 None 時先取得一個檔案的額度，之後每讀一塊就取得那一塊的額度 (寫入前先等待)
+    """
+    hasher = hashlib.sha256()
+    if throttle is not None:
+        throttle.acquire(files=1)
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        while True:
+            started = time.perf_counter()
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if throttle is not None:
+                throttle.observe(time.perf_counter() - started)
+                throttle.acquire(nbytes=len(chunk))
+            hasher.update(chunk)
+            dst.write(chunk)
+    shutil.copystat(source, destination)
+    return hasher.hexdigest()
+
+
+class IncrementalCopier:
+    """依照上一份清單，只複製新增 / 修改的檔案，沒變的從上一個快照建立硬連結"""
+
+    def __init__(self, logger: ILogger, throttle: Optional[Throttle] = None):
+        self.logger = logger
+        self.throttle = throttle  # 複製 (不含硬連結) 的限速，None 表示不限制
+
+    def find_previous_snapshot(self, destination_root: Path, current: Path) -> Optional[Path]:
+        """找出最新的、有清單的舊快照 (不包含 current 本身與還沒完成的暫存資料夾)"""
+        candidates = [
+            path for path in destination_root.iterdir()
+            if path.is_dir() and path != current and not path.name.startswith(PARTIAL_PREFIX)
+            and manifest_path(path).exists()
+        ]
+        return max(candidates, key=lambda p: p.name) if candidates else None
+
+    def copy(
+        self,
+        source: Path,
+        destination: Path,
+        previous: Optional[Path] = None,
+        summary: Optional[TreeSummary] = None,
+        journal: Optional[BackupJournal] = None,
+    ) -> Tuple[Manifest, IncrementalStats]:
+        """
+        建立 destination 快照並寫出清單
+
+        previous 是上一個快照資料夾；None 或清單讀不到時就是完整備份
+        summary 是已經掃描好的來源目錄 (tree_scan.scan_tree)，沒有的話這裡再掃描一次
+        journal 不是 None 時是續傳：日誌裡已完成的檔案直接沿用 (雜湊也從日誌讀取)
+        """
+        if summary is None:
+            summary = scan_tree(source)
+
+        previous_manifest = Manifest()
+        if previous is not None:
+            try:
+                previous_manifest = Manifest.load(manifest_path(previous))
+                self.logger.info("增量備份，比對上一個快照: %s", previous)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.logger.warning("讀取上一份清單失敗，改為完整備份: %s", e)
+                previous = None
+
+        manifest = Manifest()
+        stats = IncrementalStats()
+        resuming = journal is not None
+        destination.mkdir(parents=True, exist_ok=resuming)
+        for rel_dir in summary.dirs:
+            (destination / rel_dir).mkdir(exist_ok=resuming)
+
+        for rel_path, info in sorted(summary.files.items()):
+            dst_file = destination / rel_path
+            old = previous_manifest.entries.get(rel_path)
+            done = journal.entries.get(rel_path) if resuming else None
+            if done is not None and done.digest and journal.is_done(rel_path, info.size, info.mtime_ns):
+                digest = done.digest
+                stats.files_resumed += 1
+            else:
+                if resuming and os.path.lexists(dst_file):
+                    # 上次寫到一半的檔案：先刪除 (可能是硬連結，直接覆寫會改到舊快照)
+                    dst_file.unlink()
+                started = time.perf_counter()
+                if old is not None and old.same_metadata(info) and self._link(previous / rel_path, dst_file):
+                    digest = old.digest
+                    stats.files_linked += 1
+                    stats.bytes_linked += info.size
+                else:
+                    digest = copy_and_hash(source / rel_path, dst_file, self.throttle)
+                    stats.files_copied += 1
+                    stats.bytes_copied += info.size
+                if resuming:
+                    journal.record(rel_path, info.size, info.mtime_ns, digest, time.perf_counter() - started)
+
+            manifest.entries[rel_path] = ManifestEntry(
+                path=rel_path,
+                size=info.size,
+                mtime_ns=info.mtime_ns,
+                inode=info.inode,
+                digest=digest,
+            )
+
+        manifest.save(manifest_path(destination))
+        message = "增量備份完成: 複製 %s 個檔案 (%s bytes)，硬連結 %s 個檔案"
+        args = [stats.files_copied, stats.bytes_copied, stats.files_linked]
+        if stats.files_resumed:
+            message += "，沿用上次中斷前完成的 %s 個檔案"
+            args.append(stats.files_resumed)
+        self.logger.info(message, *args)
+        return manifest, stats
+
+    def _link(self, previous_file: Path, destination: Path) -> bool:
+        """從舊快照建立硬連結；舊檔不見了或檔案系統不支援時回傳 False (改成複製)"""
+        try:
+            os.link(previous_file, destination)
+            return True
+        except OSError as e:
+            self.logger.debug("無法建立硬連結 %s: %s", previous_file, e)
+            return False
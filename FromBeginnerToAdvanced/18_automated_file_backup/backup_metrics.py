@@ -0,0 +1,162 @@
+"""
+備份效能指標 (每個階段的耗時、吞吐量、最慢的檔案)
+
+BackupResult 原本只有一個 duration，看不出時間花在哪裡；進度也只能從 log 看。
+每次備份結束後把 RunMetrics 寫成指標檔，長期觀察備份時段是不是越來越長：
+
+    *.prom    Prometheus 文字格式 (給 node_exporter 的 textfile collector 讀取)
+    *.json    最近一次的結果 (JSON)
+    *.jsonl   每次備份追加一行 JSON (保留歷史，方便畫趨勢)
+
+沒有用 prometheus_client：文字格式很簡單，不需要額外安裝套件。
+檔案先寫暫存檔再改名，collector 不會讀到寫到一半的內容。
+"""
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 每複製完一個檔案呼叫一次：timing(相對路徑, 秒數, 大小)
+Timing = Callable[[str, float, int], None]
+
+
+@contextmanager
+def timed(phases: Dict[str, float], name: str) -> Iterator[None]:
+    """把 with 區塊的耗時加到 phases[name]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+
+@dataclass
+class SlowFile:
+    """複製最久的檔案之一"""
+    path: str
+    seconds: float
+    size: int
+
+
+class SlowestFiles:
+    """
+    只保留複製最久的 count 個檔案 (不經過續傳日誌的複製路徑用：就地更新、封存、去重複倉庫)
+
+    record(path, seconds, size) 可以直接當成各複製函式的 timing 參數，多個執行緒可以同時呼叫
+    """
+
+    def __init__(self, count: int = 10):
+        self.count = count
+        self._heap: List[Tuple[float, str, int]] = []
+        self._lock = threading.Lock()
+
+    def record(self, path: str, seconds: float, size: int) -> None:
+        if self.count <= 0:
+            return
+        item = (round(seconds, 6), path, size)
+        with self._lock:
+            if len(self._heap) < self.count:
+                heapq.heappush(self._heap, item)
+            elif item > self._heap[0]:
+                heapq.heapreplace(self._heap, item)
+
+    def result(self) -> List[SlowFile]:
+        """由慢到快"""
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [SlowFile(path, seconds, size) for seconds, path, size in items]
+
+
+@dataclass
+class RunMetrics:
+    """一次備份的效能指標"""
+    source: str
+    destination: str
+    success: bool
+    timestamp: float  # 備份結束的時間 (Unix time)
+    duration: float  # 所有階段的總耗時
+    phases: Dict[str, float] = field(default_factory=dict)  # 階段 -> 秒數
+    file_count: int = 0
+    total_size: int = 0
+    files_copied: Optional[int] = None  # 增量 / 續傳時實際寫入的檔案數
+    bytes_per_second: Optional[float] = None
+    files_per_second: Optional[float] = None
+    slowest_files: List[SlowFile] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文字格式 (exposition format 0.0.4)"""
+        labels = {"source": self.source}
+        lines: List[str] = []
+
+        def metric(name: str, help_text: str, samples) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for extra, value in samples:
+                lines.append(f"{name}{_labels({**labels, **extra})} {_number(value)}")
+
+        metric("backup_last_run_timestamp_seconds", "最近一次備份結束的時間", [({}, self.timestamp)])
+        metric("backup_last_success", "最近一次備份是否成功 (1 / 0)", [({}, int(self.success))])
+        metric("backup_duration_seconds", "最近一次備份的總耗時", [({}, self.duration)])
+        metric(
+            "backup_phase_duration_seconds", "各階段的耗時",
+            [({"phase": phase}, seconds) for phase, seconds in self.phases.items()],
+        )
+        metric("backup_files", "來源的檔案數", [({}, self.file_count)])
+        metric("backup_bytes", "來源的總大小", [({}, self.total_size)])
+        if self.files_copied is not None:
+            metric("backup_files_copied", "實際寫入的檔案數", [({}, self.files_copied)])
+        if self.bytes_per_second is not None:
+            metric("backup_throughput_bytes_per_second", "複製吞吐量 (bytes/s)", [({}, self.bytes_per_second)])
+        if self.files_per_second is not None:
+            metric("backup_throughput_files_per_second", "複製吞吐量 (檔案/s)", [({}, self.files_per_second)])
+        if self.slowest_files:
+            metric(
+                "backup_slowest_file_seconds", "複製最久的檔案",
+                [({"rank": str(rank), "path": slow.path}, slow.seconds) for rank, slow in enumerate(self.slowest_files, 1)],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """標籤值裡的 \\、" 和換行要跳脫"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    """Prometheus 的無限大 / NaN 寫成 +Inf、-Inf、NaN (Python 的 repr 是 inf / nan)"""
+    if not isinstance(value, float):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def write_metrics(metrics: RunMetrics, path: Path) -> None:
+    """依照副檔名寫出指標 (.prom / .json 覆寫、.jsonl 追加)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".jsonl":
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(metrics.to_json() + "\n")
+        return
+
+    content = metrics.to_json() + "\n" if path.suffix == ".json" else metrics.to_prometheus()
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,373 @@
+"""
+內容定址 (Content-addressed) 的去重複備份倉庫
+
+每天一個完整的備份資料夾，一個月就要 30 倍的空間。
+ChunkStore 把檔案切成「依內容決定邊界」的區塊 (content-defined chunking)，
+每個區塊用 SHA-256 命名存一份；快照 (snapshot) 只是一份小小的 JSON，列出每個檔案由哪些區塊組成。
+沒變的檔案 (甚至是檔案中沒變的部分) 在所有快照之間共用同一批區塊。
+
+倉庫結構:
+    store/
+        chunks/ab/abcdef...   區塊內容 (檔名就是 SHA-256，前兩碼當子資料夾避免單一資料夾太多檔案)
+        snapshots/2026-01-29.json
+        lock                  flock 用的鎖檔 (備份取共用鎖，gc 取獨佔鎖)
+
+切塊方式 (Gear rolling hash)：
+    h = Σ GEAR[byte[j-k]] << k   (k = 0 ~ WINDOW-1，64 bit 溢位捨棄)
+    h 的最高 N 個 bit 全部為 0 時切一刀 (N = log2(平均區塊大小))，並限制最小 / 最大區塊大小。
+    區塊邊界只跟附近的內容有關，檔案中間插入幾個 byte 只會影響附近一兩個區塊，其他區塊照樣去重複。
+    用 numpy 一次算整個緩衝區的 hash (倍增法，log2(WINDOW) 次向量運算)，不用逐 byte 跑 Python 迴圈。
+
+用法:
+    python chunk_store.py STORE list
+    python chunk_store.py STORE restore 2026-01-29 /tmp/restore
+    python chunk_store.py STORE delete 2026-01-01
+    python chunk_store.py STORE gc [--min-age 秒數]
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from backup_metrics import Timing
+from tree_scan import TreeSummary, scan_tree
+
+SNAPSHOT_VERSION = 1
+WINDOW = 32  # rolling hash 的視窗大小 (bytes)
+READ_SIZE = 4 * 1024 * 1024
+GC_MIN_AGE = 3600.0  # gc 不刪最近這麼多秒內寫入的區塊 / 暫存檔 (可能屬於正在進行的備份)
+
+# 固定種子產生的 256 個 64 bit 亂數，每個 byte 值對應一個 (不能改，否則切塊邊界會全部改變)
+GEAR = np.random.default_rng(0x6B61).integers(0, 2**64, size=256, dtype=np.uint64)
+
+
+# ===== 資料模型 =====
+@dataclass
+class SnapshotFile:
+    """快照中的一個檔案"""
+    path: str
+    size: int
+    mtime_ns: int
+    chunks: List[str]  # 依序組成這個檔案的區塊 (SHA-256 hex)
+
+
+@dataclass
+class Snapshot:
+    """一個快照 = 目錄結構 + 每個檔案的區塊列表"""
+    name: str
+    files: List[SnapshotFile] = field(default_factory=list)
+    dirs: List[str] = field(default_factory=list)
+
+    @property
+    def total_size(self) -> int:
+        return sum(f.size for f in self.files)
+
+
+@dataclass
+class StoreStats:
+    """一次備份寫入倉庫的統計"""
+    files: int = 0
+    bytes: int = 0
+    chunks: int = 0
+    new_chunks: int = 0
+    new_bytes: int = 0  # 真正新寫入的 bytes (其他都是重複的區塊)
+
+
+# ===== 切塊 =====
+def _cut_candidates(data: np.ndarray, bits: int) -> np.ndarray:
+    """
+    回傳 rolling hash 符合切點條件的位置 (切在該位置之後)
+
+    h[j] = Σ GEAR[data[j-k]] << k 直接算要 WINDOW 次整個陣列的運算；
+    改用倍增：S_2m[j] = S_m[j] + (S_m[j-m] << m)，WINDOW = 32 只要 5 次
+    """
+    if data.size < WINDOW:
+        return np.empty(0, dtype=np.int64)
+    h = GEAR[data]
+    width = 1
+    while width < WINDOW:
+        # 結果的第 i 個元素對應原本的位置 i + (2 * width - 1)
+        h = h[width:] + (h[:-width] << np.uint64(width))
+        width *= 2
+    mask = np.uint64(((1 << bits) - 1) << (64 - bits))
+    return np.flatnonzero((h & mask) == 0) + WINDOW
+
+
+def chunk_stream(stream, min_size: int, avg_size: int, max_size: int) -> Iterator[bytes]:
+    """把一個二進位串流切成 content-defined 區塊"""
+    bits = max(1, avg_size.bit_length() - 1)
+    pending = b""
+    eof = False
+    while not eof:
+        block = stream.read(READ_SIZE)
+        eof = not block
+        data = pending + block
+        view = np.frombuffer(data, dtype=np.uint8)
+        candidates = _cut_candidates(view, bits)
+        start = 0
+        while True:
+            # 下一個切點：start + min_size 之後的第一個候選位置，但區塊最多 max_size
+            # (min_size >= WINDOW，所以 hash 視窗不會跨到上一個區塊，切點和讀取的緩衝區大小無關)
+            i = np.searchsorted(candidates, start + min_size)
+            cut = int(candidates[i]) if i < candidates.size else None
+            if cut is None or cut - start > max_size:
+                if len(data) - start >= max_size:
+                    cut = start + max_size
+                else:
+                    break  # 剩下的資料等下一個緩衝區 (或檔案結束)
+            yield data[start:cut]
+            start = cut
+        pending = data[start:]
+    if pending:
+        yield pending
+
+
+# ===== 倉庫 =====
+class ChunkStore:
+    """內容定址的區塊倉庫"""
+
+    def __init__(
+        self,
+        root: Path,
+        min_size: int = 16 * 1024,
+        avg_size: int = 64 * 1024,
+        max_size: int = 256 * 1024,
+    ):
+        if not (WINDOW <= min_size <= avg_size <= max_size):
+            raise ValueError("區塊大小必須符合 WINDOW <= min_size <= avg_size <= max_size")
+        self.root = Path(root)
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.chunks_dir = self.root / "chunks"
+        self.snapshots_dir = self.root / "snapshots"
+        self.chunks_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def lock(self, exclusive: bool = False) -> Iterator[None]:
+        """
+        倉庫鎖 (flock，其他行程例如 CLI 的 gc 也會互相等待)
+
+        備份取共用鎖 (多個備份可以同時進行)，gc 找出要刪的區塊、以及每刪一個區塊時取獨佔鎖：
+        避免 put_chunk 剛看到區塊已經存在，gc 就把它刪掉，新快照引用到不存在的區塊
+        """
+        with open(self.root / "lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ----- 區塊 -----
+    def chunk_path(self, digest: str) -> Path:
+        return self.chunks_dir / digest[:2] / digest
+
+    def put_chunk(self, data: bytes) -> Tuple[str, bool]:
+        """
+        存入一個區塊，回傳 (SHA-256, 是否是新的區塊)
+
+        區塊已經存在時更新它的 mtime：gc 刪除前會再檢查一次，剛被引用的區塊太新，不會被刪掉
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        try:
+            os.utime(path)
+            return digest, False
+        except FileNotFoundError:
+            pass
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # 原子性地出現，不會有寫一半的區塊
+        return digest, True
+
+    def get_chunk(self, digest: str) -> bytes:
+        """讀出區塊並檢查內容 (SHA-256 不符代表區塊損壞)"""
+        data = self.chunk_path(digest).read_bytes()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"區塊損壞: {digest}")
+        return data
+
+    # ----- 快照 -----
+    def snapshot_path(self, name: str) -> Path:
+        return self.snapshots_dir / f"{name}.json"
+
+    def list_snapshots(self) -> List[str]:
+        return sorted(path.stem for path in self.snapshots_dir.glob("*.json"))
+
+    def load_snapshot(self, name: str) -> Snapshot:
+        with open(self.snapshot_path(name), encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支援的快照版本: {data.get('version')}")
+        files = [SnapshotFile(**item) for item in data["files"]]
+        return Snapshot(name=data["name"], files=files, dirs=data["dirs"])
+
+    def _save_snapshot(self, snapshot: Snapshot) -> None:
+        data = {"version": SNAPSHOT_VERSION, **asdict(snapshot)}
+        path = self.snapshot_path(snapshot.name)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def delete_snapshot(self, name: str) -> None:
+        """刪除快照 (區塊要等 gc 才會真的刪掉)"""
+        self.snapshot_path(name).unlink()
+
+    # ----- 備份 / 還原 -----
+    def backup(
+        self,
+        source: Path,
+        name: str,
+        summary: Optional[TreeSummary] = None,
+        timing: Optional[Timing] = None,
+    ) -> Tuple[Snapshot, StoreStats]:
+        """
+        把 source 存成一個快照 (同名快照會被覆蓋)
+
+        區塊先寫入，快照檔最後才寫；中途失敗只會留下沒被引用的區塊 (gc 會清掉)
+        timing 不是 None 時，每存完一個檔案呼叫 timing(相對路徑, 秒數, 大小)
+        """
+        source = Path(source)
+        if summary is None:
+            summary = scan_tree(source)
+        snapshot = Snapshot(name=name, dirs=list(summary.dirs))
+        stats = StoreStats()
+
+        with self.lock():
+            for rel_path, info in sorted(summary.files.items()):
+                started = time.perf_counter()
+                digests = []
+                with open(source / rel_path, "rb") as f:
+                    for chunk in chunk_stream(f, self.min_size, self.avg_size, self.max_size):
+                        digest, new = self.put_chunk(chunk)
+                        digests.append(digest)
+                        stats.chunks += 1
+                        if new:
+                            stats.new_chunks += 1
+                            stats.new_bytes += len(chunk)
+                snapshot.files.append(SnapshotFile(rel_path, info.size, info.mtime_ns, digests))
+                stats.files += 1
+                stats.bytes += info.size
+                if timing is not None:
+                    timing(rel_path, time.perf_counter() - started, info.size)
+
+            self._save_snapshot(snapshot)
+        return snapshot, stats
+
+    def restore(self, name: str, target: Path) -> Snapshot:
+        """把快照還原到 target 資料夾 (target 不能已經存在)"""
+        snapshot = self.load_snapshot(name)
+        target = Path(target)
+        target.mkdir(parents=True, exist_ok=False)
+        for rel_dir in snapshot.dirs:
+            (target / rel_dir).mkdir()
+        for item in snapshot.files:
+            path = target / item.path
+            with open(path, "wb") as f:
+                for digest in item.chunks:
+                    f.write(self.get_chunk(digest))
+            os.utime(path, ns=(item.mtime_ns, item.mtime_ns))
+        return snapshot
+
+    # ----- 垃圾回收 -----
+    def referenced_chunks(self) -> Set[str]:
+        referenced: Set[str] = set()
+        for name in self.list_snapshots():
+            for item in self.load_snapshot(name).files:
+                referenced.update(item.chunks)
+        return referenced
+
+    def gc(self, min_age: float = GC_MIN_AGE, pace: Optional[Callable[[int], bool]] = None) -> Tuple[int, int]:
+        """
+        刪除沒有任何快照引用的區塊，回傳 (刪除的區塊數, 釋放的 bytes)
+
+        最近 min_age 秒內寫入的區塊與 .tmp 不刪，.tmp 要超過 min_age 才當成中斷留下的殘骸。
+        pace 是限速函式 (例如 retention 的 _Pacer.wait)，每刪一個檔案前呼叫一次，回傳 False 時提早結束。
+
+        只有找出候選區塊時、以及每次刪除時持有獨佔鎖；pace 等待期間不持有鎖，備份不用等整個 gc 結束。
+        兩次刪除之間開始的備份如果沿用了候選區塊，put_chunk 會更新它的 mtime，刪除前發現 mtime 變了就略過
+        """
+        cutoff = time.time() - min_age
+        with self.lock(exclusive=True):
+            referenced = self.referenced_chunks()
+            candidates = []
+            for path in self.chunks_dir.glob("*/*"):
+                try:
+                    info = path.stat()
+                except FileNotFoundError:
+                    continue
+                if path.name not in referenced and info.st_mtime <= cutoff:
+                    candidates.append((path, info.st_mtime_ns))
+
+        removed, freed = 0, 0
+        for path, mtime_ns in candidates:
+            if pace is not None and not pace(1):
+                break
+            with self.lock(exclusive=True):
+                try:
+                    info = path.stat()
+                except FileNotFoundError:
+                    continue
+                if info.st_mtime_ns != mtime_ns:
+                    continue  # 放開鎖的期間被新的備份沿用了 (mtime 被更新)
+                path.unlink(missing_ok=True)
+            removed += 1
+            freed += info.st_size
+        return removed, freed
+
+    def disk_usage(self) -> int:
+        """倉庫裡所有區塊的大小總和"""
+        return sum(path.stat().st_size for path in self.chunks_dir.glob("*/*"))
+
+
+# ===== CLI =====
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="去重複備份倉庫管理")
+    parser.add_argument("store", help="倉庫資料夾")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出所有快照")
+    restore_parser = sub.add_parser("restore", help="還原快照")
+    restore_parser.add_argument("name")
+    restore_parser.add_argument("target")
+    delete_parser = sub.add_parser("delete", help="刪除快照 (之後執行 gc 釋放空間)")
+    delete_parser.add_argument("name")
+    gc_parser = sub.add_parser("gc", help="刪除沒有被引用的區塊")
+    gc_parser.add_argument("--min-age", type=float, default=GC_MIN_AGE, help="不刪最近幾秒內寫入的區塊")
+    args = parser.parse_args(argv)
+
+    store = ChunkStore(Path(args.store))
+    if args.command == "list":
+        for name in store.list_snapshots():
+            snapshot = store.load_snapshot(name)
+            print(f"{name}  {len(snapshot.files):>8} 個文件  {snapshot.total_size:>14,} bytes")
+        print(f"倉庫實際大小: {store.disk_usage():,} bytes")
+    elif args.command == "restore":
+        if Path(args.target).exists():
+            print(f"錯誤：目標已存在: {args.target}", file=sys.stderr)
+            return 1
+        snapshot = store.restore(args.name, Path(args.target))
+        print(f"✅ 已還原 {len(snapshot.files)} 個文件到 {args.target}")
+    elif args.command == "delete":
+        store.delete_snapshot(args.name)
+        print(f"已刪除快照 {args.name}，執行 gc 釋放空間")
+    else:
+        removed, freed = store.gc(args.min_age)
+        print(f"🧹 刪除 {removed} 個區塊，釋放 {freed:,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+事件驅動排程器 (取代每 60 秒輪詢一次的 schedule.run_pending 迴圈)
+
+所有工作的下一次執行時間放在一個 heap (最小堆積) 裡，排程器只要看堆頂就知道
+「最近的工作什麼時候到期」，然後直接睡到那個時間：兩次備份之間完全不佔 CPU，
+也不會像 60 秒輪詢那樣最多晚一分鐘才執行。
+
+睡眠用 threading.Event.wait(timeout)：
+    - stop() 或收到 SIGTERM / SIGINT 會立刻叫醒並結束 (正在執行的工作會先做完)
+    - 其他執行緒新增工作時也會叫醒，重新計算下一次要醒來的時間
+
+排程規則支援 cron 語法 (分 時 日 月 星期)，例如:
+    "57 18 * * *"     每天 18:57
+    "0 */6 * * 1-5"   週一到週五每 6 小時
+    "@daily"          每天 00:00
+"""
+import heapq
+import itertools
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, FrozenSet, Iterator, List, Optional, Protocol, Tuple
+
+# 一次最多睡多久：系統時間被調整或電腦休眠後，最晚這麼久就會重新對一次時間
+MAX_SLEEP = 3600.0
+# 找不到下一次執行時間的上限 (例如 "0 0 30 2 *" 二月三十日永遠不會發生)
+MAX_LOOKAHEAD_DAYS = 366 * 5
+
+CRON_ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+
+class ILogger(Protocol):
+    """日誌介面 (和 18_automated_file_backup_4.ILogger 相同)"""
+
+    def debug(self, message: str, *args: Any) -> None: ...
+    def info(self, message: str, *args: Any) -> None: ...
+    def warning(self, message: str, *args: Any) -> None: ...
+    def error(self, message: str, *args: Any) -> None: ...
+
+
+# ===== cron 運算式 =====
+def _parse_field(text: str, low: int, high: int) -> FrozenSet[int]:
+    """解析 cron 的一個欄位，例如 "*/15"、"1-5"、"0,30"，回傳允許的數值"""
+    values = set()
+    for part in text.split(","):
+        base, has_step, step_text = part.partition("/")
+        step = int(step_text) if has_step else 1
+        if step < 1:
+            raise ValueError(f"cron 間隔必須大於 0: {part}")
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(value) for value in base.split("-", 1))
+        else:
+            start = int(base)
+            end = high if has_step else start  # "5/15" 表示從 5 開始每 15
+        if not low <= start <= end <= high:
+            raise ValueError(f"cron 欄位超出範圍 {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class CronExpression:
+    """
+    cron 運算式 (分 時 日 月 星期)
+
+    星期 0 和 7 都是星期日；和標準 cron 一樣，「日」和「星期」都有指定時只要符合其中一個就執行
+    """
+    expression: str
+    minutes: FrozenSet[int]
+    hours: FrozenSet[int]
+    days: FrozenSet[int]
+    months: FrozenSet[int]
+    weekdays: FrozenSet[int]
+    days_restricted: bool
+    weekdays_restricted: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> "CronExpression":
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 運算式需要 5 個欄位 (分 時 日 月 星期): {expression!r}")
+        try:
+            weekdays = _parse_field(fields[4], 0, 7)
+            return cls(
+                expression=expression,
+                minutes=_parse_field(fields[0], 0, 59),
+                hours=_parse_field(fields[1], 0, 23),
+                days=_parse_field(fields[2], 1, 31),
+                months=_parse_field(fields[3], 1, 12),
+                weekdays=frozenset(day % 7 for day in weekdays),
+                days_restricted=fields[2] != "*",
+                weekdays_restricted=fields[4] != "*",
+            )
+        except ValueError as e:
+            raise ValueError(f"無效的 cron 運算式 {expression!r}: {e}") from None
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays  # Python 週一=0，cron 週日=0
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之後 (不含) 第一個符合的時間；不符合的月 / 日 / 時整段跳過，不用逐分鐘檢查"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=MAX_LOOKAHEAD_DAYS)
+        while candidate <= limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)  # 跳到下個月 1 日
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"cron 運算式 {self.expression!r} 在 {MAX_LOOKAHEAD_DAYS} 天內都不會執行")
+
+
+# ===== 排程器 =====
+@dataclass
+class ScheduledJob:
+    """一個排程工作"""
+    name: str
+    func: Callable[[], Any]
+    cron: CronExpression
+    next_run: datetime
+    runs: int = 0
+    last_error: Optional[str] = field(default=None, repr=False)
+
+
+class EventScheduler:
+    """
+    以 heap 保存下一次執行時間的排程器 (實作 IScheduler)
+
+    clock 可以替換成假的時鐘 (測試用)；多個工作互不影響，某個工作拋出例外只會記錄下來
+    """
+
+    def __init__(self, logger: ILogger, clock: Callable[[], float] = time.time):
+        self.logger = logger
+        self.clock = clock
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._counter = itertools.count()  # 同時到期時依照加入的順序執行
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+    @property
+    def jobs(self) -> List[ScheduledJob]:
+        """依照下一次執行時間排序的工作"""
+        with self._lock:
+            return [job for _, _, job in sorted(self._heap)]
+
+    def schedule_cron(self, expression: str, job_func: Callable[[], Any], name: Optional[str] = None) -> ScheduledJob:
+        """依照 cron 運算式加入工作"""
+        cron = CronExpression.parse(expression)
+        now = datetime.fromtimestamp(self.clock())
+        job = ScheduledJob(name or getattr(job_func, "__name__", "job"), job_func, cron, cron.next_after(now))
+        self._push(job)
+        self.logger.info("設定排程 %s (%s)，下一次執行: %s", job.name, expression, job.next_run.strftime("%Y-%m-%d %H:%M"))
+        return job
+
+    def schedule_daily(self, time_str: str, job_func: Callable[[], Any]) -> None:
+        """設定每日排程 ("HH:MM")"""
+        hour, _, minute = time_str.partition(":")
+        self.schedule_cron(f"{int(minute)} {int(hour)} * * *", job_func)
+
+    def _push(self, job: ScheduledJob) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (job.next_run.timestamp(), next(self._counter), job))
+        self._wakeup.set()  # run_forever 可能正在睡，讓它重新計算要睡多久
+
+    def idle_seconds(self) -> Optional[float]:
+        """距離下一個工作還有幾秒 (已經到期則為 0)；沒有工作時回傳 None"""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - self.clock())
+
+    def run_pending(self) -> int:
+        """執行所有已到期的工作，回傳執行了幾個"""
+        ran = 0
+        while True:
+            now = self.clock()
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    return ran
+                _, _, job = heapq.heappop(self._heap)
+            self._run(job)
+            ran += 1
+            # 從「現在」往後找下一次：錯過好幾次 (例如電腦休眠) 也只補跑一次
+            job.next_run = job.cron.next_after(max(job.next_run, datetime.fromtimestamp(self.clock())))
+            self._push(job)
+
+    def _run(self, job: ScheduledJob) -> None:
+        self.logger.info("執行排程工作: %s", job.name)
+        try:
+            job.func()
+            job.last_error = None
+        except Exception as e:
+            job.last_error = str(e)
+            self.logger.error("排程工作 %s 執行失敗: %s", job.name, e)
+        job.runs += 1
+
+    def run_forever(self) -> None:
+        """睡到下一個工作到期就執行，直到 stop() 或收到 SIGTERM / SIGINT"""
+        self._stopping = False
+        with self._signal_handlers():
+            while not self._stopping:
+                self._wakeup.clear()
+                self.run_pending()
+                idle = self.idle_seconds()
+                if idle is None:
+                    self.logger.debug("目前沒有排程工作，等待新增工作或停止")
+                    idle = MAX_SLEEP
+                elif idle > 0:
+                    self.logger.debug("下一個工作在 %.0f 秒後", idle)
+                self._wakeup.wait(min(idle, MAX_SLEEP))
+
+    def stop(self) -> None:
+        """讓 run_forever 結束 (可以從其他執行緒或 signal handler 呼叫)"""
+        self._stopping = True
+        self._wakeup.set()
+
+    def clear_all(self) -> None:
+        """清除所有排程"""
+        self.logger.info("清除所有排程")
+        with self._lock:
+            self._heap.clear()
+        self._wakeup.set()
+
+    @contextmanager
+    def _signal_handlers(self) -> Iterator[None]:
+        """執行期間把 SIGTERM / SIGINT 改成「正常停止」；signal 只能在主執行緒設定"""
+        if threading.current_thread() is not threading.main_thread():
+            yield
+            return
+
+        def handle(signum, frame):
+            self.logger.info("收到 %s，停止排程器", signal.Signals(signum).name)
+            self.stop()
+
+        previous = {signum: signal.signal(signum, handle) for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            yield
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
@@ -0,0 +1,385 @@
+"""
+持續備份 (watch 模式)：inotify 監看來源目錄，只同步有變動的路徑
+
+每日快照會漏掉兩次備份之間的所有修改，而且每次都要重新掃描整棵目錄樹。
+watch 模式改成訂閱 Linux inotify 事件：
+
+    InotifyWatcher   用 ctypes 呼叫 libc 的 inotify (不需要額外安裝套件)，每個子資料夾一個 watch，
+                     新建 / 搬進來的資料夾會自動加入監看
+    DebouncedQueue   把短時間內的大量事件合併成一批 (同一個檔案存檔十次只處理一次)：
+                     安靜 debounce 秒之後送出；一直有變動時最多也只等 max_delay 秒
+    sync_paths       只處理這一批路徑：來源還在就複製 (資料夾則比對子樹)，不在了就從備份刪除
+
+工作量和「變動的檔案數」成正比，和整棵目錄樹的大小無關。
+事件太多時核心會丟掉事件 (IN_Q_OVERFLOW)，這時改成比對整棵樹一次，不會漏掉變更。
+"""
+import ctypes
+import ctypes.util
+import errno
+import math
+import os
+import select
+import shutil
+import struct
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Protocol
+
+from backup_manifest import Manifest, ManifestEntry, copy_and_hash
+from backup_metrics import Timing
+from rate_limiter import Throttle
+from tree_scan import TreeSummary, scan_tree
+
+# linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+# 代表「整棵樹」的路徑 (事件溢位時使用)
+ROOT = ""
+
+
+class ILogger(Protocol):
+    """日誌介面 (和 18_automated_file_backup_4.ILogger 相同)"""
+
+    def debug(self, message: str, *args: Any) -> None: ...
+    def info(self, message: str, *args: Any) -> None: ...
+    def warning(self, message: str, *args: Any) -> None: ...
+    def error(self, message: str, *args: Any) -> None: ...
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        raise OSError(errno.ENOSYS, "這個系統沒有 inotify (watch 模式只支援 Linux)")
+    return libc
+
+
+# ===== inotify =====
+class InotifyWatcher:
+    """
+    監看 root 底下所有資料夾，read() 回傳有變動的相對路徑
+
+    wake() 可以從其他執行緒叫醒正在等待的 read() (用來停止 watch 模式)
+    """
+
+    def __init__(self, root: Path, logger: Optional[ILogger] = None):
+        self.root = Path(root)
+        self.logger = logger
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 失敗: {os.strerror(error)}")
+        self._wake_r, self._wake_w = os.pipe()
+        self._dirs: Dict[int, str] = {}  # watch descriptor -> 相對路徑
+        self._poller = select.poll()
+        self._poller.register(self._fd, select.POLLIN)
+        self._poller.register(self._wake_r, select.POLLIN)
+        self.add_tree(ROOT)
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._dirs)
+
+    def add_tree(self, rel_dir: str) -> List[str]:
+        """監看 rel_dir 和底下所有子資料夾，回傳裡面已經存在的檔案 (監看開始前就建立的)"""
+        base = self.root / rel_dir if rel_dir else self.root
+        self._add_watch(rel_dir)
+        summary = scan_tree(base)
+        for sub_dir in summary.dirs:
+            self._add_watch(_join(rel_dir, sub_dir))
+        return [_join(rel_dir, rel_path) for rel_path in summary.files]
+
+    def _add_watch(self, rel_dir: str) -> None:
+        path = os.fsencode(self.root / rel_dir if rel_dir else self.root)
+        wd = self._libc.inotify_add_watch(self._fd, path, WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            # ENOSPC：超過 fs.inotify.max_user_watches；ENOENT：資料夾已經被刪掉了
+            if self.logger:
+                self.logger.warning("無法監看 %s: %s", rel_dir or ".", os.strerror(ctypes.get_errno()))
+            return
+        self._dirs[wd] = rel_dir
+
+    def _remove_tree(self, rel_dir: str) -> None:
+        """資料夾被搬走時取消監看 (watch 會跟著 inode 走，留著的話路徑會對不上)"""
+        prefix = rel_dir + "/"
+        for wd, path in list(self._dirs.items()):
+            if path == rel_dir or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def read(self, timeout: Optional[float] = None) -> List[str]:
+        """等待事件 (timeout 秒，None 表示一直等)，回傳有變動的相對路徑 (可能重複)"""
+        ready = self._poller.poll(None if timeout is None else max(0, math.ceil(timeout * 1000)))
+        changed: List[str] = []
+        for fd, _ in ready:
+            if fd == self._wake_r:
+                os.read(self._wake_r, 1024)
+                continue
+            while True:
+                try:
+                    data = os.read(self._fd, READ_SIZE)
+                except BlockingIOError:
+                    break
+                changed.extend(self._parse(data))
+        return changed
+
+    def _parse(self, data: bytes) -> List[str]:
+        changed: List[str] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                if self.logger:
+                    self.logger.warning("inotify 事件溢位，下一批改成比對整棵目錄樹")
+                changed.append(ROOT)
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)  # 資料夾被刪除，核心已經自動移除 watch
+                continue
+            rel_dir = self._dirs.get(wd)
+            if rel_dir is None or not name:
+                continue
+
+            rel_path = _join(rel_dir, name)
+            changed.append(rel_path)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新資料夾：加入監看，並把 watch 建立之前就寫進去的檔案也算成變動
+                    changed.extend(self.add_tree(rel_path))
+                elif mask & IN_MOVED_FROM:
+                    self._remove_tree(rel_path)
+        return changed
+
+    def wake(self) -> None:
+        """叫醒正在等待的 read()"""
+        os.write(self._wake_w, b"\0")
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            for fd in (self._fd, self._wake_r, self._wake_w):
+                os.close(fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# ===== 合併事件 =====
+class DebouncedQueue:
+    """把一段時間內的變動路徑合併成一批"""
+
+    def __init__(self, debounce: float = 2.0, max_delay: float = 30.0, clock=time.monotonic):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.clock = clock
+        self._paths = set()
+        self._first = 0.0
+        self._last = 0.0
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def add(self, paths: Iterable[str]) -> None:
+        paths = set(paths)
+        if not paths:
+            return
+        now = self.clock()
+        if not self._paths:
+            self._first = now
+        self._last = now
+        self._paths |= paths
+
+    def time_until_ready(self) -> Optional[float]:
+        """還要等幾秒才能送出這一批；沒有待處理的路徑時回傳 None"""
+        if not self._paths:
+            return None
+        now = self.clock()
+        return max(0.0, min(self._last + self.debounce, self._first + self.max_delay) - now)
+
+    def pop_ready(self, force: bool = False) -> List[str]:
+        """到時間了 (或 force) 就取出整批 (已經排除被上層資料夾涵蓋的路徑)，否則回傳空的 list"""
+        if not force and self.time_until_ready() != 0.0:
+            return []
+        paths, self._paths = self._paths, set()
+        return collapse_paths(paths)
+
+
+def collapse_paths(paths: Iterable[str]) -> List[str]:
+    """上層資料夾也在清單裡的路徑可以省略 (同步資料夾時會一併處理)"""
+    paths = set(paths)
+    if ROOT in paths:
+        return [ROOT]
+
+    def covered(path: str) -> bool:
+        parts = path.split("/")
+        return any("/".join(parts[:depth]) in paths for depth in range(1, len(parts)))
+
+    return sorted(path for path in paths if not covered(path))
+
+
+# ===== 同步 =====
+@dataclass
+class SyncStats:
+    """一批變動的同步結果"""
+    copied: int = 0
+    deleted: int = 0
+    bytes_copied: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def sync_paths(
+    source: Path,
+    destination: Path,
+    paths: Iterable[str],
+    manifest: Optional[Manifest] = None,
+    timing: Optional[Timing] = None,
+    throttle: Optional[Throttle] = None,
+) -> SyncStats:
+    """
+    把 source 裡的 paths 同步到 destination (快照資料夾)
+
+    複製時先寫暫存檔再改名：快照裡的檔案可能和上一個快照硬連結在一起，
+    直接覆寫會連舊快照的內容一起改掉。manifest 不是 None 時會一併更新 (呼叫端負責存檔)
+    timing 不是 None 時，每複製完一個檔案呼叫 timing(相對路徑, 秒數, 大小)；throttle 是複製的限速
+    """
+    stats = SyncStats()
+    for rel_path in collapse_paths(paths):
+        src = source / rel_path if rel_path else source
+        try:
+            if src.is_dir():  # 指向資料夾的符號連結也當成資料夾同步 (和 tree_scan 一致)
+                _sync_tree(source, destination, rel_path, manifest, stats, timing=timing, throttle=throttle)
+            elif src.is_file():
+                _copy_file(source, destination, rel_path, manifest, stats, timing, throttle)
+            else:
+                _delete(destination, rel_path, manifest, stats)
+        except OSError as e:
+            stats.errors.append(f"{rel_path}: {e}")
+    return stats
+
+
+def sync_tree(
+    source: Path,
+    destination: Path,
+    manifest: Optional[Manifest] = None,
+    summary: Optional[TreeSummary] = None,
+    timing: Optional[Timing] = None,
+    throttle: Optional[Throttle] = None,
+) -> SyncStats:
+    """整棵樹比對一次 (同一天重跑備份時就地更新快照用)；summary 是已經掃描好的來源目錄，timing、throttle 同 sync_paths"""
+    stats = SyncStats()
+    try:
+        _sync_tree(source, destination, ROOT, manifest, stats, summary, timing, throttle)
+    except OSError as e:
+        stats.errors.append(f"{destination}: {e}")
+    return stats
+
+
+def _copy_file(
+    source: Path,
+    destination: Path,
+    rel_path: str,
+    manifest: Optional[Manifest],
+    stats: SyncStats,
+    timing: Optional[Timing] = None,
+    throttle: Optional[Throttle] = None,
+) -> None:
+    started = time.perf_counter()
+    dst = destination / rel_path
+    if dst.is_dir() and not dst.is_symlink():
+        shutil.rmtree(dst)  # 原本是資料夾，現在變成同名檔案
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".sync-tmp")
+    try:
+        digest = copy_and_hash(source / rel_path, tmp, throttle)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    stat = (source / rel_path).stat()
+    stats.copied += 1
+    stats.bytes_copied += stat.st_size
+    if timing is not None:
+        timing(rel_path, time.perf_counter() - started, stat.st_size)
+    if manifest is not None:
+        manifest.entries[rel_path] = ManifestEntry(rel_path, stat.st_size, stat.st_mtime_ns, stat.st_ino, digest)
+
+
+def _sync_tree(
+    source: Path,
+    destination: Path,
+    rel_dir: str,
+    manifest: Optional[Manifest],
+    stats: SyncStats,
+    src_summary: Optional[TreeSummary] = None,
+    timing: Optional[Timing] = None,
+    throttle: Optional[Throttle] = None,
+) -> None:
+    """比對一個資料夾的子樹：大小或修改時間不同就複製，備份多出來的就刪除"""
+    if src_summary is None:
+        src_summary = scan_tree(source / rel_dir if rel_dir else source)
+    dst_root = destination / rel_dir if rel_dir else destination
+    if dst_root.exists() and not dst_root.is_dir():
+        dst_root.unlink()
+    dst_summary = scan_tree(dst_root) if dst_root.exists() else None
+
+    dst_root.mkdir(parents=True, exist_ok=True)
+    for sub_dir in src_summary.dirs:
+        dst_dir = dst_root / sub_dir
+        if dst_dir.is_file() or dst_dir.is_symlink():
+            dst_dir.unlink()  # 原本是檔案，現在變成同名資料夾
+        dst_dir.mkdir(exist_ok=True)
+    for rel_path, info in sorted(src_summary.files.items()):
+        old = dst_summary.files.get(rel_path) if dst_summary else None
+        if old is None or old.size != info.size or old.mtime_ns != info.mtime_ns:
+            _copy_file(source, destination, _join(rel_dir, rel_path), manifest, stats, timing, throttle)
+    if dst_summary is None:
+        return
+    for rel_path in dst_summary.files.keys() - src_summary.files.keys():
+        _delete(destination, _join(rel_dir, rel_path), manifest, stats)
+    for sub_dir in sorted(set(dst_summary.dirs) - set(src_summary.dirs), reverse=True):
+        shutil.rmtree(dst_root / sub_dir, ignore_errors=True)
+
+
+def _delete(destination: Path, rel_path: str, manifest: Optional[Manifest], stats: SyncStats) -> None:
+    dst = destination / rel_path
+    if dst.is_dir() and not dst.is_symlink():
+        removed = sum(1 for _ in scan_tree(dst).files)
+        shutil.rmtree(dst)
+    elif dst.exists() or dst.is_symlink():
+        removed = 1
+        dst.unlink()
+    else:
+        removed = 0
+    stats.deleted += removed
+    if manifest is not None:
+        prefix = rel_path + "/"
+        for path in [path for path in manifest.entries if path == rel_path or path.startswith(prefix)]:
+            del manifest.entries[path]
@@ -0,0 +1,183 @@
+"""
+多執行緒目錄複製引擎
+
+shutil.copytree 一次只複製一個檔案，等待磁碟 / 網路的時間無法重疊；
+在 SSD 或網路磁碟上有大量小檔案時，磁碟的吞吐量幾乎用不到。
+
+ParallelCopier 用 ThreadPoolExecutor 同時複製多個檔案 (檔案 I/O 會釋放 GIL)：
+    - 先依序建立所有資料夾
+    - 小檔案分批 (batch)：一個 task 複製一批檔案，減少排程的開銷
+    - 大檔案切塊 (chunk)：先建立好固定大小的目標檔，每個區塊由不同執行緒用 pread / pwrite 複製
+    - 全部完成後再補上大檔案的修改時間等屬性 (寫入會改變 mtime)
+"""
+import os
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from backup_journal import BackupJournal
+from rate_limiter import Throttle
+from tree_scan import TreeSummary, scan_tree
+
+MB = 1024 * 1024
+
+
+@dataclass
+class CopyStats:
+    """一次複製的統計"""
+    files: int = 0
+    bytes: int = 0
+    skipped: int = 0  # 續傳時上一次已經完成的檔案
+    batches: int = 0
+    chunks: int = 0
+    duration: float = 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.duration if self.duration > 0 else 0.0
+
+
+def _copy_batch(files: List[Tuple[Path, Path]], copy_function: Callable) -> None:
+    for src, dst in files:
+        copy_function(src, dst)
+
+
+def _copy_chunk(src: Path, dst: Path, offset: int, length: int, throttle: Optional[Throttle] = None) -> float:
+    """
+    用 pread / pwrite 複製一個區塊 (不共用檔案位置，多個執行緒可以同時寫同一個檔案)，回傳花費的秒數
+
+    throttle 不是 None 時每讀 1 MB 就取得一次額度 (等待的時間也算在花費的秒數裡)
+    """
+    started = time.perf_counter()
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY)
+        try:
+            end = offset + length
+            while offset < end:
+                read_started = time.perf_counter()
+                data = os.pread(src_fd, min(MB, end - offset), offset)
+                if not data:
+                    raise IOError(f"來源檔案在複製時變短了: {src}")
+                if throttle is not None:
+                    throttle.observe(time.perf_counter() - read_started)
+                    throttle.acquire(nbytes=len(data))
+                written = os.pwrite(dst_fd, data, offset)
+                offset += written
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return time.perf_counter() - started
+
+
+class ParallelCopier:
+    """多執行緒複製整個目錄"""
+
+    def __init__(
+        self,
+        workers: int = 8,
+        chunk_size: int = 16 * MB,
+        large_file_threshold: int = 64 * MB,
+        batch_files: int = 64,
+        batch_bytes: int = 8 * MB,
+        copy_function: Callable = shutil.copy2,
+        throttle: Optional[Throttle] = None,
+    ):
+        if workers < 1:
+            raise ValueError("workers 必須 >= 1")
+        if chunk_size < 1:
+            raise ValueError("chunk_size 必須 >= 1")
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.large_file_threshold = large_file_threshold
+        self.batch_files = batch_files
+        self.batch_bytes = batch_bytes
+        self.copy_function = copy_function  # 小文件用的複製函式 (例如 zero_copy.ZeroCopier)
+        self.throttle = throttle  # 所有執行緒共用的限速 (None 表示不限制)
+
+    def copy_tree(
+        self,
+        source: Path,
+        destination: Path,
+        summary: Optional[TreeSummary] = None,
+        journal: Optional[BackupJournal] = None,
+    ) -> CopyStats:
+        """
+        把 source 複製成 destination (destination 不能已經存在，和 shutil.copytree 一樣)
+
+        summary 是已經掃描好的來源目錄；任何一個檔案失敗都會拋出例外
+        journal 不是 None 時是續傳：destination 可以已經存在，日誌裡已完成的檔案會略過
+        """
+        started = time.perf_counter()
+        source, destination = Path(source), Path(destination)
+        if summary is None:
+            summary = scan_tree(source)
+
+        resuming = journal is not None
+        destination.mkdir(parents=True, exist_ok=resuming)
+        for rel_dir in summary.dirs:
+            (destination / rel_dir).mkdir(exist_ok=resuming)
+
+        stats = CopyStats()  # 只計算這次真的複製的檔案 (續傳略過的不算，吞吐量才正確)
+        large_files: List[Tuple[Path, Path, str, List[Future]]] = []
+        copy_function = self.throttle.wrap(self.copy_function) if self.throttle else self.copy_function
+        if journal:
+            copy_function = journal.wrap(copy_function)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backup-copy") as executor:
+            futures = []
+            batch: List[Tuple[Path, Path]] = []
+            batch_size = 0
+            for rel_path, info in summary.files.items():
+                src, dst = source / rel_path, destination / rel_path
+                if journal and journal.is_done(rel_path, info.size, info.mtime_ns):
+                    stats.skipped += 1
+                    continue
+                stats.files += 1
+                stats.bytes += info.size
+                if info.size >= self.large_file_threshold:
+                    if self.throttle:
+                        self.throttle.acquire(files=1)
+                    with open(dst, "wb") as f:
+                        f.truncate(info.size)
+                    chunks = []
+                    for offset in range(0, info.size, self.chunk_size):
+                        length = min(self.chunk_size, info.size - offset)
+                        chunks.append(executor.submit(_copy_chunk, src, dst, offset, length, self.throttle))
+                        stats.chunks += 1
+                    futures.extend(chunks)
+                    large_files.append((src, dst, rel_path, chunks))
+                    continue
+
+                batch.append((src, dst))
+                batch_size += info.size
+                if len(batch) >= self.batch_files or batch_size >= self.batch_bytes:
+                    futures.append(executor.submit(_copy_batch, batch, copy_function))
+                    stats.batches += 1
+                    batch, batch_size = [], 0
+            if batch:
+                futures.append(executor.submit(_copy_batch, batch, copy_function))
+                stats.batches += 1
+
+            for future in futures:
+                future.result()  # 有錯誤的話在這裡拋出
+
+        for src, dst, rel_path, chunks in large_files:
+            shutil.copystat(src, dst)
+            if journal:
+                # 大檔案的複製時間 = 各區塊花費時間的總和
+                info = summary.files[rel_path]
+                journal.record(rel_path, info.size, info.mtime_ns, seconds=sum(chunk.result() for chunk in chunks))
+        for rel_dir in summary.dirs:
+            shutil.copystat(source / rel_dir, destination / rel_dir)
+
+        stats.duration = time.perf_counter() - started
+        return stats
@@ -0,0 +1,229 @@
+"""
+備份複製的限速 (Token bucket)，避免備份把共用磁碟的頻寬 / IOPS 佔滿
+
+TokenBucket 以固定速度 rate 產生 token，每次操作先取走對應數量的 token：
+    - bytes 桶：每複製 n bytes 取 n 個 (頻寬)
+    - files 桶：每個文件取 1 個 (IOPS，大量小文件時主要是它在限制)
+token 不夠時可以先「借」，借了多少就睡多久 (deficit / rate)；多個執行緒共用同一個桶時，
+總速度一樣會被限制在 rate。閒置時最多累積 1 秒份的 token (burst)。
+
+Throttle 同時管理兩個桶，速度可以在備份進行中用 set_limits() 調整。
+adaptive=True 時再加上 AdaptiveController：觀察讀取來源的延遲，
+延遲明顯上升 (其他服務正在用這顆磁碟) 就把速度減半，恢復後再慢慢加回來 (AIMD)。
+"""
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Optional
+
+MB = 1024 * 1024
+
+
+class TokenBucket:
+    """Token bucket (rate <= 0 表示不限制)；acquire() 可以同時給多個執行緒呼叫"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.clock = clock
+        self.sleep = sleep
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        """調整速度 (已經累積的 token 不會超過新的 burst)"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.burst = burst if burst is not None else max(rate, 1.0)
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self) -> None:
+        now = self.clock()
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """取走 amount 個 token (不夠就先借)，回傳需要等待的秒數"""
+        with self._lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill()
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, amount: float) -> float:
+        """取走 amount 個 token，必要時睡到還清為止；回傳等待的秒數"""
+        delay = self.reserve(amount)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+
+class AdaptiveController:
+    """
+    依照來源磁碟的延遲調整速度倍率 factor (min_factor ~ 1.0)
+
+    延遲取指數移動平均 (EWMA)；沒有指定 target_latency 時，以看過最低的平均延遲 × slowdown 當作門檻。
+    每 interval 秒最多調整一次：超過門檻 factor 減半，低於門檻加回 step
+    """
+
+    def __init__(
+        self,
+        target_latency: Optional[float] = None,
+        slowdown: float = 3.0,
+        smoothing: float = 0.2,
+        warmup: int = 20,
+        min_factor: float = 0.1,
+        step: float = 0.1,
+        interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.target_latency = target_latency
+        self.slowdown = slowdown
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.min_factor = min_factor
+        self.step = step
+        self.interval = interval
+        self.clock = clock
+        self.factor = 1.0
+        self.latency: Optional[float] = None  # 目前的平均延遲
+        self.baseline: Optional[float] = None  # 看過最低的平均延遲
+        self.samples = 0
+        self.backoffs = 0  # 減速的次數
+        self._last_change = clock()
+
+    @property
+    def threshold(self) -> Optional[float]:
+        if self.target_latency is not None:
+            return self.target_latency
+        return None if self.baseline is None else self.baseline * self.slowdown
+
+    def observe(self, latency: float) -> bool:
+        """加入一次延遲的量測，回傳 factor 是否改變"""
+        self.samples += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        if self.samples < self.warmup:
+            return False
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+
+        now = self.clock()
+        if now - self._last_change < self.interval:
+            return False
+        if self.latency > self.threshold and self.factor > self.min_factor:
+            self.factor = max(self.min_factor, self.factor / 2)
+            self.backoffs += 1
+        elif self.latency <= self.threshold and self.factor < 1.0:
+            self.factor = min(1.0, self.factor + self.step)
+        else:
+            return False
+        self._last_change = now
+        return True
+
+
+class Throttle:
+    """
+    限制複製的 bytes/s 與 files/s (0 表示不限制)
+
+    wrap() 把 copy_function(src, dst) 包成限速的版本，每 chunk_size 就取得一次額度，
+    大文件不會先付清整個文件的額度再全速寫完：
+        - 有 throttled(throttle) 方法的複製函式 (zero_copy.ZeroCopier) 交給它自己分段：
+          copy_file_range / sendfile 每次只搬 chunk_size，zero-copy 不會被換成 Python 的讀寫
+        - 其他 (shutil.copy2) 改用 copy()：一塊一塊讀寫，只有讀取的時間算進來源延遲
+    自己讀寫資料的複製路徑 (parallel_copy、backup_manifest.copy_and_hash) 也是每一塊各自 acquire()
+    """
+
+    def __init__(
+        self,
+        bytes_per_second: float = 0,
+        files_per_second: float = 0,
+        adaptive: bool = False,
+        target_latency: Optional[float] = None,
+        chunk_size: int = MB,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.chunk_size = chunk_size
+        self.bytes_per_second = bytes_per_second
+        self.files_per_second = files_per_second
+        self.controller = AdaptiveController(target_latency, clock=clock) if adaptive else None
+        self.waited = 0.0  # 累計被限速等待的秒數
+        self._bytes = TokenBucket(bytes_per_second, clock=clock, sleep=sleep)
+        self._files = TokenBucket(files_per_second, clock=clock, sleep=sleep)
+        self._lock = threading.Lock()
+
+    @property
+    def factor(self) -> float:
+        """自適應模式目前的速度倍率 (沒有開啟時為 1.0)"""
+        return self.controller.factor if self.controller else 1.0
+
+    def set_limits(self, bytes_per_second: Optional[float] = None, files_per_second: Optional[float] = None) -> None:
+        """備份進行中調整速度上限 (None 表示不變)"""
+        with self._lock:
+            if bytes_per_second is not None:
+                self.bytes_per_second = bytes_per_second
+            if files_per_second is not None:
+                self.files_per_second = files_per_second
+            self._apply()
+
+    def _apply(self) -> None:
+        self._bytes.set_rate(self.bytes_per_second * self.factor)
+        self._files.set_rate(self.files_per_second * self.factor)
+
+    def acquire(self, nbytes: int = 0, files: int = 0) -> float:
+        """取得複製 nbytes bytes / files 個文件的額度，回傳等待的秒數"""
+        delay = 0.0
+        if files:
+            delay += self._files.acquire(files)
+        if nbytes:
+            delay += self._bytes.acquire(nbytes)
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+
+    def observe(self, latency: float) -> None:
+        """回報一次讀取來源的延遲 (自適應模式才有作用)"""
+        if self.controller is None:
+            return
+        with self._lock:
+            if self.controller.observe(latency):
+                self._apply()
+
+    def wrap(self, copy_function: Callable) -> Callable:
+        """包裝成限速的複製函式 (給 shutil.copytree(copy_function=...) 或 ParallelCopier 使用)"""
+        throttled = getattr(copy_function, "throttled", None)
+        if throttled is not None:
+            return throttled(self)
+        return self.copy
+
+    def copy(self, src, dst):
+        """和 shutil.copy2 一樣複製內容與屬性；每讀一塊就取得那一塊的額度 (寫入前先等待)"""
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        self.acquire(files=1)
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            while True:
+                started = time.perf_counter()
+                data = fsrc.read(self.chunk_size)
+                if not data:
+                    break
+                self.observe(time.perf_counter() - started)
+                self.acquire(nbytes=len(data))
+                fdst.write(data)
+        shutil.copystat(src, dst)
+        return dst
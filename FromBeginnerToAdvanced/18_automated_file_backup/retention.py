@@ -0,0 +1,269 @@
+"""
+快照保留策略 (Retention) 與背景清理
+
+每天的快照 (Backups/2026-01-29/、2026-01-29.tar.gz、去重複倉庫裡的 2026-01-29) 如果不清理會一直累積。
+RetentionPolicy 決定留下哪些，規則和 borg / restic 的 --keep-daily 等相同：
+
+    daily=7     最近 7 個「有快照的日子」各留一個
+    weekly=4    最近 4 個有快照的週 (ISO 週) 各留最新的一個
+    monthly=12  最近 12 個有快照的月份各留最新的一個
+
+三種規則留下的快照取聯集，最新的快照永遠保留。
+
+SnapshotPruner 在背景執行緒刪除其他快照，並限制每秒刪除的檔案數，
+避免大量 unlink 把磁碟 I/O 佔滿而拖慢正在進行的備份。
+資料夾會先改名成 .pruning-<日期> (瞬間完成，其他程式馬上看不到這個快照) 再慢慢刪除；
+中途停止的話，下一次清理會接著刪完。
+"""
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Set
+
+from backup_manifest import MANIFEST_SUFFIX
+from chunk_store import ChunkStore
+
+SNAPSHOT_NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})(\.tar\.gz|\.tar\.zst)?$")
+PRUNING_PREFIX = ".pruning-"
+
+
+class ILogger(Protocol):
+    """日誌介面 (和 18_automated_file_backup_4.ILogger 相同)"""
+
+    def debug(self, message: str, *args: Any) -> None: ...
+    def info(self, message: str, *args: Any) -> None: ...
+    def warning(self, message: str, *args: Any) -> None: ...
+    def error(self, message: str, *args: Any) -> None: ...
+
+
+# ===== 保留策略 =====
+@dataclass
+class RetentionPolicy:
+    """要保留幾個每日 / 每週 / 每月快照 (全部為 0 表示不清理)"""
+    daily: int = 7
+    weekly: int = 4
+    monthly: int = 12
+
+    @property
+    def enabled(self) -> bool:
+        return self.daily > 0 or self.weekly > 0 or self.monthly > 0
+
+    def select(self, dates: Iterable[date]) -> Set[date]:
+        """回傳要保留的日期"""
+        newest_first = sorted(set(dates), reverse=True)
+        if not newest_first:
+            return set()
+
+        keep = {newest_first[0]}
+        keep.update(newest_first[:self.daily])
+        for count, period in ((self.weekly, lambda d: d.isocalendar()[:2]), (self.monthly, lambda d: (d.year, d.month))):
+            seen = set()
+            for day in newest_first:
+                if len(seen) >= count:
+                    break
+                if period(day) not in seen:
+                    seen.add(period(day))
+                    keep.add(day)  # 這個週 / 月裡最新的快照
+        return keep
+
+
+def find_snapshots(root: Path) -> Dict[date, List[Path]]:
+    """列出 root 底下以日期命名的快照資料夾與壓縮封存 (同一天可能兩種都有)"""
+    snapshots: Dict[date, List[Path]] = {}
+    if not root.is_dir():
+        return snapshots
+    for path in root.iterdir():
+        match = SNAPSHOT_NAME.match(path.name)
+        if not match or (match.group(2) is None and not path.is_dir()):
+            continue
+        try:
+            day = date.fromisoformat(match.group(1))
+        except ValueError:
+            continue
+        snapshots.setdefault(day, []).append(path)
+    return snapshots
+
+
+# ===== 清理 =====
+@dataclass
+class PruneStats:
+    """一次清理的結果"""
+    snapshots: List[str] = field(default_factory=list)
+    files_deleted: int = 0
+    bytes_freed: int = 0  # 還有其他硬連結的檔案不算 (空間沒有真的釋放)
+    duration: float = 0.0
+
+
+class SnapshotPruner:
+    """
+    依照保留策略刪除舊快照
+
+    max_files_per_second 限制刪除速度 (0 表示不限制)；chunk_store 不是 None 時，
+    倉庫裡的快照也套用同樣的策略，刪完之後執行 gc 釋放沒有被引用的區塊
+    """
+
+    def __init__(
+        self,
+        logger: ILogger,
+        policy: RetentionPolicy,
+        max_files_per_second: float = 500.0,
+        chunk_store: Optional[ChunkStore] = None,
+    ):
+        self.logger = logger
+        self.policy = policy
+        self.max_files_per_second = max_files_per_second
+        self.chunk_store = chunk_store
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.last_stats: Optional[PruneStats] = None
+
+    def plan(self, root: Path) -> List[Path]:
+        """列出 root 底下要刪除的快照 (不會真的刪除)"""
+        snapshots = find_snapshots(root)
+        keep = self.policy.select(snapshots)
+        return sorted(path for day, paths in snapshots.items() if day not in keep for path in paths)
+
+    def start(self, root: Path) -> bool:
+        """在背景執行緒清理；上一次清理還沒結束時不會重複開始 (回傳 False)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self.logger.debug("上一次清理還在進行，這次略過")
+                return False
+            self._thread = threading.Thread(target=self._run, args=(Path(root),), name="snapshot-pruner", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, root: Path) -> None:
+        try:
+            self.last_stats = self.prune(root)
+        except Exception as e:
+            self.logger.error("清理舊快照失敗: %s", e)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """等待背景清理結束"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stop(self) -> None:
+        """中止背景清理 (已經改名的資料夾下一次清理會接著刪)"""
+        self._stop.set()
+        self.join()
+        self._stop.clear()
+
+    def prune(self, root: Path) -> PruneStats:
+        """依照保留策略刪除舊快照 (在呼叫的執行緒裡執行)"""
+        started = time.perf_counter()
+        stats = PruneStats()
+        if not self.policy.enabled:
+            return stats
+        root = Path(root)
+        pacer = _Pacer(self.max_files_per_second, self._stop)
+
+        for path in self.plan(root):
+            if self._stop.is_set():
+                break
+            stats.snapshots.append(path.name)
+            if path.is_dir():
+                # 先改名：快照立刻消失，刪到一半停止也不會留下看起來完整的快照
+                try:
+                    os.replace(path, path.with_name(PRUNING_PREFIX + path.name))
+                except OSError as e:
+                    self.logger.warning("無法移除快照 %s: %s", path, e)
+                    continue
+                path.with_name(path.name + MANIFEST_SUFFIX).unlink(missing_ok=True)
+            else:
+                self._delete_file(path, stats)
+                pacer.wait(1)
+
+        if self.chunk_store is not None and not self._stop.is_set():
+            self._prune_store(stats, pacer)
+
+        # 這一次改名的和之前沒刪完的一起刪
+        for pending in sorted(root.glob(PRUNING_PREFIX + "*")):
+            if not self._stop.is_set():
+                self._delete_tree(pending, pacer, stats)
+
+        stats.duration = time.perf_counter() - started
+        if stats.snapshots or stats.files_deleted:
+            self.logger.info(
+                "清理舊快照: %s 個 (%s)，刪除 %s 個文件，釋放 %s bytes，耗時 %.2f 秒",
+                len(stats.snapshots),
+                ', '.join(stats.snapshots),
+                stats.files_deleted,
+                format(stats.bytes_freed, ","),
+                stats.duration
+            )
+        return stats
+
+    def _prune_store(self, stats: PruneStats, pacer: "_Pacer") -> None:
+        names = {}
+        for name in self.chunk_store.list_snapshots():
+            try:
+                names[date.fromisoformat(name)] = name
+            except ValueError:
+                continue  # 不是日期命名的快照 (手動建立的) 不處理
+        keep = self.policy.select(names)
+        for day, name in sorted(names.items()):
+            if day not in keep:
+                self.chunk_store.delete_snapshot(name)
+                stats.snapshots.append(f"store/{name}")
+        removed, freed = self.chunk_store.gc(pace=pacer.wait)  # 刪區塊也受速度限制
+        stats.files_deleted += removed
+        stats.bytes_freed += freed
+
+    def _delete_tree(self, top: Path, pacer: "_Pacer", stats: PruneStats) -> None:
+        """由下往上刪除，每刪一個檔案都受速度限制"""
+        for dirpath, dirnames, filenames in os.walk(top, topdown=False):
+            for name in filenames:
+                if not pacer.wait(1):
+                    return
+                self._delete_file(Path(dirpath) / name, stats)
+            for name in dirnames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.islink(path):
+                        os.unlink(path)  # 指向資料夾的符號連結只刪連結本身
+                    else:
+                        os.rmdir(path)
+                except OSError:
+                    pass  # 符號連結或沒刪乾淨的資料夾，下一次再處理
+        try:
+            os.rmdir(top)
+        except OSError as e:
+            self.logger.warning("無法刪除 %s: %s", top, e)
+
+    def _delete_file(self, path: Path, stats: PruneStats) -> None:
+        try:
+            info = path.lstat()
+            path.unlink()
+        except OSError as e:
+            self.logger.warning("無法刪除 %s: %s", path, e)
+            return
+        stats.files_deleted += 1
+        if info.st_nlink == 1:
+            stats.bytes_freed += info.st_size
+
+
+class _Pacer:
+    """把操作速度限制在每秒 rate 次 (累積到一定量才睡一次，不會每個檔案都 sleep)"""
+
+    def __init__(self, rate: float, stop: threading.Event):
+        self.rate = rate
+        self.stop = stop
+        self.started = time.monotonic()
+        self.count = 0
+
+    def wait(self, ops: int) -> bool:
+        """記錄 ops 次操作，超過速度就等待；被中止時回傳 False"""
+        self.count += ops
+        if self.rate > 0:
+            delay = self.started + self.count / self.rate - time.monotonic()
+            if delay > 0.01:
+                self.stop.wait(delay)
+        return not self.stop.is_set()
@@ -0,0 +1,85 @@
+"""
+單次走訪的目錄掃描 (os.scandir)
+
+原本備份一次要走訪整棵目錄樹好幾次：
+get_directory_size、count_files (來源)、驗證時再 count_files (來源 + 備份)，
+每次都是 rglob('*') + 每個項目一次 stat()。
+
+scan_tree 只走訪一次，回傳可以重複使用的 TreeSummary：
+檔案數、總大小、每個檔案的 metadata (大小、mtime_ns、inode)、子資料夾列表。
+os.scandir 的 DirEntry 已經帶著檔案類型 (is_dir / is_file 不需要額外的系統呼叫)，
+檔案需要 stat() 一次，資料夾也 stat() 一次 (用來偵測符號連結形成的迴圈)。
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+
+@dataclass
+class FileInfo:
+    """單一檔案的 metadata"""
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+@dataclass
+class TreeSummary:
+    """一次掃描的結果 (key 是相對路徑，使用 "/" 分隔)"""
+    root: Path
+    files: Dict[str, FileInfo] = field(default_factory=dict)
+    dirs: List[str] = field(default_factory=list)  # 所有子資料夾 (父資料夾在前)
+    errors: List[str] = field(default_factory=list)  # 讀不到的項目
+
+    @property
+    def file_count(self) -> int:
+        return len(self.files)
+
+    @property
+    def total_size(self) -> int:
+        return sum(info.size for info in self.files.values())
+
+
+def scan_tree(root: Path) -> TreeSummary:
+    """
+    走訪 root 底下所有檔案一次
+
+    和 shutil.copytree (symlinks=False) 一樣跟隨符號連結：指向資料夾的連結當成一般資料夾走訪，
+    檔案的連結記錄目標檔案的大小，備份裡會是真正的資料夾 / 檔案，掃描結果和複製結果的檔案數一致。
+    指向自己上層資料夾的連結 (迴圈) 不走訪，記在 errors；讀取失敗的項目也記在 errors，不會中斷整個掃描
+    """
+    root = Path(root)
+    summary = TreeSummary(root=root)
+    try:
+        root_stat = os.stat(root)
+        ancestors = frozenset([(root_stat.st_dev, root_stat.st_ino)])
+    except OSError:
+        ancestors = frozenset()
+    stack = [("", os.fspath(root), ancestors)]
+
+    while stack:
+        rel_dir, abs_dir, ancestors = stack.pop()
+        try:
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        if entry.is_dir():
+                            stat = entry.stat()
+                            key = (stat.st_dev, stat.st_ino)
+                            if key in ancestors:
+                                summary.errors.append(f"{rel_path}: 符號連結指向上層資料夾 (迴圈)，略過")
+                                continue
+                            summary.dirs.append(rel_path)
+                            stack.append((rel_path, entry.path, ancestors | {key}))
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            summary.files[rel_path] = FileInfo(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+                    except OSError as e:
+                        summary.errors.append(f"{rel_path}: {e}")
+        except OSError as e:
+            summary.errors.append(f"{rel_dir or '.'}: {e}")
+
+    summary.dirs.sort()  # 排序後父資料夾一定在子資料夾前面
+    return summary
@@ -0,0 +1,179 @@
+"""
+零複製 (Zero-copy) 檔案傳輸
+
+一般的複製是 read() 到 Python 的 bytes，再 write() 出去：資料在核心與使用者空間之間來回兩次。
+這裡改用核心直接搬資料，bytes 完全不經過 Python 的緩衝區，依序嘗試：
+
+    1. FICLONE (reflink)    btrfs / XFS 等支援 CoW 的檔案系統：只複製 metadata，瞬間完成且不佔空間
+    2. os.copy_file_range   Linux 4.5+：在核心裡複製，NFS / SMB 可以在伺服器端完成
+    3. os.sendfile          核心裡從檔案搬到檔案 (Linux 2.6.33+)
+    4. shutil.copyfileobj   最後的退路 (一般的 read / write)
+
+某一種方法失敗 (跨檔案系統、不支援) 就換下一種；寫到一半失敗時會把目標檔截斷重來，不會留下半個檔案。
+
+限速 (rate_limiter.Throttle) 時每次只搬 throttle.chunk_size，每一段之前各自取得額度；
+reflink 不搬資料，只算一個檔案的額度。
+"""
+import errno
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from rate_limiter import Throttle
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+PathLike = Union[str, Path]
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+METHODS = ("reflink", "copy_file_range", "sendfile", "copyfileobj")
+CHUNK_SIZE = 64 * 1024 * 1024  # copy_file_range / sendfile 每次最多搬 64MB
+
+# 這些錯誤代表「這個方法在這裡不能用」，換下一個方法就好；其他錯誤 (例如磁碟滿了) 直接拋出
+_UNSUPPORTED = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EPERM,
+}
+
+# (方法, 來源裝置, 目標裝置)：已經知道不能用的組合，之後的檔案直接跳過，不用每個檔案都失敗一次
+_unsupported = set()
+
+
+def _sliced(move: Callable[[int, int], int], size: int, throttle: Optional[Throttle]) -> None:
+    """
+    分段搬資料：move(offset, count) 搬一段並回傳實際搬了幾 bytes
+
+    限速時每段 throttle.chunk_size，搬之前先取得額度；核心一次完成讀和寫，
+    所以回報給自適應限速的延遲是整段的時間
+    """
+    step = throttle.chunk_size if throttle is not None else CHUNK_SIZE
+    offset = 0
+    while offset < size:
+        count = min(step, size - offset)
+        if throttle is not None:
+            throttle.acquire(nbytes=count)
+        started = time.perf_counter()
+        sent = move(offset, count)
+        if throttle is not None:
+            throttle.observe(time.perf_counter() - started)
+        if sent == 0:
+            break  # 來源檔案變短了
+        offset += sent
+
+
+def _reflink(src_fd: int, dst_fd: int, size: int, throttle: Optional[Throttle] = None) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "不支援 ioctl")
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int, throttle: Optional[Throttle] = None) -> None:
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "不支援 copy_file_range")
+    _sliced(lambda offset, count: os.copy_file_range(src_fd, dst_fd, count), size, throttle)
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int, throttle: Optional[Throttle] = None) -> None:
+    if not hasattr(os, "sendfile"):
+        raise OSError(errno.ENOSYS, "不支援 sendfile")
+    _sliced(lambda offset, count: os.sendfile(dst_fd, src_fd, offset, count), size, throttle)
+
+
+def _copyfileobj(src_fd: int, dst_fd: int, size: int, throttle: Optional[Throttle] = None) -> None:
+    step = throttle.chunk_size if throttle is not None else 1024 * 1024
+    with open(src_fd, "rb", closefd=False) as src, open(dst_fd, "wb", closefd=False) as dst:
+        while True:
+            started = time.perf_counter()
+            data = src.read(step)
+            if not data:
+                break
+            if throttle is not None:
+                throttle.observe(time.perf_counter() - started)
+                throttle.acquire(nbytes=len(data))
+            dst.write(data)
+
+
+_BACKENDS = {
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _sendfile,
+    "copyfileobj": _copyfileobj,
+}
+
+
+def copy_file(src: PathLike, dst: PathLike, method: str = "auto", throttle: Optional[Throttle] = None) -> str:
+    """
+    複製檔案內容 (不含 metadata)，回傳實際使用的方法
+
+    method="auto" 依照 METHODS 的順序嘗試；指定某一個方法時只用那一種 (給 benchmark 用)
+    throttle 不是 None 時先取得一個檔案的額度，之後每一段資料各自取得額度
+    """
+    if method != "auto" and method not in _BACKENDS:
+        raise ValueError(f"未知的複製方法: {method}，可用: {['auto', *METHODS]}")
+    candidates = METHODS if method == "auto" else (method,)
+    if throttle is not None:
+        throttle.acquire(files=1)
+
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        src_stat = os.fstat(src_fd)
+        size = src_stat.st_size
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            devices = (src_stat.st_dev, os.fstat(dst_fd).st_dev)
+            if method == "auto":
+                candidates = [name for name in candidates if (name, *devices) not in _unsupported]
+            for name in candidates:
+                try:
+                    _BACKENDS[name](src_fd, dst_fd, size, throttle)
+                    return name
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED or name == candidates[-1]:
+                        raise
+                    _unsupported.add((name, *devices))
+                    # 換下一個方法之前把目標檔和讀取位置都還原
+                    os.ftruncate(dst_fd, 0)
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+                    os.lseek(src_fd, 0, os.SEEK_SET)
+            raise AssertionError("unreachable")
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+class ZeroCopier:
+    """
+    可以當作 shutil.copytree(copy_function=...) 使用的 copy2 替代品
+
+    和 shutil.copy2 一樣會保留修改時間等屬性；methods 統計每種方法用了幾次
+    (可以同時給多個執行緒使用，例如 ParallelCopier 的 copy_function)
+    throttle 不是 None 時分段限速 (通常由 Throttle.wrap() 呼叫 throttled() 建立)
+    """
+
+    def __init__(self, method: str = "auto", throttle: Optional[Throttle] = None):
+        self.method = method
+        self.throttle = throttle
+        self.methods: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def throttled(self, throttle: Throttle) -> "ZeroCopier":
+        """同一個複製器的限速版本 (methods 統計共用)"""
+        copier = ZeroCopier(self.method, throttle)
+        copier.methods, copier._lock = self.methods, self._lock
+        return copier
+
+    def __call__(self, src: PathLike, dst: PathLike) -> PathLike:
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        used = copy_file(src, dst, self.method, self.throttle)
+        with self._lock:
+            self.methods[used] += 1
+        shutil.copystat(src, dst)
+        return dst
@@ -0,0 +1,1365 @@
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKUP_DIR = Path(__file__).resolve().parent.parent / "18_automated_file_backup"
+sys.path.insert(0, str(BACKUP_DIR))
+
+from archive_writer import ParallelGzipWriter, create_archive, list_archive  # noqa: E402
+from backup_journal import BackupJournal, journal_path, partial_path  # noqa: E402
+from backup_manifest import IncrementalCopier, Manifest, manifest_path  # noqa: E402
+from backup_metrics import RunMetrics, SlowFile  # noqa: E402
+from chunk_store import ChunkStore, main as chunk_store_main  # noqa: E402
+from event_scheduler import CronExpression, EventScheduler  # noqa: E402
+from file_hashing import file_digest, hash_many  # noqa: E402
+from file_watcher import DebouncedQueue, InotifyWatcher, collapse_paths, sync_paths  # noqa: E402
+from parallel_copy import ParallelCopier  # noqa: E402
+from rate_limiter import AdaptiveController, Throttle, TokenBucket  # noqa: E402
+from retention import RetentionPolicy, SnapshotPruner  # noqa: E402
+from tree_scan import scan_tree  # noqa: E402
+from zero_copy import METHODS, ZeroCopier, copy_file  # noqa: E402
+
+
+def _load_backup_module():
+    """18_automated_file_backup_4.py 的檔名以數字開頭，只能用 importlib 載入"""
+    spec = importlib.util.spec_from_file_location("automated_backup", BACKUP_DIR / "18_automated_file_backup_4.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+backup_app = _load_backup_module()
+
+
+class ListLogger:
+    """把訊息收集在 list 裡的 logger (%-style 參數先格式化好)"""
+
+    def __init__(self):
+        self.messages = []
+
+    def _log(self, level, message, args):
+        self.messages.append((level, message % args if args else message))
+
+    def debug(self, message, *args):
+        self._log("DEBUG", message, args)
+
+    def info(self, message, *args):
+        self._log("INFO", message, args)
+
+    def warning(self, message, *args):
+        self._log("WARNING", message, args)
+
+    def error(self, message, *args):
+        self._log("ERROR", message, args)
+
+    def critical(self, message, *args):
+        self._log("CRITICAL", message, args)
+
+
+def _make_tree(root: Path) -> None:
+    (root / "sub").mkdir(parents=True)
+    (root / "a.txt").write_text("alpha")
+    (root / "sub" / "b.txt").write_text("bravo")
+    (root / "sub" / "c.bin").write_bytes(os.urandom(4096))
+
+
+def _make_service(tmp_path, file_ops=None, chunk_store=None, pruner=None, throttle=None, **config):
+    logger = ListLogger()
+    config = backup_app.BackupConfiguration(tmp_path / "src", tmp_path / "dst", **config)
+    file_ops = file_ops or backup_app.FileOperations(logger)
+    return backup_app.AutomatedBackupService(
+        config,
+        logger,
+        file_ops,
+        EventScheduler(logger),
+        backup_app.BackupValidator(logger, file_ops),
+        IncrementalCopier(logger, throttle) if config.incremental else None,
+        chunk_store,
+        pruner,
+        throttle,
+    )
+
+
+# ===== 增量備份 =====
+def test_incremental_copy_links_unchanged_files(tmp_path):
+    source = tmp_path / "src"
+    _make_tree(source)
+    copier = IncrementalCopier(ListLogger())
+
+    first, stats = copier.copy(source, tmp_path / "dst" / "2026-01-01")
+    assert stats.files_copied == 3 and stats.files_linked == 0
+    assert manifest_path(tmp_path / "dst" / "2026-01-01").exists()
+
+    (source / "a.txt").write_text("alpha, modified")
+    (source / "new.txt").write_text("new")
+    previous = copier.find_previous_snapshot(tmp_path / "dst", tmp_path / "dst" / "2026-01-02")
+    second, stats = copier.copy(source, tmp_path / "dst" / "2026-01-02", previous)
+
+    assert stats.files_copied == 2 and stats.files_linked == 2
+    old_b = tmp_path / "dst" / "2026-01-01" / "sub" / "b.txt"
+    new_b = tmp_path / "dst" / "2026-01-02" / "sub" / "b.txt"
+    assert os.path.samefile(old_b, new_b)
+    assert (tmp_path / "dst" / "2026-01-02" / "a.txt").read_text() == "alpha, modified"
+    assert second.entries["sub/b.txt"].digest == first.entries["sub/b.txt"].digest
+    assert second.entries["a.txt"].digest != first.entries["a.txt"].digest
+    assert Manifest.load(manifest_path(tmp_path / "dst" / "2026-01-02")).entries.keys() == second.entries.keys()
+
+
+def test_service_incremental_backup(tmp_path):
+    _make_tree(tmp_path / "src")
+    IncrementalCopier(ListLogger()).copy(tmp_path / "src", tmp_path / "dst" / "2000-01-01")
+
+    result = _make_service(tmp_path, incremental=True).backup()
+
+    assert result.success
+    assert result.files_linked == 3 and result.files_copied == 0
+    assert result.file_count == 3
+
+
+def test_service_full_backup_by_default(tmp_path):
+    _make_tree(tmp_path / "src")
+    result = _make_service(tmp_path).backup()
+    assert result.success
+    assert result.files_linked is None
+    assert (result.destination_path / "sub" / "b.txt").read_text() == "bravo"
+
+
+def test_missing_source_fails(tmp_path):
+    result = _make_service(tmp_path).backup()
+    assert not result.success
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_backup_twice_same_day_overwrites(tmp_path, incremental):
+    """同一天備份兩次，快照是第二次的內容"""
+    _make_tree(tmp_path / "src")
+    service = _make_service(tmp_path, incremental=incremental)
+    assert service.backup().success
+    (tmp_path / "src" / "a.txt").write_text("changed")
+    result = service.backup()
+    assert result.success
+    assert (result.destination_path / "a.txt").read_text() == "changed"
+
+
+# ===== 單次掃描 =====
+def test_scan_tree_summary(tmp_path):
+    _make_tree(tmp_path / "src")
+    (tmp_path / "src" / "empty").mkdir()
+    summary = scan_tree(tmp_path / "src")
+
+    assert summary.file_count == 3
+    assert summary.total_size == 5 + 5 + 4096
+    assert set(summary.files) == {"a.txt", "sub/b.txt", "sub/c.bin"}
+    assert summary.dirs == ["empty", "sub"]
+    assert summary.files["a.txt"].inode == (tmp_path / "src" / "a.txt").stat().st_ino
+    assert not summary.errors
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_backup_scans_each_tree_once(tmp_path, incremental):
+    _make_tree(tmp_path / "src")
+    service = _make_service(tmp_path, incremental=incremental)
+    scanned = []
+    original_scan = service.file_ops.scan
+    service.file_ops.scan = lambda path: scanned.append(path) or original_scan(path)
+
+    result = service.backup()
+
+    assert result.success
+    assert scanned == [tmp_path / "src", partial_path(result.destination_path)]  # 驗證在改名公開之前
+
+
+def test_scan_tree_follows_directory_symlinks_but_not_loops(tmp_path):
+    """指向資料夾的符號連結當成資料夾走訪，指回上層的連結 (迴圈) 略過"""
+    (tmp_path / "src" / "real").mkdir(parents=True)
+    (tmp_path / "src" / "real" / "a.txt").write_text("alpha")
+    (tmp_path / "src" / "link").symlink_to("real")
+    (tmp_path / "src" / "real" / "loop").symlink_to("..")
+
+    summary = scan_tree(tmp_path / "src")
+
+    assert set(summary.files) == {"real/a.txt", "link/a.txt"}
+    assert summary.dirs == ["link", "real"]
+    assert len(summary.errors) == 2 and all("loop" in error for error in summary.errors)
+
+
+@pytest.mark.parametrize("mode", ["copytree", "parallel", "incremental", "archive"])
+def test_backup_with_directory_symlink_validates(tmp_path, mode):
+    """來源裡有指向資料夾的符號連結時，掃描和複製的檔案數一致，備份可以通過驗證並公開"""
+    (tmp_path / "src" / "real").mkdir(parents=True)
+    (tmp_path / "src" / "real" / "a.txt").write_text("alpha")
+    (tmp_path / "src" / "link").symlink_to("real", target_is_directory=True)
+    config = {"incremental": mode == "incremental"}
+    if mode == "archive":
+        config["output_format"] = "tar.gz"
+    file_ops = backup_app.ParallelFileOperations(ListLogger(), ParallelCopier(workers=2)) if mode == "parallel" else None
+
+    result = _make_service(tmp_path, file_ops=file_ops, **config).backup()
+
+    assert result.success and result.file_count == 2
+    if mode == "archive":
+        assert sorted(list_archive(result.destination_path)) == ["link/a.txt", "real/a.txt"]
+    else:
+        assert (result.destination_path / "link" / "a.txt").read_text() == "alpha"
+        assert not (result.destination_path / "link").is_symlink()
+
+
+def test_validator_reports_missing_file(tmp_path):
+    _make_tree(tmp_path / "src")
+    _make_tree(tmp_path / "copy")
+    (tmp_path / "copy" / "sub" / "b.txt").unlink()
+    (tmp_path / "copy" / "extra.txt").write_text("extra")
+    logger = ListLogger()
+    validator = backup_app.BackupValidator(logger, backup_app.FileOperations(logger))
+
+    assert not validator.validate(tmp_path / "src", tmp_path / "copy")
+    assert any("sub/b.txt" in message for level, message in logger.messages if level == "ERROR")
+
+
+# ===== 多執行緒複製 =====
+def test_parallel_copier_batches_and_chunks(tmp_path):
+    source = tmp_path / "src"
+    _make_tree(source)
+    for i in range(20):
+        (source / "sub" / f"small_{i}.txt").write_text(f"file {i}")
+    big = os.urandom(100_000)
+    (source / "big.bin").write_bytes(big)
+    (source / "empty").mkdir()
+
+    copier = ParallelCopier(workers=4, chunk_size=16_384, large_file_threshold=50_000, batch_files=8)
+    stats = copier.copy_tree(source, tmp_path / "dst")
+
+    assert stats.files == 24
+    assert stats.chunks == 7  # 100_000 / 16_384 無條件進位
+    assert stats.batches == 3  # 23 個小文件，每批 8 個
+    assert (tmp_path / "dst" / "big.bin").read_bytes() == big
+    assert (tmp_path / "dst" / "sub" / "small_7.txt").read_text() == "file 7"
+    assert (tmp_path / "dst" / "empty").is_dir()
+    assert (tmp_path / "dst" / "big.bin").stat().st_mtime_ns == (source / "big.bin").stat().st_mtime_ns
+
+
+def test_service_with_parallel_file_operations(tmp_path):
+    _make_tree(tmp_path / "src")
+    file_ops = backup_app.ParallelFileOperations(ListLogger(), ParallelCopier(workers=2))
+    result = _make_service(tmp_path, file_ops=file_ops).backup()
+
+    assert result.success
+    assert (result.destination_path / "sub" / "c.bin").read_bytes() == (tmp_path / "src" / "sub" / "c.bin").read_bytes()
+    assert result.bytes_per_second > 0 and result.files_per_second > 0
+
+
+# ===== 零複製 =====
+@pytest.mark.parametrize("method", ["auto", *METHODS])
+def test_zero_copy_methods_copy_content(tmp_path, method):
+    data = os.urandom(300_000)
+    (tmp_path / "src.bin").write_bytes(data)
+    (tmp_path / "dst.bin").write_bytes(b"old content that is longer" * 20_000)
+    try:
+        used = copy_file(tmp_path / "src.bin", tmp_path / "dst.bin", method)
+    except OSError:
+        pytest.skip(f"{method} 在這個檔案系統上不支援")
+    assert used in METHODS
+    assert (tmp_path / "dst.bin").read_bytes() == data
+
+
+def test_zero_copy_file_operations_backup(tmp_path):
+    _make_tree(tmp_path / "src")
+    copier = ZeroCopier()
+    file_ops = backup_app.ZeroCopyFileOperations(ListLogger(), copier)
+    result = _make_service(tmp_path, file_ops=file_ops).backup()
+
+    assert result.success
+    assert sum(copier.methods.values()) == 3
+    copied = result.destination_path / "sub" / "c.bin"
+    assert copied.read_bytes() == (tmp_path / "src" / "sub" / "c.bin").read_bytes()
+    assert copied.stat().st_mtime_ns == (tmp_path / "src" / "sub" / "c.bin").stat().st_mtime_ns
+
+
+def test_unknown_copy_method_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        backup_app.BackupConfiguration(tmp_path, tmp_path, copy_method="rsync")
+
+
+# ===== 去重複倉庫 =====
+def _small_store(root):
+    return ChunkStore(root, min_size=256, avg_size=1024, max_size=4096)
+
+
+def test_chunk_store_deduplicates_and_restores(tmp_path):
+    source = tmp_path / "src"
+    _make_tree(source)
+    big = os.urandom(50_000)
+    (source / "big.bin").write_bytes(big)
+    store = _small_store(tmp_path / "store")
+
+    _, first = store.backup(source, "day1")
+    assert first.new_bytes == first.bytes
+
+    # 在大檔案中間插入資料：只有附近的區塊會改變
+    (source / "big.bin").write_bytes(big[:20_000] + b"inserted" + big[20_000:])
+    _, second = store.backup(source, "day2")
+    assert second.new_bytes < 10_000
+    assert store.list_snapshots() == ["day1", "day2"]
+
+    store.restore("day1", tmp_path / "restore1")
+    store.restore("day2", tmp_path / "restore2")
+    assert (tmp_path / "restore1" / "big.bin").read_bytes() == big
+    assert (tmp_path / "restore2" / "big.bin").read_bytes() == (source / "big.bin").read_bytes()
+    assert (tmp_path / "restore2" / "sub" / "b.txt").read_text() == "bravo"
+    assert (tmp_path / "restore2" / "a.txt").stat().st_mtime_ns == (source / "a.txt").stat().st_mtime_ns
+
+
+def test_chunk_store_gc_removes_unreferenced_chunks(tmp_path):
+    source = tmp_path / "src"
+    _make_tree(source)
+    store = _small_store(tmp_path / "store")
+    store.backup(source, "day1")
+    (source / "sub" / "c.bin").write_bytes(os.urandom(4096))
+    store.backup(source, "day2")
+
+    assert store.gc(min_age=0) == (0, 0)
+    store.delete_snapshot("day1")
+    removed, freed = store.gc(min_age=0)
+    assert removed > 0 and freed >= 4096
+    store.restore("day2", tmp_path / "restore")
+    assert (tmp_path / "restore" / "sub" / "c.bin").read_bytes() == (source / "sub" / "c.bin").read_bytes()
+
+
+def test_chunk_store_gc_is_paced_locked_and_skips_recent_files(tmp_path):
+    """測試 gc 受限速控制、不刪最近寫入的區塊與 .tmp，而且會等進行中的備份釋放鎖"""
+    import threading
+
+    _make_tree(tmp_path / "src")
+    store = _small_store(tmp_path / "store")
+    store.backup(tmp_path / "src", "day1")
+    store.delete_snapshot("day1")
+    in_flight = store.chunks_dir / "ab" / "abcd.123.tmp"
+    in_flight.parent.mkdir(exist_ok=True)
+    in_flight.write_bytes(b"partial")
+
+    assert store.gc() == (0, 0)  # 全部都是剛寫入的
+    calls = []
+    removed, _ = store.gc(min_age=0, pace=lambda ops: calls.append(ops) or len(calls) < 3)
+    assert removed == 2 and len(calls) == 3  # 第三次被中止
+
+    with store.lock():
+        runner = threading.Thread(target=store.gc, kwargs={"min_age": 0})
+        runner.start()
+        runner.join(0.2)
+        assert runner.is_alive()  # 備份持有共用鎖時 gc 等待
+    runner.join(5)
+    assert not runner.is_alive() and not any(store.chunks_dir.glob("*/*"))
+
+
+def test_chunk_store_gc_releases_lock_while_pacing(tmp_path):
+    """gc 限速等待時不持有鎖，期間開始的備份可以進行，沿用的區塊不會被刪掉"""
+    import threading
+
+    _make_tree(tmp_path / "src")
+    store = _small_store(tmp_path / "store")
+    store.backup(tmp_path / "src", "day1")
+    store.delete_snapshot("day1")
+    backups = []
+
+    def pace(ops):
+        if not backups:
+            runner = threading.Thread(target=lambda: backups.append(store.backup(tmp_path / "src", "day2")))
+            runner.start()
+            runner.join(5)
+            assert not runner.is_alive()  # gc 等待時備份拿得到共用鎖
+        return True
+
+    assert store.gc(min_age=0, pace=pace) == (0, 0)  # 全部都被 day2 沿用了
+    store.restore("day2", tmp_path / "out")
+    assert (tmp_path / "out" / "sub" / "c.bin").read_bytes() == (tmp_path / "src" / "sub" / "c.bin").read_bytes()
+
+
+def test_chunk_store_cli_restore(tmp_path, capsys):
+    _make_tree(tmp_path / "src")
+    _small_store(tmp_path / "store").backup(tmp_path / "src", "day1")
+    assert chunk_store_main([str(tmp_path / "store"), "restore", "day1", str(tmp_path / "out")]) == 0
+    assert (tmp_path / "out" / "a.txt").read_text() == "alpha"
+    assert chunk_store_main([str(tmp_path / "store"), "restore", "day1", str(tmp_path / "out")]) == 1
+
+
+def test_service_deduplicated_backup(tmp_path):
+    _make_tree(tmp_path / "src")
+    store = _small_store(tmp_path / "dst" / "store")
+    service = _make_service(tmp_path, chunk_store=store, deduplicate=True)
+
+    first = service.backup()
+    second = service.backup()
+
+    assert first.success and second.success
+    assert first.bytes_stored == first.total_size
+    assert second.bytes_stored == 0
+    assert second.destination_path == store.snapshot_path(str(backup_app.datetime.date.today()))
+    assert not any(p.is_dir() and p.name != "store" for p in (tmp_path / "dst").iterdir())
+
+
+# ===== 雜湊驗證 =====
+def _corrupt(path: Path) -> None:
+    """同樣大小、不同內容 (只比對文件數量時抓不到)"""
+    data = bytearray(path.read_bytes())
+    data[0] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+def test_hash_many_matches_serial_digest(tmp_path):
+    _make_tree(tmp_path)
+    files = [tmp_path / "a.txt", tmp_path / "sub" / "b.txt", tmp_path / "sub" / "c.bin", tmp_path / "missing"]
+    digests, errors = hash_many([(path, "blake2b") for path in files], workers=2)
+    assert digests[str(files[2])] == file_digest(files[2])
+    assert list(errors) == [str(files[3])]
+
+
+def test_hash_validator_detects_corruption(tmp_path):
+    _make_tree(tmp_path / "src")
+    _make_tree(tmp_path / "copy")
+    (tmp_path / "copy" / "sub" / "c.bin").write_bytes((tmp_path / "src" / "sub" / "c.bin").read_bytes())
+    logger = ListLogger()
+    file_ops = backup_app.FileOperations(logger)
+
+    assert backup_app.HashBackupValidator(logger, file_ops, workers=1).validate(tmp_path / "src", tmp_path / "copy")
+    _corrupt(tmp_path / "copy" / "sub" / "b.txt")
+    assert backup_app.BackupValidator(logger, file_ops).validate(tmp_path / "src", tmp_path / "copy")
+    assert not backup_app.HashBackupValidator(logger, file_ops, workers=1).validate(tmp_path / "src", tmp_path / "copy")
+
+
+def test_hash_validator_reuses_copy_digests(tmp_path):
+    _make_tree(tmp_path / "src")
+    service = _make_service(tmp_path, incremental=True)
+    service.validator = backup_app.HashBackupValidator(service.logger, service.file_ops, workers=1)
+
+    assert service.backup().success
+    assert ("INFO", "開始雜湊驗證: 3 個文件 (沿用複製時的雜湊: 3 個)") in service.logger.messages
+
+
+def test_hash_validator_sample_mode(tmp_path):
+    _make_tree(tmp_path / "src")
+    _make_tree(tmp_path / "copy")
+    for i in range(20):
+        (tmp_path / "src" / f"f{i}.txt").write_text(str(i))
+        (tmp_path / "copy" / f"f{i}.txt").write_text(str(i))
+    logger = ListLogger()
+    validator = backup_app.HashBackupValidator(
+        logger, backup_app.FileOperations(logger), workers=1, sample_ratio=0.25, seed=1
+    )
+    assert validator.validate(tmp_path / "src", tmp_path / "copy")
+    assert ("INFO", "開始雜湊驗證: 6 個文件 (沿用複製時的雜湊: 0 個)") in logger.messages
+
+
+# ===== 壓縮封存 =====
+def test_parallel_gzip_writer_multi_member(tmp_path):
+    import gzip
+
+    data = os.urandom(5000) * 40
+    with open(tmp_path / "out.gz", "wb") as raw, ParallelGzipWriter(raw, workers=3, block_size=16_384) as writer:
+        for i in range(0, len(data), 7000):
+            writer.write(data[i:i + 7000])
+    assert gzip.decompress((tmp_path / "out.gz").read_bytes()) == data
+
+
+@pytest.mark.parametrize("fmt", ["tar.gz", "tar.zst"])
+def test_create_archive_round_trip(tmp_path, fmt):
+    import tarfile
+
+    if fmt == "tar.zst":
+        pytest.importorskip("zstandard")
+    _make_tree(tmp_path / "src")
+    (tmp_path / "src" / "text.txt").write_text("backup " * 50_000)
+    stats = create_archive(tmp_path / "src", tmp_path / f"out.{fmt}", fmt, workers=2)
+
+    assert stats.files == 4
+    assert stats.bytes_out < stats.bytes_in
+    assert sorted(list_archive(tmp_path / f"out.{fmt}")) == ["a.txt", "sub/b.txt", "sub/c.bin", "text.txt"]
+    if fmt == "tar.gz":
+        with tarfile.open(tmp_path / "out.tar.gz", "r:gz") as tar:
+            assert tar.extractfile("sub/b.txt").read() == b"bravo"
+
+
+def test_service_archive_backup(tmp_path):
+    _make_tree(tmp_path / "src")
+    result = _make_service(tmp_path, output_format="tar.gz", compression_workers=2).backup()
+
+    assert result.success
+    assert result.destination_path.name.endswith(".tar.gz")
+    assert result.compressed_size == result.destination_path.stat().st_size
+    assert not list(tmp_path.joinpath("dst").glob("*.tmp"))
+
+
+# ===== 事件驅動排程器 =====
+def test_cron_next_after():
+    from datetime import datetime
+
+    start = datetime(2026, 1, 30, 18, 57, 30)  # 星期五
+    assert CronExpression.parse("57 18 * * *").next_after(start) == datetime(2026, 1, 31, 18, 57)
+    assert CronExpression.parse("*/15 * * * *").next_after(start) == datetime(2026, 1, 30, 19, 0)
+    assert CronExpression.parse("0 9 * * 1-5").next_after(start) == datetime(2026, 2, 2, 9, 0)
+    assert CronExpression.parse("@monthly").next_after(start) == datetime(2026, 2, 1, 0, 0)
+    # 日和星期都有指定時符合其中一個即可：2/1 是星期日
+    assert CronExpression.parse("0 0 15 * 0").next_after(start) == datetime(2026, 2, 1, 0, 0)
+    with pytest.raises(ValueError):
+        CronExpression.parse("61 * * * *")
+    with pytest.raises(ValueError):
+        CronExpression.parse("0 0 30 2 *").next_after(start)
+
+
+def test_schedule_wrapper_cron_rearms_after_each_run():
+    """測試 ScheduleWrapper 的 cron 排程：執行一次後自動排下一次"""
+    import schedule
+
+    schedule.clear()
+    calls = []
+    wrapper = backup_app.ScheduleWrapper(ListLogger())
+    try:
+        first = wrapper.schedule_cron("*/5 * * * *", lambda: calls.append(1))
+        assert schedule.jobs == [first]
+        assert 0 < first.interval <= 5 * 60 and first.unit == "seconds"
+
+        first.run()
+        assert calls == [1]
+        assert len(schedule.jobs) == 1 and schedule.jobs[0] is not first  # 舊的取消，新的排上
+    finally:
+        schedule.clear()
+
+
+def test_event_scheduler_runs_due_jobs_in_deadline_order():
+    from datetime import datetime
+
+    now = [datetime(2026, 1, 30, 18, 0).timestamp()]
+    scheduler = EventScheduler(ListLogger(), clock=lambda: now[0])
+    calls = []
+    scheduler.schedule_daily("18:57", lambda: calls.append("daily"))
+    scheduler.schedule_cron("*/30 * * * *", lambda: calls.append("half-hour"))
+    scheduler.schedule_cron("5 18 * * *", lambda: 1 / 0, name="broken")
+
+    assert scheduler.idle_seconds() == 5 * 60
+    assert scheduler.run_pending() == 0
+
+    now[0] += 3600  # 19:00，三個工作都到期了
+    assert scheduler.run_pending() == 3
+    assert calls == ["half-hour", "daily"]
+    assert [job.name for job in scheduler.jobs][0] == "<lambda>"  # 下一次是 19:30 的 half-hour
+    assert scheduler.idle_seconds() == 30 * 60
+    assert next(job for job in scheduler.jobs if job.name == "broken").last_error
+
+
+def test_event_scheduler_run_forever_sleeps_until_deadline_and_stops():
+    import threading
+    import time
+
+    scheduler = EventScheduler(ListLogger())
+    scheduler.schedule_cron("* * * * *", lambda: None)  # 一分鐘後才到期
+    runner = threading.Thread(target=scheduler.run_forever)
+    started = time.perf_counter()
+    runner.start()
+    time.sleep(0.05)
+    scheduler.stop()
+    runner.join(timeout=2)
+
+    assert not runner.is_alive()
+    assert time.perf_counter() - started < 2
+
+
+# ===== watch 模式 =====
+def test_debounced_queue_coalesces_until_quiet():
+    """測試 DebouncedQueue 在安靜一段時間後才交出合併好的變動"""
+    now = [0.0]
+    queue = DebouncedQueue(debounce=2.0, max_delay=5.0, clock=lambda: now[0])
+    assert queue.time_until_ready() is None
+
+    queue.add(["a.txt", "sub/b.txt", "a.txt"])
+    now[0] = 1.5
+    queue.add(["sub"])
+    assert queue.pop_ready() == []
+    assert queue.time_until_ready() == 2.0
+
+    now[0] = 3.5
+    assert queue.pop_ready() == ["a.txt", "sub"]  # sub/b.txt 被 sub 涵蓋
+    assert len(queue) == 0
+
+    # 一直有變動也最多等 max_delay
+    for t in range(10, 16):
+        now[0] = t
+        queue.add([f"f{t}"])
+    assert queue.time_until_ready() == 0.0
+    assert collapse_paths(["x/y", "", "z"]) == [""]
+
+
+def test_sync_paths_does_not_touch_linked_previous_snapshot(tmp_path):
+    """測試同步時先寫暫存檔再取代，不會改到硬連結的上一個快照"""
+    source, dest = tmp_path / "src", tmp_path / "dst"
+    _make_tree(source)
+    copier = IncrementalCopier(ListLogger())
+    copier.copy(source, dest / "2026-01-01")
+    manifest, stats = copier.copy(source, dest / "2026-01-02", previous=dest / "2026-01-01")
+    assert stats.files_linked == 3
+
+    (source / "a.txt").write_text("changed")
+    (source / "sub" / "b.txt").unlink()
+    (source / "new").mkdir()
+    (source / "new" / "d.txt").write_text("delta")
+    result = sync_paths(source, dest / "2026-01-02", ["a.txt", "sub/b.txt", "new", "new/d.txt"], manifest)
+
+    assert (result.copied, result.deleted, result.errors) == (2, 1, [])
+    assert (dest / "2026-01-02" / "a.txt").read_text() == "changed"
+    assert (dest / "2026-01-01" / "a.txt").read_text() == "alpha"  # 舊快照不受影響
+    assert not (dest / "2026-01-02" / "sub" / "b.txt").exists()
+    assert (dest / "2026-01-02" / "new" / "d.txt").read_text() == "delta"
+    assert sorted(manifest.entries) == ["a.txt", "new/d.txt", "sub/c.bin"]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify 只支援 Linux")
+def test_inotify_watcher_reports_changes_and_new_directories(tmp_path):
+    """測試 inotify 回報變動，新建的資料夾也會自動加入監看"""
+    _make_tree(tmp_path)
+    with InotifyWatcher(tmp_path) as watcher:
+        assert watcher.watch_count == 2
+        (tmp_path / "a.txt").write_text("changed")
+        (tmp_path / "new" / "deep").mkdir(parents=True)
+        (tmp_path / "new" / "deep" / "x.txt").write_text("x")
+
+        changed = set()
+        for _ in range(20):
+            changed.update(watcher.read(timeout=0.1))
+            if {"a.txt", "new/deep/x.txt"} <= changed:
+                break
+        assert {"a.txt", "new", "new/deep/x.txt"} <= changed
+        assert watcher.watch_count == 4
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify 只支援 Linux")
+def test_service_watch_syncs_changes_until_stopped(tmp_path):
+    """測試 watch 模式把變動同步到今天的快照，stop_watching 後結束"""
+    import datetime
+    import threading
+    import time
+
+    _make_tree(tmp_path / "src")
+    service = _make_service(tmp_path, incremental=True, watch_debounce=0.05)
+    runner = threading.Thread(target=service.watch)
+    runner.start()
+    snapshot = tmp_path / "dst" / str(datetime.date.today())
+    try:
+        for _ in range(100):
+            if service._watcher is not None and manifest_path(snapshot).exists():
+                break
+            time.sleep(0.02)
+        (tmp_path / "src" / "a.txt").write_text("live")
+        for _ in range(100):
+            if (snapshot / "a.txt").read_text() == "live":
+                break
+            time.sleep(0.02)
+    finally:
+        service.stop_watching()
+        runner.join(timeout=5)
+
+    assert not runner.is_alive()
+    assert (snapshot / "a.txt").read_text() == "live"
+    assert Manifest.load(manifest_path(snapshot)).entries["a.txt"].size == 4
+
+
+
+def test_sync_changes_survives_corrupt_manifest(tmp_path):
+    """測試今天的清單損毀時仍然同步變動，而且不會拋出例外"""
+    import datetime
+
+    _make_tree(tmp_path / "src")
+    service = _make_service(tmp_path, incremental=True)
+    assert service.backup().success
+    snapshot = tmp_path / "dst" / str(datetime.date.today())
+    manifest_path(snapshot).write_text('{"version": 1, "entr')  # 寫到一半
+    (tmp_path / "src" / "a.txt").write_text("live")
+
+    service._sync_changes(["a.txt"])
+
+    assert (snapshot / "a.txt").read_text() == "live"
+    assert not manifest_path(snapshot).exists()
+    assert any("清單" in message for level, message in service.logger.messages if level == "WARNING")
+
+# ===== 保留策略 =====
+def test_retention_policy_keeps_daily_weekly_monthly():
+    """測試保留策略取每日 / 每週 / 每月規則的聯集"""
+    from datetime import date, timedelta
+
+    days = [date(2026, 3, 31) - timedelta(days=i) for i in range(90)]
+    keep = RetentionPolicy(daily=3, weekly=3, monthly=3).select(days)
+
+    assert keep == {
+        date(2026, 3, 31), date(2026, 3, 30), date(2026, 3, 29),  # daily (3/31、3/29 也是各自那一週最新的)
+        date(2026, 3, 22),  # 第三週：前兩週的星期日
+        date(2026, 2, 28), date(2026, 1, 31),  # 前兩個月的最後一天
+    }
+    assert RetentionPolicy(0, 0, 0).select(days) == {date(2026, 3, 31)}
+
+
+def test_pruner_removes_old_snapshots_and_counts_only_freed_bytes(tmp_path):
+    """測試清理舊快照，還有其他硬連結的檔案不算釋放的空間"""
+    root = tmp_path / "dst"
+    _make_tree(tmp_path / "src")
+    copier = IncrementalCopier(ListLogger())
+    for day in ("2026-01-01", "2026-01-02", "2026-01-03"):
+        copier.copy(tmp_path / "src", root / day, previous=copier.find_previous_snapshot(root, root / day) if root.exists() else None)
+    (root / "2025-12-31.tar.gz").write_bytes(b"old")
+    (root / ".pruning-2025-12-30" / "x").mkdir(parents=True)  # 上一次沒刪完的
+    (root / ".pruning-2025-12-30" / "x" / "y.txt").write_text("y")
+
+    pruner = SnapshotPruner(ListLogger(), RetentionPolicy(daily=1, weekly=0, monthly=0), max_files_per_second=0)
+    assert [p.name for p in pruner.plan(root)] == ["2025-12-31.tar.gz", "2026-01-01", "2026-01-02"]
+    stats = pruner.prune(root)
+
+    assert sorted(p.name for p in root.iterdir()) == ["2026-01-03", "2026-01-03.manifest.json"]
+    assert stats.files_deleted == 1 + 3 + 3 + 1
+    assert stats.bytes_freed == 3 + 1  # 快照裡的文件都還連結在 2026-01-03，沒有釋放空間
+    assert (root / "2026-01-03" / "sub" / "b.txt").read_text() == "bravo"
+
+
+def test_pruner_rate_limit_and_stop(tmp_path):
+    """測試清理受每秒檔案數限制，stop() 可以中途停止"""
+    import time
+
+    snapshot = tmp_path / "2026-01-01"
+    snapshot.mkdir()
+    for i in range(50):
+        (snapshot / f"{i}.txt").write_text("x")
+    (tmp_path / "2026-01-02").mkdir()
+
+    pruner = SnapshotPruner(ListLogger(), RetentionPolicy(daily=1, weekly=0, monthly=0), max_files_per_second=100)
+    assert pruner.start(tmp_path)
+    assert not pruner.start(tmp_path)  # 同時只會有一個清理
+    time.sleep(0.2)
+    pruner.stop()
+
+    pending = tmp_path / ".pruning-2026-01-01"
+    assert not snapshot.exists()
+    assert 0 < len(list(pending.iterdir())) < 50  # 限速：0.2 秒大約只刪了 20 個
+
+    pruner.max_files_per_second = 0
+    pruner.prune(tmp_path)  # 下一次清理接著刪完
+    assert not pending.exists()
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_same_day_rerun_updates_in_place(tmp_path, incremental):
+    """測試同一天重跑時就地更新今天的快照"""
+    _make_tree(tmp_path / "src")
+    if incremental:
+        IncrementalCopier(ListLogger()).copy(tmp_path / "src", tmp_path / "dst" / "2000-01-01")
+    service = _make_service(tmp_path, incremental=incremental)
+    first = service.backup()
+    untouched_inode = (first.destination_path / "sub" / "c.bin").stat().st_ino
+
+    (tmp_path / "src" / "a.txt").write_text("changed")
+    (tmp_path / "src" / "sub" / "b.txt").unlink()
+    second = service.backup()
+
+    assert second.success
+    assert (second.files_copied, second.files_linked) == (1, 1)
+    assert (second.destination_path / "sub" / "c.bin").stat().st_ino == untouched_inode
+    assert not (second.destination_path / "sub" / "b.txt").exists()
+    if incremental:
+        assert (tmp_path / "dst" / "2000-01-01" / "a.txt").read_text() == "alpha"
+        assert sorted(Manifest.load(manifest_path(second.destination_path)).entries) == ["a.txt", "sub/c.bin"]
+
+
+def test_service_prunes_in_background_after_backup(tmp_path):
+    """測試備份成功後在背景依照保留策略清理"""
+    _make_tree(tmp_path / "src")
+    for day in ("2000-01-01", "2000-01-02"):
+        (tmp_path / "dst" / day).mkdir(parents=True)
+    pruner = SnapshotPruner(ListLogger(), RetentionPolicy(daily=2, weekly=0, monthly=0))
+    result = _make_service(tmp_path, pruner=pruner).backup()
+    pruner.join(timeout=5)
+
+    assert result.success
+    assert sorted(p.name for p in (tmp_path / "dst").iterdir()) == ["2000-01-02", result.destination_path.name]
+
+
+# ===== 多來源備份 =====
+def test_job_registry_limits_concurrency_and_follows_priority(tmp_path):
+    """測試同時執行的工作數受限制，並依照優先順序開始"""
+    import threading
+    import time
+
+    started, running, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    class SlowService:
+        def __init__(self, config):
+            self.config = config
+
+        def backup(self):
+            with lock:
+                started.append(self.config.source_dir.name)
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            if self.config.source_dir.name == "broken":
+                raise OSError("disk on fire")
+            return backup_app.BackupResult(True, "ok", self.config.source_dir)
+
+        def wait_for_pruning(self, timeout=None):
+            pass
+
+    registry = backup_app.BackupJobRegistry(ListLogger(), max_concurrent_jobs=2, service_factory=SlowService)
+    for name, priority in [("low", 0), ("high", 10), ("broken", 5), ("mid", 5), ("low2", 0)]:
+        registry.register(name, backup_app.BackupConfiguration(tmp_path / name, tmp_path / "dst" / name), priority)
+    with pytest.raises(ValueError):
+        registry.register("dup", backup_app.BackupConfiguration(tmp_path / "x", tmp_path / "dst" / "low"))
+
+    results = registry.run_all()
+
+    assert set(started[:2]) == {"high", "broken"} and started[4] == "low2"  # 同時開始的兩個先後不一定
+    assert peak[0] == 2
+    assert list(results) == ["high", "broken", "mid", "low", "low2"]
+    assert not results["broken"].success and "disk on fire" in results["broken"].message
+    assert all(results[name].success for name in ("high", "mid", "low", "low2"))
+
+    skipped = registry.run_all(window=0.01)
+    assert not skipped["low2"].success and skipped["high"].success
+
+
+def test_job_registry_backs_up_multiple_sources(tmp_path):
+    """測試多個來源各自備份到自己的目標"""
+    registry = backup_app.BackupJobRegistry(
+        ListLogger(),
+        service_factory=lambda config: _make_service(config.source_dir.parent, incremental=True),
+    )
+    for name in ("one", "two"):
+        _make_tree(tmp_path / name / "src")
+        registry.register(name, backup_app.BackupConfiguration(tmp_path / name / "src", tmp_path / name / "dst"))
+
+    results = registry.run_all()
+
+    assert all(result.success for result in results.values())
+    assert (results["two"].destination_path / "sub" / "b.txt").read_text() == "bravo"
+
+
+def test_job_registry_shares_one_throttle_across_jobs(tmp_path):
+    """同時執行的工作共用 registry 的限速器，加起來不超過同一個 bytes/s 預算"""
+    clock = FakeClock()
+    throttle = Throttle(bytes_per_second=1000, clock=clock, sleep=clock.sleep)
+    registry = backup_app.BackupJobRegistry(ListLogger(), max_concurrent_jobs=2, throttle=throttle)
+    registry.service_factory = lambda config: _make_service(
+        config.source_dir.parent,
+        file_ops=backup_app.FileOperations(ListLogger(), registry.throttle),
+        throttle=registry.throttle,
+    )
+    for name in ("one", "two"):
+        _make_tree(tmp_path / name / "src")
+        registry.register(name, backup_app.BackupConfiguration(tmp_path / name / "src", tmp_path / name / "dst"))
+
+    results = registry.run_all()
+
+    assert all(result.success for result in results.values())
+    total = sum(result.total_size for result in results.values())
+    assert throttle.waited >= (total - 1000) / 1000 - 1e-6  # 兩個工作一起扣同一個桶 (扣掉 1 秒份的 burst)
+
+
+def test_job_registry_keeps_slot_until_pruning_finishes(tmp_path):
+    """保留策略的清理結束後工作才算完成，run_all 回傳時不會留下背景清理"""
+    _make_tree(tmp_path / "src")
+    old = tmp_path / "dst" / "2020-01-01"
+    old.mkdir(parents=True)
+    for i in range(5):
+        (old / f"{i}.txt").write_text("old")
+    pruner = SnapshotPruner(ListLogger(), RetentionPolicy(daily=1, weekly=0, monthly=0), max_files_per_second=50)
+    registry = backup_app.BackupJobRegistry(
+        ListLogger(), service_factory=lambda config: _make_service(tmp_path, pruner=pruner)
+    )
+    registry.register("only", backup_app.BackupConfiguration(tmp_path / "src", tmp_path / "dst"))
+
+    assert registry.run_all()["only"].success
+    assert not old.exists()
+    assert not pruner._thread.is_alive()
+
+
+# ===== 可續傳的備份 =====
+def test_journal_resumes_and_ignores_torn_last_line(tmp_path):
+    """日誌續傳已完成的檔案，當機時寫到一半的最後一行被忽略"""
+    (tmp_path / "dst").mkdir()
+    (tmp_path / "dst" / "a.txt").write_text("alpha")
+    (tmp_path / "dst" / "b.txt").write_text("bravo")
+    journal = BackupJournal.open(tmp_path / "j", tmp_path / "src", tmp_path / "dst")
+    journal.record("a.txt", 5, 111, "digest-a")
+    journal.record("b.txt", 5, 222)
+    journal.close()
+    (tmp_path / "dst" / "b.txt").unlink()
+    with open(tmp_path / "j", "a") as f:
+        f.write('{"path": "c.t')  # 當機時寫到一半
+
+    resumed = BackupJournal.open(tmp_path / "j", tmp_path / "src", tmp_path / "dst")
+    assert resumed.resumed == 2
+    assert resumed.entries["a.txt"].digest == "digest-a"
+    assert resumed.is_done("a.txt", 5, 111)
+    assert not resumed.is_done("a.txt", 5, 999)  # 來源之後改過
+    assert not resumed.is_done("b.txt", 5, 222)  # 暫存檔不見了
+    resumed.close()
+
+    other_source = BackupJournal.open(tmp_path / "j", tmp_path / "elsewhere", tmp_path / "dst")
+    assert other_source.resumed == 0
+    other_source.discard()
+    assert not (tmp_path / "j").exists()
+
+
+def test_journal_fsyncs_file_before_recording(tmp_path, monkeypatch):
+    """檔案內容 fsync 之後才寫進日誌"""
+    import backup_journal
+
+    (tmp_path / "dst").mkdir()
+    (tmp_path / "dst" / "a.txt").write_text("alpha")
+    journal = BackupJournal.open(tmp_path / "j", tmp_path / "src", tmp_path / "dst")
+    synced = []
+    monkeypatch.setattr(backup_journal, "_fsync_file", lambda path: synced.append((path.name, dict(journal.entries))))
+
+    journal.record("a.txt", 5, 111)
+    journal.close()
+
+    assert synced == [("a.txt", {})]
+    assert "a.txt" in journal.entries
+
+
+def _flaky_copy(fail_at: int, calls: list):
+    def copy(src, dst):
+        calls.append(Path(src).name)
+        if len(calls) == fail_at:
+            raise OSError("磁碟空間不足")
+        return shutil.copy2(src, dst)
+    return copy
+
+
+def test_interrupted_backup_resumes_without_exposing_partial_snapshot(tmp_path):
+    """中斷的備份不會出現半成品快照，重跑時只複製沒完成的檔案"""
+    _make_tree(tmp_path / "src")
+    logger = ListLogger()
+    calls = []
+    flaky = backup_app.ParallelFileOperations(logger, ParallelCopier(workers=1, batch_files=1, copy_function=_flaky_copy(2, calls)))
+
+    failed = _make_service(tmp_path, file_ops=flaky).backup()
+    today = tmp_path / "dst" / str(backup_app.datetime.date.today())
+    assert not failed.success and "繼續" in failed.message
+    assert not today.exists()  # 沒有半成品的快照
+    assert journal_path(partial_path(today)).exists()
+
+    failed_file = calls[1]
+    calls.clear()
+    flaky.copier.copy_function = _flaky_copy(0, calls)
+    result = _make_service(tmp_path, file_ops=flaky).backup()
+
+    assert result.success and result.destination_path == today
+    assert calls == [failed_file]  # 其他文件上次已經完成
+    failed_size = next((tmp_path / "src").rglob(failed_file)).stat().st_size
+    assert result.bytes_per_second * result.duration == pytest.approx(failed_size)  # 吞吐量只算這次複製的
+    assert result.files_per_second * result.duration == pytest.approx(1)
+    assert (today / "sub" / "c.bin").read_bytes() == (tmp_path / "src" / "sub" / "c.bin").read_bytes()
+    assert not partial_path(today).exists() and not journal_path(partial_path(today)).exists()
+
+
+def test_parallel_copy_stats_exclude_resumed_files(tmp_path):
+    """續傳時 CopyStats 只計算這次真的複製的檔案"""
+    _make_tree(tmp_path / "src")
+    dst = tmp_path / "dst"
+    journal = BackupJournal.open(tmp_path / "j", tmp_path / "src", dst)
+    dst.mkdir()
+    (dst / "a.txt").write_text("alpha")
+    info = (tmp_path / "src" / "a.txt").stat()
+    journal.record("a.txt", info.st_size, info.st_mtime_ns)
+
+    stats = ParallelCopier(workers=2).copy_tree(tmp_path / "src", dst, journal=journal)
+    journal.close()
+
+    assert stats.skipped == 1 and stats.files == 2 and stats.bytes == 5 + 4096
+
+
+def test_interrupted_incremental_backup_resumes_with_journaled_digests(tmp_path, monkeypatch):
+    """增量備份續傳時沿用日誌裡的雜湊，清單仍然正確"""
+    import backup_manifest
+
+    _make_tree(tmp_path / "src")
+    calls = []
+    original = backup_manifest.copy_and_hash
+
+    def flaky(src, dst, throttle=None):
+        calls.append(src.name)
+        if len(calls) == 2:
+            raise OSError("斷線")
+        return original(src, dst, throttle)
+
+    monkeypatch.setattr(backup_manifest, "copy_and_hash", flaky)
+    assert not _make_service(tmp_path, incremental=True).backup().success
+
+    monkeypatch.setattr(backup_manifest, "copy_and_hash", lambda src, dst, throttle=None: calls.append(src.name) or original(src, dst, throttle))
+    calls.clear()
+    service = _make_service(tmp_path, incremental=True, validation_mode="hash")
+    result = service.backup()
+
+    assert result.success
+    assert result.files_copied == 2 and calls == ["b.txt", "c.bin"]
+    assert ("INFO", "增量備份完成: 複製 2 個檔案 (4101 bytes)，硬連結 0 個檔案，沿用上次中斷前完成的 1 個檔案") in service.logger.messages
+    manifest = Manifest.load(manifest_path(result.destination_path))
+    assert manifest.entries["a.txt"].digest == file_digest(tmp_path / "src" / "a.txt", "sha256")
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_failed_same_day_update_leaves_snapshot_untouched(tmp_path, monkeypatch, incremental):
+    """同一天重跑時在硬連結複本上同步：中途失敗或驗證失敗，今天的快照和清單都維持原狀"""
+    import file_watcher
+
+    _make_tree(tmp_path / "src")
+    service = _make_service(tmp_path, incremental=incremental)
+    today = service.backup().destination_path
+    manifest_before = manifest_path(today).read_bytes() if incremental else None
+    (tmp_path / "src" / "a.txt").write_text("changed a")
+    (tmp_path / "src" / "sub" / "b.txt").write_text("changed b")
+
+    original = file_watcher.copy_and_hash
+    calls = []
+
+    def flaky(src, dst, throttle=None):
+        calls.append(src.name)
+        if len(calls) == 2:
+            raise OSError("斷線")
+        return original(src, dst, throttle)
+
+    monkeypatch.setattr(file_watcher, "copy_and_hash", flaky)
+    assert not service.backup().success
+    monkeypatch.setattr(file_watcher, "copy_and_hash", original)
+    monkeypatch.setattr(service.validator, "validate", lambda *args: False)
+    assert not service.backup().success
+
+    assert (today / "a.txt").read_text() == "alpha"
+    assert (today / "sub" / "b.txt").read_text() == "bravo"
+    if incremental:
+        assert manifest_path(today).read_bytes() == manifest_before
+
+    monkeypatch.undo()
+    result = service.backup()
+    assert result.success and result.destination_path == today
+    assert (today / "a.txt").read_text() == "changed a"
+    assert (today / "sub" / "b.txt").read_text() == "changed b"
+    assert not partial_path(today).exists()
+
+
+def _on_date(monkeypatch, day):
+    """讓 backup_app 的 datetime.date.today() 回傳 day"""
+    import datetime
+    import types
+
+    class FixedDate(datetime.date):
+        @classmethod
+        def today(cls):
+            return day
+
+    monkeypatch.setattr(backup_app, "datetime", types.SimpleNamespace(date=FixedDate, datetime=datetime.datetime))
+
+
+def test_interrupted_backup_resumes_on_the_next_day(tmp_path, monkeypatch):
+    """前一天中斷的暫存資料夾改名成今天的繼續複製，其他過期的暫存資料夾被刪除"""
+    import datetime
+
+    _make_tree(tmp_path / "src")
+    logger = ListLogger()
+    calls = []
+    flaky = backup_app.ParallelFileOperations(logger, ParallelCopier(workers=1, batch_files=1, copy_function=_flaky_copy(2, calls)))
+    monday, tuesday = tmp_path / "dst" / "2026-01-05", tmp_path / "dst" / "2026-01-06"
+    orphan = tmp_path / "dst" / ".partial-2026-01-01"
+    orphan.mkdir(parents=True)  # 沒有日誌，無法續傳
+
+    _on_date(monkeypatch, datetime.date(2026, 1, 5))
+    assert not _make_service(tmp_path, file_ops=flaky).backup().success
+    assert journal_path(partial_path(monday)).exists()
+
+    failed_file = calls[1]
+    calls.clear()
+    flaky.copier.copy_function = _flaky_copy(0, calls)
+    _on_date(monkeypatch, datetime.date(2026, 1, 6))
+    result = _make_service(tmp_path, file_ops=flaky).backup()
+
+    assert result.success and result.destination_path == tuesday
+    assert calls == [failed_file]
+    assert (tuesday / "sub" / "c.bin").read_bytes() == (tmp_path / "src" / "sub" / "c.bin").read_bytes()
+    assert sorted(path.name for path in (tmp_path / "dst").iterdir()) == ["2026-01-06"]
+
+
+def test_failed_rerun_keeps_existing_snapshot(tmp_path):
+    """不能就地更新時，舊快照要等新的複製完成才被取代"""
+    _make_tree(tmp_path / "src")
+    assert _make_service(tmp_path, update_in_place=False).backup().success
+    today = tmp_path / "dst" / str(backup_app.datetime.date.today())
+    (tmp_path / "src" / "a.txt").write_text("changed")
+
+    calls = []
+    flaky = backup_app.ParallelFileOperations(ListLogger(), ParallelCopier(workers=1, batch_files=1, copy_function=_flaky_copy(2, calls)))
+    assert not _make_service(tmp_path, file_ops=flaky, update_in_place=False).backup().success
+    assert (today / "a.txt").read_text() == "alpha"
+    assert (today / "sub" / "b.txt").read_text() == "bravo"
+
+    flaky.copier.copy_function = _flaky_copy(0, calls)
+    result = _make_service(tmp_path, file_ops=flaky, update_in_place=False).backup()
+    assert result.success and (today / "a.txt").read_text() == "changed"
+    assert sorted(path.name for path in (tmp_path / "dst").iterdir()) == [today.name]
+
+
+# ===== 效能指標 =====
+def test_run_metrics_prometheus_escapes_labels():
+    """Prometheus 文字格式跳脫標籤值，沒有數值的指標不輸出"""
+    metrics = RunMetrics(
+        source='/data/"q"',
+        destination="/backups/2026-01-01",
+        success=True,
+        timestamp=1700000000.0,
+        duration=1.5,
+        phases={"scan": 0.5, "copy": 1.0},
+        file_count=3,
+        total_size=42,
+        slowest_files=[SlowFile("dir\\new\nline.txt", 0.25, 10)],
+    )
+    text = metrics.to_prometheus()
+
+    assert "# TYPE backup_phase_duration_seconds gauge" in text
+    assert 'backup_phase_duration_seconds{source="/data/\\"q\\"",phase="copy"} 1.0' in text
+    assert 'backup_last_success{source="/data/\\"q\\""} 1' in text
+    assert 'path="dir\\\\new\\nline.txt"' in text
+    assert "backup_throughput_bytes_per_second" not in text  # 沒有數值的指標不輸出
+
+
+def test_run_metrics_prometheus_writes_infinity_and_nan():
+    """無限大與 NaN 用 Prometheus 的寫法 (+Inf / -Inf / NaN)"""
+    metrics = RunMetrics("/data", "/backups", True, 1700000000.0, float("inf"), phases={"copy": float("-inf")})
+    metrics.bytes_per_second = float("nan")
+    text = metrics.to_prometheus()
+
+    assert 'backup_duration_seconds{source="/data"} +Inf' in text
+    assert 'phase="copy"} -Inf' in text
+    assert 'backup_throughput_bytes_per_second{source="/data"} NaN' in text
+    assert " inf" not in text and " nan" not in text
+
+
+@pytest.mark.parametrize("mode", ["in_place", "archive", "store"])
+def test_slowest_files_recorded_without_journal(tmp_path, mode):
+    """就地更新、封存、去重複倉庫也會記錄最慢的檔案"""
+    _make_tree(tmp_path / "src")
+    config = {"output_format": "tar.gz"} if mode == "archive" else {}
+    store = _small_store(tmp_path / "store") if mode == "store" else None
+    service = _make_service(tmp_path, chunk_store=store, metrics_slowest_files=2, **config)
+    if mode == "in_place":
+        assert service.backup().success
+        (tmp_path / "src" / "a.txt").write_text("changed")
+
+    result = service.backup()
+
+    assert result.success
+    if mode == "in_place":
+        assert [slow.path for slow in result.slowest_files] == ["a.txt"]  # 只有變動的文件被複製
+    else:
+        assert len(result.slowest_files) == 2
+        assert result.slowest_files[0].seconds >= result.slowest_files[1].seconds
+
+
+@pytest.mark.parametrize("suffix", [".prom", ".jsonl"])
+def test_service_writes_metrics_after_each_run(tmp_path, suffix):
+    """每次備份後寫出指標檔 (.prom 覆寫、.jsonl 追加)"""
+    import json
+
+    _make_tree(tmp_path / "src")
+    metrics_file = tmp_path / "metrics" / f"backup{suffix}"
+    service = _make_service(tmp_path, metrics_file=metrics_file, metrics_slowest_files=2, update_in_place=False)
+
+    result = service.backup()
+    assert result.success
+    assert set(result.phases) == {"scan", "copy", "validate", "publish"}
+    assert len(result.slowest_files) == 2
+    assert result.slowest_files[0].seconds >= result.slowest_files[1].seconds
+
+    service.backup()
+    text = metrics_file.read_text()
+    if suffix == ".prom":
+        assert 'phase="validate"' in text and 'rank="2"' in text
+    else:
+        runs = [json.loads(line) for line in text.splitlines()]
+        assert len(runs) == 2 and runs[0]["success"] and runs[0]["file_count"] == 3
+
+
+# ===== 限速 =====
+class FakeClock:
+    """假的時鐘：sleep 只是把時間往前推"""
+
+    def __init__(self):
+        import threading
+
+        self.now = 0.0
+        self.slept = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.slept.append(seconds)
+            self.now += seconds
+
+
+def test_token_bucket_borrows_and_adjusts_rate_at_runtime():
+    """token 不夠時先借再睡，速度可以在執行中調整"""
+    clock = FakeClock()
+    bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire(100) == 0  # 一開始有 1 秒份的 burst
+    assert bucket.acquire(50) == pytest.approx(0.5)
+    assert bucket.acquire(300) == pytest.approx(3.0)  # 超過 burst 也可以，先借再睡
+    bucket.set_rate(1000)
+    assert bucket.acquire(500) == pytest.approx(0.5)
+    bucket.set_rate(0)
+    assert bucket.acquire(10 ** 9) == 0
+
+
+def test_adaptive_controller_backs_off_when_latency_rises():
+    """延遲上升時速度減半，恢復後慢慢加回來"""
+    clock = FakeClock()
+    controller = AdaptiveController(warmup=5, interval=1.0, clock=clock)
+    for _ in range(10):
+        clock.now += 1
+        controller.observe(0.001)
+    assert controller.factor == 1.0
+
+    for _ in range(5):
+        clock.now += 1
+        controller.observe(0.05)
+    assert controller.factor == controller.min_factor and controller.backoffs >= 3
+
+    for _ in range(30):
+        clock.now += 1
+        controller.observe(0.001)
+    assert controller.factor == 1.0
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_throttled_backup_respects_limits(tmp_path, workers):
+    """完整複製 (單執行緒 / 多執行緒) 遵守 bytes/s 與 files/s 上限"""
+    _make_tree(tmp_path / "src")
+    (tmp_path / "src" / "big.bin").write_bytes(os.urandom(5000))
+    clock = FakeClock()
+    throttle = Throttle(bytes_per_second=1000, files_per_second=2, chunk_size=1024, clock=clock, sleep=clock.sleep)
+    logger = ListLogger()
+    if workers > 1:
+        file_ops = backup_app.ParallelFileOperations(logger, ParallelCopier(workers=2, large_file_threshold=2048, throttle=throttle))
+    else:
+        file_ops = backup_app.FileOperations(logger, throttle)
+
+    result = _make_service(tmp_path, file_ops=file_ops).backup()
+
+    assert result.success
+    assert (result.destination_path / "big.bin").read_bytes() == (tmp_path / "src" / "big.bin").read_bytes()
+    total = result.total_size
+    assert clock.now >= max(total / 1000, 4 / 2) - 1.0 - 1e-6  # 扣掉一開始 1 秒份的 burst
+    assert throttle.waited == pytest.approx(sum(clock.slept))
+
+
+def test_adaptive_throttle_requires_limits(tmp_path):
+    """自適應限速需要先設定速度上限"""
+    with pytest.raises(ValueError):
+        backup_app.BackupConfiguration(tmp_path / "src", tmp_path / "dst", adaptive_throttle=True)
+
+
+def test_throttle_wrap_paces_each_chunk(tmp_path):
+    """限制頻寬時一塊一塊讀寫，每一塊寫入前各自等到額度足夠 (不是先付清整個文件再全速寫完)"""
+    (tmp_path / "big.bin").write_bytes(os.urandom(5000))
+    clock = FakeClock()
+    throttle = Throttle(bytes_per_second=1000, chunk_size=1024, clock=clock, sleep=clock.sleep)
+    copy = throttle.wrap(shutil.copy2)
+
+    copy(tmp_path / "big.bin", tmp_path / "copy.bin")
+
+    assert len(clock.slept) >= 4  # 1 秒份的 burst 之後每一塊各睡一次
+    assert max(clock.slept) <= 1024 / 1000 + 1e-6
+    assert clock.now == pytest.approx(4.0)  # 5000 bytes 扣掉 1 秒份的 burst
+    assert (tmp_path / "copy.bin").read_bytes() == (tmp_path / "big.bin").read_bytes()
+    assert (tmp_path / "copy.bin").stat().st_mtime == pytest.approx((tmp_path / "big.bin").stat().st_mtime)
+
+
+def test_throttle_wrap_keeps_zero_copy_in_slices(tmp_path):
+    """zero-copy 限速時仍然用 sendfile，只是每次搬 chunk_size，每一段之前各自取得額度"""
+    (tmp_path / "big.bin").write_bytes(os.urandom(5000))
+    clock = FakeClock()
+    throttle = Throttle(bytes_per_second=1000, chunk_size=1024, clock=clock, sleep=clock.sleep)
+    copier = ZeroCopier(method="sendfile")
+    copy = throttle.wrap(copier)
+
+    copy(tmp_path / "big.bin", tmp_path / "copy.bin")
+
+    assert copier.methods == {"sendfile": 1}
+    assert len(clock.slept) >= 4
+    assert max(clock.slept) <= 1024 / 1000 + 1e-6
+    assert clock.now == pytest.approx(4.0)
+    assert (tmp_path / "copy.bin").read_bytes() == (tmp_path / "big.bin").read_bytes()
+
+
+def test_throttle_applies_to_incremental_and_in_place_copies(tmp_path):
+    """增量複製與同一天就地更新也會限速"""
+    _make_tree(tmp_path / "src")
+    clock = FakeClock()
+    throttle = Throttle(bytes_per_second=1000, files_per_second=2, clock=clock, sleep=clock.sleep)
+    service = _make_service(tmp_path, throttle=throttle, incremental=True)
+
+    assert service.backup().success
+    first = clock.now
+    assert first >= (5 + 5 + 4096) / 1000 - 1.0 - 1e-6
+
+    (tmp_path / "src" / "sub" / "c.bin").write_bytes(os.urandom(3000))
+    assert service.backup().success  # 同一天重跑：就地更新
+    assert clock.now - first >= 3000 / 1000 - 1e-6
+    assert throttle.waited == pytest.approx(sum(clock.slept))
+
+
+def test_incremental_rejects_copy_workers_and_copy_method(tmp_path):
+    """增量模式用不到 copy_workers / copy_method，設定了直接報錯而不是默默忽略"""
+    with pytest.raises(ValueError):
+        backup_app.BackupConfiguration(tmp_path / "src", tmp_path / "dst", incremental=True, copy_workers=4)
+    with pytest.raises(ValueError):
+        backup_app.BackupConfiguration(tmp_path / "src", tmp_path / "dst", incremental=True, copy_method="zero_copy")
+
+
+# ===== 非同步日誌 =====
+def test_async_file_logger_writes_everything_with_backpressure(tmp_path):
+    """非同步 log 在佇列很小時也不會遺失訊息，沒輸出的等級不會格式化參數"""
+    logger = backup_app.FileLogger(tmp_path / "logs", async_mode=True, queue_size=4, flush_every=16)
+
+    class Lazy:
+        formatted = 0
+
+        def __str__(self):
+            Lazy.formatted += 1
+            return "lazy"
+
+    for i in range(300):
+        logger.info("第 %d 筆 %s", i, "x" * 10)
+    logger.debug("沒有輸出的等級不會格式化 %s", Lazy())
+    logger.close()
+
+    lines = (tmp_path / "logs" / "backup_di.log").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 300 and lines[-1].endswith("第 299 筆 xxxxxxxxxx")
+    assert Lazy.formatted == 0
+    assert logger.dropped == 0
+    assert not logging.getLogger("file_backup_di").handlers
+
+
+def test_queue_handler_keeps_args_for_listener_thread():
+    """放進佇列的紀錄保留 %-style 參數 (由背景執行緒格式化)，佇列滿了等 timeout 後丟棄"""
+    handler = backup_app._BackpressureQueueHandler(backup_app.queue.Queue(maxsize=1), timeout=0.01)
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, "複製 %s 個文件", (3,), None)
+
+    handler.handle(record)
+    handler.handle(record)  # 佇列滿了，等 timeout 後丟掉
+
+    queued = handler.queue.get_nowait()
+    assert queued.args == (3,) and queued.getMessage() == "複製 3 個文件"
+    assert handler.dropped == 1
@@ -0,0 +1,92 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "14_shortest_path_finder"))
+
+import benchmark_set_vs_list as suite  # noqa: E402
+from bench_history import BenchmarkHistory, compare, mann_whitney_greater  # noqa: E402
+
+
+def test_percentile_nearest_rank():
+    """測試 p95 取的是排序後的最近排名值。"""
+    values = list(range(1, 21))  # 1 ~ 20
+
+    assert suite.percentile(values, 50) == 10
+    assert suite.percentile(values, 95) == 19
+    assert suite.percentile([7], 95) == 7
+
+
+def test_percentile_rounds_rank_up():
+    """測試最近排名法是無條件進位：15 個樣本的 p95 是最大值，不是第二大。"""
+    values = list(range(1, 16))  # 1 ~ 15，0.95 * 15 = 14.25
+
+    assert suite.percentile(values, 95) == 15
+    assert suite.percentile(values, 50) == 8
+
+
+def test_measure_returns_per_lookup_samples(monkeypatch):
+    """測試 measure 回傳 SAMPLES 個「每次查詢」的耗時 (ns)。"""
+    monkeypatch.setattr(suite, "SAMPLE_TIME", 0.001)
+    stmt, container = suite.build_containers(100)["bisect"]
+
+    samples = suite.measure(stmt, container, 50)
+
+    assert len(samples) == suite.SAMPLES
+    assert all(0 < ns < 1e7 for ns in samples)
+
+
+def test_append_history_writes_one_compact_line_per_result(tmp_path):
+    """測試結果以 JSONL 追加，每筆一行並保留原始樣本 (之後做顯著性檢定用)。"""
+    history = tmp_path / "history.jsonl"
+    results = [
+        {"container": "set", "size": 10, "case": "hit", "median_ns": 30.0, "p95_ns": 35.0, "samples": [30.0, 35.0]},
+        {"container": "list", "size": 10, "case": "miss", "median_ns": 90.0, "p95_ns": 99.0, "samples": [90.0, 99.0]},
+    ]
+
+    suite.append_history(results, history)
+    suite.append_history(results, history)
+
+    lines = history.read_text().splitlines()
+    assert len(lines) == 4
+    record = json.loads(lines[0])
+    assert record["benchmark"] == "membership"
+    assert record["container"] == "set" and "python" in record
+    assert record["case"] == "set/10/hit" and record["samples"] == [30.0, 35.0]
+    assert {"commit", "cpu"} <= record.keys()
+
+
+# ----------------------------------------------------------------
+# 歷史紀錄與退步偵測 (bench_history)
+# ----------------------------------------------------------------
+
+
+def test_mann_whitney_detects_clear_slowdown():
+    """測試明顯變慢時 p-value 很小，沒變時 p-value 很大。"""
+    baseline = [100, 101, 99, 100, 102, 98, 100, 101, 99, 100]
+    slower = [130, 131, 129, 132, 128, 130, 131, 129, 130, 130]
+
+    assert mann_whitney_greater(slower, baseline) < 0.001
+    assert mann_whitney_greater(baseline, slower) > 0.99
+    assert mann_whitney_greater([1], baseline) == 1.0  # 樣本太少不下結論
+
+
+def test_compare_flags_only_significant_regressions(tmp_path):
+    """測試 compare 只標記「變慢超過門檻且統計顯著」的 case。"""
+    path = tmp_path / "history.jsonl"
+    steady = [100.0, 101.0, 99.0, 100.0, 102.0, 98.0]
+    for _ in range(3):
+        history = BenchmarkHistory(path)
+        history.record("solver", "bfs", steady)
+        history.record("solver", "astar", steady)
+
+    latest = BenchmarkHistory(path)
+    latest.record("solver", "bfs", [v * 1.5 for v in steady])  # 變慢 50%
+    latest.record("solver", "astar", [v * 1.01 for v in steady])  # 雜訊等級
+
+    results = {c.case: c for c in compare(latest.load(), last=3)}
+
+    assert results["bfs"].regression
+    assert results["bfs"].runs == 3
+    assert abs(results["bfs"].change - 0.5) < 1e-9
+    assert not results["astar"].regression
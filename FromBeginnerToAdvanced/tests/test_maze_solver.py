@@ -0,0 +1,280 @@
+import json
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# maze_solver 放在 14_shortest_path_finder 資料夾內，先把它加到搜尋路徑
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "14_shortest_path_finder"))
+
+from distance_field import PathOracle  # noqa: E402
+from maze_generator import random_maze, serpentine_maze, weighted_maze  # noqa: E402
+from maze_grid import DOWN, END_CODE, OPEN_CODE, RIGHT, START_CODE, UP, WALL_CODE, MazeGrid  # noqa: E402
+from maze_solver import PATH_MODES, STRATEGIES, find_start, path_cost, solve  # noqa: E402
+from solve_mazes import load_maze, main as solve_mazes_main  # noqa: E402
+
+MAZE = [
+    ["#", "O", "#", "#", "#", "#", "#", "#", "#"],
+    ["#", " ", " ", " ", " ", " ", " ", " ", "#"],
+    ["#", " ", "#", "#", " ", "#", "#", " ", "#"],
+    ["#", " ", "#", " ", " ", " ", "#", " ", "#"],
+    ["#", " ", "#", " ", "#", " ", "#", " ", "#"],
+    ["#", " ", "#", " ", "#", " ", "#", " ", "#"],
+    ["#", " ", "#", " ", "#", " ", "#", "#", "#"],
+    ["#", " ", " ", " ", " ", " ", " ", " ", "#"],
+    ["#", "#", "#", "#", "#", "#", "#", "X", "#"]
+]
+
+
+def test_find_start():
+    """測試 find_start 找到起點座標。"""
+    assert find_start(MAZE, "O") == (0, 1)
+    assert find_start(MAZE, "?") is None
+
+
+def test_solve_shortest_path():
+    """測試 BFS 找到最短路徑，且路徑是連續的。"""
+    result = solve(MAZE)
+
+    assert result.found
+    assert result.path[0] == (0, 1)
+    assert result.path[-1] == (8, 7)
+    assert result.length == 14
+    for (r1, c1), (r2, c2) in zip(result.path, result.path[1:]):
+        assert abs(r1 - r2) + abs(c1 - c2) == 1
+    assert result.stats.nodes_expanded > 0
+
+
+def test_solve_no_path():
+    """測試終點被牆壁擋住時回傳 None。"""
+    blocked = [row[:] for row in MAZE]
+    blocked[7][7] = "#"
+
+    result = solve(blocked)
+
+    assert not result.found
+    assert result.length == -1
+
+
+def test_observer_receives_frames():
+    """測試 observer 每展開一個節點就收到一個 frame。"""
+    frames = []
+
+    class Recorder:
+        def on_frame(self, frame):
+            frames.append(frame)
+
+    result = solve(MAZE, observer=Recorder())
+
+    assert len(frames) == result.stats.nodes_expanded
+    assert frames[0].current == (0, 1)
+    assert frames[-1].path == result.path
+
+
+@pytest.mark.parametrize("path_mode", list(PATH_MODES))
+def test_path_modes_agree(path_mode):
+    """測試三種路徑記錄方式找到一樣長的最短路徑。"""
+    assert solve(MAZE, path_mode=path_mode).length == 14
+
+    corridor = serpentine_maze(21, 21)
+    assert solve(corridor, path_mode=path_mode).length == 240
+
+
+def test_path_modes_count_the_same_nodes():
+    """測試不同 frontier 實作 (deque / 預先配置的陣列) 展開的節點數一樣。"""
+    counts = {
+        (r.stats.nodes_expanded, r.stats.nodes_discovered)
+        for r in (solve(MAZE, path_mode=mode) for mode in PATH_MODES)
+    }
+
+    assert len(counts) == 1
+
+
+def test_unknown_path_mode():
+    """測試不支援的 path_mode 會引發 ValueError。"""
+    with pytest.raises(ValueError):
+        solve(MAZE, path_mode="nope")
+
+
+def test_maze_grid_round_trip():
+    """測試 MazeGrid 每格 1 byte，且可以轉回原本的 list of list。"""
+    grid = MazeGrid.from_rows(MAZE)
+
+    assert grid.cells.dtype.itemsize == 1
+    assert grid.cells.nbytes == 81
+    assert grid.to_rows() == MAZE
+    assert grid[0][0] == "#"
+    assert find_start(grid) == (0, 1)
+
+
+def test_maze_grid_neighbor_mask():
+    """測試鄰居遮罩只包含邊界內、不是牆的方向。"""
+    grid = MazeGrid.from_rows(MAZE)
+
+    assert grid.cells[0, 0] == WALL_CODE
+    assert grid.neighbor_mask[1, 1] == UP | DOWN | RIGHT
+    start = grid.index(0, 1)
+    assert grid.neighbor_offsets(start) == (grid.cols,)
+    # 同樣的遮罩共用同一個 tuple，不會每次配置新物件
+    assert grid.neighbor_offsets(start) is grid.neighbor_offsets(start)
+
+
+def test_solve_accepts_maze_grid():
+    """測試 solve 可以直接吃 MazeGrid。"""
+    assert solve(MazeGrid.from_rows(MAZE)).length == 14
+
+
+def test_ascii_bytes_with_crlf_and_short_rows():
+    """測試 ASCII 解析可以處理 CRLF 與被刪掉行尾空白的短行。"""
+    text = "#O##\r\n#  \r\n##X#\r\n\r\n"
+    grid = MazeGrid.from_ascii_bytes(text.encode("ascii"))
+
+    assert (grid.rows, grid.cols) == (3, 4)
+    assert grid.to_rows()[1] == ["#", " ", " ", "#"]  # 短行用牆補齊
+    assert solve(grid).length == 3
+
+
+def test_pgm_round_trip(tmp_path):
+    """測試 PGM 寫出再用 mmap 讀回來，迷宮不變。"""
+    pgm = tmp_path / "maze.pgm"
+    pgm.write_bytes(MazeGrid.from_rows(MAZE).to_pgm_bytes())
+
+    assert load_maze(pgm).to_rows() == MAZE
+
+
+def test_solve_mazes_cli_writes_jsonl(tmp_path):
+    """測試批次 CLI 用 process pool 求解資料夾裡的迷宮並輸出 JSONL。"""
+    maze_dir = tmp_path / "mazes"
+    maze_dir.mkdir()
+    (maze_dir / "a.txt").write_text("\n".join("".join(row) for row in MAZE))
+    (maze_dir / "b.pgm").write_bytes(MazeGrid.from_rows(serpentine_maze(21, 21)).to_pgm_bytes())
+    output = tmp_path / "results.jsonl"
+
+    exit_code = solve_mazes_main([str(maze_dir), "--workers", "2", "--output", str(output)])
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert exit_code == 0
+    assert [r["length"] for r in records] == [14, 240]
+    assert all("solve_ms" in r for r in records)
+
+
+@pytest.mark.parametrize("strategy", list(STRATEGIES))
+def test_strategies_find_shortest_path(strategy):
+    """測試每種策略在沒有成本的迷宮上都找到一樣長的最短路徑。"""
+    result = solve(MAZE, strategy=strategy)
+
+    assert result.length == 14
+    assert result.path[0] == (0, 1) and result.path[-1] == (8, 7)
+    assert result.stats.nodes_expanded > 0
+
+    for seed in range(20):
+        maze = random_maze(15, 17, wall_ratio=0.3, seed=seed)
+        assert solve(maze, strategy=strategy).length == solve(maze).length
+
+
+def test_weighted_strategies_find_cheapest_path():
+    """測試 Dijkstra 與 A* 在有成本的迷宮上找到一樣便宜的路，且不比 BFS 貴。"""
+    maze = weighted_maze(31, 31, seed=2)
+
+    dijkstra = solve(maze, strategy="dijkstra")
+    astar = solve(maze, strategy="astar")
+
+    assert dijkstra.cost == astar.cost
+    assert dijkstra.cost <= solve(maze).cost
+    assert astar.stats.nodes_expanded <= dijkstra.stats.nodes_expanded
+
+
+def test_weighted_cells_prefer_cheap_detour():
+    """測試 Dijkstra 會繞過成本高的格子。"""
+    maze = [
+        "O9X",
+        "111",
+    ]
+    result = solve(maze, strategy="dijkstra")
+
+    assert result.path == [(0, 0), (1, 0), (1, 1), (1, 2), (0, 2)]
+    assert result.cost == 4
+    assert solve(maze).cost == 10  # BFS 直接穿過成本 9 的格子，再走進終點 (成本 1)
+
+
+class FakeScreen:
+    """只記錄 addstr 呼叫的假 stdscr"""
+
+    def __init__(self):
+        self.cells = {}
+        self.writes = []
+
+    def addstr(self, row, col, text, attr=0):
+        self.cells[(row, col // 2)] = text
+        self.writes.append((row, col))
+
+    def clear(self):
+        self.cells.clear()
+
+    def refresh(self):
+        pass
+
+
+def test_incremental_renderer_repaints_only_changed_cells(monkeypatch):
+    import maze_render
+
+    monkeypatch.setattr(maze_render.curses, "color_pair", lambda n: n)
+    maze = serpentine_maze(21, 21)
+    screen = FakeScreen()
+    observer = maze_render.IncrementalCursesObserver(maze, screen, delay=0)
+    result = solve(maze, observer=observer)
+
+    full_redraws = result.stats.nodes_expanded * 21 * 21
+    assert observer.cells_drawn < full_redraws / 10
+
+    observer.finish(result.path)
+    for row, line in enumerate(maze):
+        for col, char in enumerate(line):
+            expected = "X" if (row, col) in set(result.path) else char
+            assert screen.cells[(row, col)] == expected
+
+
+def _with_endpoints(grid, start, end):
+    """複製一份迷宮，把起點 / 終點移到指定位置 (給 solve 當對照組)"""
+    copy = MazeGrid(grid.cells.copy(), None if grid.weights is None else grid.weights.copy())
+    copy.cells[copy.cells == START_CODE] = OPEN_CODE
+    copy.cells[copy.cells == END_CODE] = OPEN_CODE
+    copy.cells[start] = START_CODE
+    copy.cells[end] = END_CODE
+    return copy
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_path_oracle_matches_solve(weighted):
+    maze = weighted_maze(15, 15, seed=4) if weighted else random_maze(15, 15, wall_ratio=0.25, seed=3)
+    grid = MazeGrid.from_rows(maze)
+    oracle = PathOracle(grid)
+    rng = random.Random(0)
+    open_cells = [grid.coords(int(i)) for i in np.flatnonzero(grid.flat != WALL_CODE)]
+    targets = open_cells[:3]
+    for _ in range(30):
+        start, end = rng.choice(open_cells), rng.choice(targets)
+        path = oracle.query(start, end)
+        expected = solve(_with_endpoints(grid, start, end), strategy="dijkstra")
+        if not expected.found:
+            assert path is None
+            continue
+        assert path[0] == start and path[-1] == end
+        assert path_cost(grid, path) == expected.cost == oracle.distance(start, end)
+    assert oracle.misses == len(targets)
+
+
+def test_path_oracle_invalidates_when_grid_changes():
+    grid = MazeGrid.from_string("O #\n  #\n# X")
+    oracle = PathOracle(grid)
+    assert oracle.query((0, 0), (2, 2)) == [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)]
+
+    grid.set_cell(2, 1, WALL_CODE)  # 終點被封住
+    assert oracle.query((0, 0), (2, 2)) is None
+
+    grid.set_cell(1, 2, OPEN_CODE)  # 從右邊打通
+    path = oracle.query((0, 0), (2, 2))
+    assert len(path) == 5 and path[-2] == (1, 2)
+    assert oracle.misses == 3